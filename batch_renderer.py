@@ -0,0 +1,131 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the batch renderer, which converts many fountain files to html
+# at once by fanning them out over a pool of worker processes.
+#
+# Each worker sets up one parser and one html generator when it starts, and reuses them
+# for every file it is handed, so regex setup is paid once per worker instead of once
+# per file. A file that fails is reported with its error; the rest of the batch goes on.
+
+import glob
+import os
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+
+from fountain_script import FountainScript
+from html_generator import FountainHTMLGenerator, OUTPUT_BUFFER_SIZE
+from fountain_parser import Parser, ParserVersion
+from render_cache import RenderCache, DEFAULT_CACHE_SIZE
+
+# Files picked up when the batch input is a directory
+BATCH_INPUT_PATTERN = '*.fountain'
+BATCH_OUTPUT_EXTENSION = '.html'
+
+# Per worker process parser, generator and optional render cache, set up by initBatchWorker
+_workerParser = None
+_workerGenerator = None
+_workerCache = None
+_workerSettings = None
+
+def initBatchWorker(parserVersion, parserEngine, cssFile, componentParent, cacheDir = '', cacheSize = DEFAULT_CACHE_SIZE):
+    global _workerParser, _workerGenerator, _workerCache, _workerSettings
+    _workerParser = Parser(parserVersion, parserEngine)
+    _workerGenerator = FountainHTMLGenerator(None, cssFile, componentParent, parserVersion)
+    _workerSettings = (parserVersion, parserEngine, cssFile, componentParent)
+    if cacheDir != '':
+        _workerCache = RenderCache(cacheDir, cacheSize)
+    return
+
+# Renders one file in a worker; returns (input file, output file, seconds, error or None)
+def renderBatchFile(inputFile, outputFile):
+    start = time.perf_counter()
+    try:
+        if _workerCache is not None:
+            with open(inputFile, 'rb') as file:
+                data = file.read()
+            html = _workerCache.renderHtml(data, *_workerSettings, parser = _workerParser, generator = _workerGenerator)
+            with open(outputFile, 'w', buffering = OUTPUT_BUFFER_SIZE) as file:
+                file.write(html)
+        else:
+            fountainScript = FountainScript(inputFile, parser = _workerParser)
+            _workerGenerator.setScript(fountainScript)
+            with open(outputFile, 'w', buffering = OUTPUT_BUFFER_SIZE) as file:
+                _workerGenerator.writeHtml(file)
+    except (Exception, SystemExit):
+        if __debug__:
+            traceback.print_exc()
+        error = traceback.format_exc().strip().split('\n')[-1]
+        return (inputFile, outputFile, time.perf_counter() - start, error)
+    return (inputFile, outputFile, time.perf_counter() - start, None)
+
+class BatchRenderer(object):
+    def __init__(self, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, cssFile = '', componentParent = 'components', workers = None, cacheDir = '', cacheSize = DEFAULT_CACHE_SIZE):
+        self._parserVersion = parserVersion
+        self._parserEngine = parserEngine
+        self._cssFile = cssFile
+        self._componentParent = componentParent
+        # None lets the executor use one worker per CPU
+        self._workers = workers
+        # Render cache folder shared by all workers; empty for no caching
+        self._cacheDir = cacheDir
+        self._cacheSize = cacheSize
+        return
+    
+    # Input files for a directory (its .fountain files) or a glob pattern, sorted
+    def inputFiles(self, batchInput):
+        if os.path.isdir(batchInput):
+            batchInput = os.path.join(batchInput, BATCH_INPUT_PATTERN)
+        return sorted(path for path in glob.glob(batchInput) if os.path.isfile(path))
+    
+    # Output file next to the input file, or in outputDir if given
+    def outputFileFor(self, inputFile, outputDir = ''):
+        outputName = os.path.splitext(os.path.basename(inputFile))[0] + BATCH_OUTPUT_EXTENSION
+        if outputDir == '':
+            outputDir = os.path.dirname(inputFile)
+        return os.path.join(outputDir, outputName)
+    
+    # Renders every input file; returns one result tuple per file, see renderBatchFile
+    def render(self, inputFiles, outputDir = ''):
+        if outputDir != '' and not os.path.isdir(outputDir):
+            os.makedirs(outputDir)
+        
+        results = []
+        initArgs = (self._parserVersion, self._parserEngine, self._cssFile, self._componentParent, self._cacheDir, self._cacheSize)
+        with ProcessPoolExecutor(max_workers = self._workers, initializer = initBatchWorker, initargs = initArgs) as executor:
+            futures = [executor.submit(renderBatchFile, inputFile, self.outputFileFor(inputFile, outputDir)) for inputFile in inputFiles]
+            for inputFile, future in zip(inputFiles, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # The worker itself died, e.g. killed or out of memory
+                    results.append((inputFile, self.outputFileFor(inputFile, outputDir), 0.0, repr(e)))
+        return results
+    
+    def printReport(self, results, elapsed):
+        failures = [result for result in results if result[3] is not None]
+        for inputFile, outputFile, seconds, error in results:
+            if error is None:
+                print('fountainhead: %8.3fs  %s -> %s' % (seconds, inputFile, outputFile))
+        for inputFile, outputFile, seconds, error in failures:
+            print('ERROR: %8.3fs  %s: %s' % (seconds, inputFile, error))
+        print('fountainhead: %d file(s) rendered, %d failed, %.3fs total' % (len(results) - len(failures), len(failures), elapsed))
+        return
\ No newline at end of file
@@ -0,0 +1,300 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module is the benchmark harness. It generates synthetic fountain documents of
+# 1x to 100x the size of Big Fish, times the parser and html generator stages on them
+# separately, and reports throughput, peak memory and scaling as JSON; a report from an
+# earlier commit can be passed in to compare against.
+#
+# Usage:
+#     python -O benchmark.py -s 1,2,5,10 -o bench.json [-k previous-bench.json]
+
+import getopt
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from fountain_script import FountainScript
+from html_generator import FountainHTMLGenerator
+from fountain_parser import Parser, ParserVersion
+
+# Size in characters of html-test/Big-Fish.fountain.txt, the unit of document scale
+BIG_FISH_SIZE = 146254
+
+DEFAULT_SCALES = [1, 2, 5, 10]
+DEFAULT_REPEAT = 3
+
+STAGES = ['parseBodyOfString', 'parseTitlePageOfStringBase', 'bodyForScriptRemap', 'bodyForScriptBase']
+
+CHARACTER_NAMES = ['WILL', 'EDWARD', 'SANDRA', 'JOSEPHINE', 'KARL', 'JENNY', 'AMOS', 'DR. BENNETT', 'NORTHER WINSLOW', 'YOUNG EDWARD']
+LOCATIONS = ['BLOOM HOUSE', 'HOSPITAL ROOM', 'CIRCUS TENT', 'RIVER', 'SPECTRE - MAIN STREET', 'WITCH\'S HOUSE', 'AUBURN UNIVERSITY', 'CAVE']
+TIMES = ['DAY', 'NIGHT', 'CONTINUOUS', 'LATER', 'DUSK']
+WORDS = ['the', 'river', 'light', 'slowly', 'a', 'fish', 'story', 'he', 'she', 'looks', 'at', 'old', 'man', 'water', 'house', 'door', 'never', 'again', 'with', 'giant', 'circus', 'smile', 'quiet', 'moment', 'and', 'then', 'away']
+PARENTHETICALS = ['(beat)', '(quietly)', '(smiling)', '(to Will)', '(V.O.)']
+TRANSITIONS = ['CUT TO:', 'DISSOLVE TO:', 'FADE TO BLACK.', '> BACK TO PRESENT']
+COMPONENTS = ['lightCue', 'soundCue', 'projection']
+
+class DocumentGenerator(object):
+    # Densities are probabilities: dialogueDensity of a block being dialogue instead of
+    # action, dualDialogue of a dialogue block being a dual dialogue pair, boneyard of a
+    # block being followed by a boneyard, components of an action line carrying a
+    # <<@component(...)>> definition
+    def __init__(self, dialogueDensity = 0.5, dualDialogue = 0.05, boneyard = 0.02, components = 0.05, seed = 0):
+        self._dialogueDensity = dialogueDensity
+        self._dualDialogue = dualDialogue
+        self._boneyard = boneyard
+        self._components = components
+        self._random = random.Random(seed)
+        return
+    
+    def sentence(self, minWords = 4, maxWords = 16):
+        words = [self._random.choice(WORDS) for i in range(self._random.randint(minWords, maxWords))]
+        text = ' '.join(words)
+        if self._random.random() < 0.1:
+            text = text.replace(words[0], '*' + words[0] + '*', 1)
+        return text[0].upper() + text[1:] + '.'
+    
+    def titlePage(self):
+        return ('Title: Synthetic Fish\n'
+                'Credit: written by\n'
+                'Author: Benchmark\n'
+                'Source: generated by benchmark.py\n'
+                'Draft date: 1/1/2015\n'
+                'Contact:\n'
+                '    REMAP\n'
+                '    UCLA\n'
+                '\n')
+    
+    def dialogueBlock(self, name, dual = False):
+        lines = [name + (' ^' if dual else '')]
+        if self._random.random() < 0.2:
+            lines.append(self._random.choice(PARENTHETICALS))
+        for i in range(self._random.randint(1, 3)):
+            lines.append(self.sentence())
+        return '\n'.join(lines) + '\n\n'
+    
+    def actionBlock(self):
+        lines = [self.sentence(6, 24) for i in range(self._random.randint(1, 3))]
+        if self._random.random() < self._components:
+            name = self._random.choice(COMPONENTS)
+            lines[-1] += ' <<@' + name + '(level = \'' + str(self._random.randint(1, 10)) + '\', target=stage) ' + self.sentence(2, 5) + '>>'
+        return '\n'.join(lines) + '\n\n'
+    
+    def scene(self):
+        text = self._random.choice(['INT. ', 'EXT. ']) + self._random.choice(LOCATIONS) + ' - ' + self._random.choice(TIMES) + '\n\n'
+        for i in range(self._random.randint(3, 12)):
+            if self._random.random() < self._dialogueDensity:
+                first, second = self._random.sample(CHARACTER_NAMES, 2)
+                text += self.dialogueBlock(first)
+                if self._random.random() < self._dualDialogue:
+                    text += self.dialogueBlock(second, True)
+            else:
+                text += self.actionBlock()
+            if self._random.random() < self._boneyard:
+                text += '/*\n' + self.sentence() + '\n' + self.sentence() + '\n*/\n\n'
+        if self._random.random() < 0.3:
+            text += self._random.choice(TRANSITIONS) + '\n\n'
+        return text
+    
+    # A document of about scale times the size of Big Fish
+    def document(self, scale):
+        targetSize = int(scale * BIG_FISH_SIZE)
+        parts = [self.titlePage()]
+        size = len(parts[0])
+        while size < targetSize:
+            scene = self.scene()
+            parts.append(scene)
+            size += len(scene)
+        return ''.join(parts)
+
+# Best wall time of repeat calls, and the result of the last one
+def timeCall(function, repeat):
+    best = None
+    result = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if (best is None or elapsed < best):
+            best = elapsed
+    return best, result
+
+# Peak traced allocation in bytes during one call
+def peakMemory(function):
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak
+
+# Exponent k of seconds ~ size^k, fitted over all scales; 1.0 is linear
+def scalingExponent(points):
+    points = [(math.log(size), math.log(seconds)) for size, seconds in points if size > 0 and seconds > 0]
+    if len(points) < 2:
+        return None
+    meanX = sum(x for x, y in points) / len(points)
+    meanY = sum(y for x, y in points) / len(points)
+    variance = sum((x - meanX) ** 2 for x, y in points)
+    if variance == 0:
+        return None
+    return sum((x - meanX) * (y - meanY) for x, y in points) / variance
+
+def gitRevision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr = subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def benchmarkDocument(text, parserEngine, repeat):
+    remapParser = Parser(ParserVersion.REMAP, parserEngine)
+    baseParser = Parser(ParserVersion.BASE, parserEngine)
+    
+    remapScript = FountainScript()
+    remapScript._elements, remapScript._titlePageContents = remapParser.parseString(text)
+    baseScript = FountainScript()
+    baseScript._elements, baseScript._titlePageContents = baseParser.parseString(text)
+    remapGenerator = FountainHTMLGenerator(remapScript, '', 'components', ParserVersion.REMAP)
+    baseGenerator = FountainHTMLGenerator(baseScript, '', 'components', ParserVersion.BASE)
+    
+    stages = {
+        'parseBodyOfString': lambda: remapParser.parseBodyOfString(text),
+        'parseTitlePageOfStringBase': lambda: remapParser.parseTitlePageOfStringBase(text),
+        'bodyForScriptRemap': remapGenerator.bodyForScriptRemap,
+        'bodyForScriptBase': baseGenerator.bodyForScriptBase,
+    }
+    
+    size = len(text.encode('utf-8'))
+    results = {}
+    for stage in STAGES:
+        seconds, output = timeCall(stages[stage], repeat)
+        results[stage] = {
+            'seconds': seconds,
+            'bytesPerSecond': size / seconds if seconds > 0 else None,
+            'peakBytes': peakMemory(stages[stage]),
+        }
+    return {
+        'bytes': size,
+        'elements': len(remapScript._elements or []),
+        'stages': results,
+    }
+
+def runBenchmark(scales, parserEngine, repeat, generatorSettings):
+    report = {
+        'revision': gitRevision(),
+        'python': platform.python_version(),
+        'engine': parserEngine,
+        'repeat': repeat,
+        'generator': generatorSettings,
+        'results': [],
+    }
+    for scale in scales:
+        text = DocumentGenerator(**generatorSettings).document(scale)
+        result = benchmarkDocument(text, parserEngine, repeat)
+        result['scale'] = scale
+        report['results'].append(result)
+        print('scale %gx (%d bytes, %d elements): ' % (scale, result['bytes'], result['elements']) + ', '.join('%s %.1f ms' % (stage, result['stages'][stage]['seconds'] * 1000) for stage in STAGES), file = sys.stderr)
+    
+    report['scaling'] = {}
+    for stage in STAGES:
+        points = [(result['bytes'], result['stages'][stage]['seconds']) for result in report['results']]
+        report['scaling'][stage] = {
+            'exponent': scalingExponent(points),
+            'curve': [[size, seconds] for size, seconds in points],
+        }
+    return report
+
+# Prints time ratios (new / old) per stage for the scales both reports have
+def compareReports(report, previous):
+    print('stage'.ljust(28) + 'scale'.rjust(8) + 'old ms'.rjust(12) + 'new ms'.rjust(12) + 'ratio'.rjust(8))
+    previousResults = dict((result['scale'], result) for result in previous['results'])
+    for result in report['results']:
+        previousResult = previousResults.get(result['scale'])
+        if previousResult is None:
+            continue
+        for stage in STAGES:
+            if stage not in previousResult['stages']:
+                continue
+            old = previousResult['stages'][stage]['seconds']
+            new = result['stages'][stage]['seconds']
+            print(stage.ljust(28) + ('%gx' % result['scale']).rjust(8) + ('%.1f' % (old * 1000)).rjust(12) + ('%.1f' % (new * 1000)).rjust(12) + ('%.2f' % (new / old if old > 0 else 0)).rjust(8))
+    return
+
+def usage():
+    print('benchmark.py [-s <scales, e.g. 1,2,5,10,100>] [-e <parser engine>] [-r <repeat>] [-o <report.json>] [-k <previous report.json>]')
+    print('  [--dialogue <density>] [--dual <rate>] [--boneyard <rate>] [--components <rate>] [--seed <seed>]')
+
+def main(argv):
+    scales = DEFAULT_SCALES
+    parserEngine = ParserVersion.DEFAULT_ENGINE
+    repeat = DEFAULT_REPEAT
+    outputFile = ''
+    compareFile = ''
+    generatorSettings = {'dialogueDensity': 0.5, 'dualDialogue': 0.05, 'boneyard': 0.02, 'components': 0.05, 'seed': 0}
+    settingNames = {'--dialogue': 'dialogueDensity', '--dual': 'dualDialogue', '--boneyard': 'boneyard', '--components': 'components'}
+    
+    try:
+        opts, args = getopt.getopt(argv, 'hs:e:r:o:k:', ['scales=', 'engine=', 'repeat=', 'output=', 'compare=', 'dialogue=', 'dual=', 'boneyard=', 'components=', 'seed='])
+        for opt, arg in opts:
+            if opt == '-h':
+                usage()
+                sys.exit()
+            elif opt in ('-s', '--scales'):
+                scales = [float(scale) for scale in arg.split(',')]
+            elif opt in ('-e', '--engine'):
+                parserEngine = arg.lower()
+            elif opt in ('-r', '--repeat'):
+                repeat = max(1, int(arg))
+            elif opt in ('-o', '--output'):
+                outputFile = arg
+            elif opt in ('-k', '--compare'):
+                compareFile = arg
+            elif opt == '--seed':
+                generatorSettings['seed'] = int(arg)
+            elif opt in settingNames:
+                generatorSettings[settingNames[opt]] = float(arg)
+    except (getopt.GetoptError, ValueError):
+        usage()
+        sys.exit(2)
+    
+    if parserEngine not in ParserVersion.Engines:
+        print('WARNING: Unknown parser engine \'' + parserEngine + '\'; using default engine \'' + ParserVersion.DEFAULT_ENGINE + '\' instead')
+        parserEngine = ParserVersion.DEFAULT_ENGINE
+    
+    report = runBenchmark(scales, parserEngine, repeat, generatorSettings)
+    
+    if outputFile != '':
+        with open(outputFile, 'w') as file:
+            json.dump(report, file, indent = 2)
+        print('SUCCESS: Benchmark report written to ' + outputFile)
+    else:
+        print(json.dumps(report, indent = 2))
+    
+    if compareFile != '':
+        with open(compareFile) as file:
+            compareReports(report, json.load(file))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
\ No newline at end of file
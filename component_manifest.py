@@ -0,0 +1,129 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the component manifest of a remap script: every web component the
+# body uses, in order of first use, with the element index of its first use and the
+# parsed arguments and description of each use. The html generator takes the head
+# imports from it, and can load the imports of components first used further down
+# asynchronously (see FountainHTMLGenerator.deferImportsAfter).
+#
+# Component arguments are split with COMPONENT_ARGUMENTS_SPLIT_REGEX once per rule set and
+# distinct argument text; the generator and the manifest share that parse.
+
+from fountain_element import ElementKind
+from regex_rules import *
+
+# Argument texts kept parsed before the cache is cleared
+ARGUMENTS_CACHE_SIZE = 4096
+
+# (rule set, argument text) -> (arguments, count of arguments without an equal sign)
+_parsedArguments = {}
+
+# (name, value) pairs of a component arguments text, in order; arguments without an
+# equal sign are left out with a warning, on every use of the text unless warn is False
+def componentArgumentsOf(fountainRegex, argumentsText, warn = True):
+    key = (fountainRegex, argumentsText)
+    parsed = _parsedArguments.get(key)
+    if parsed is None:
+        arguments = []
+        missingEqualSigns = 0
+        for arg in fountainRegex.COMPONENT_ARGUMENTS_SPLIT_REGEX.findall(argumentsText):
+            equalSign = arg.find('=')
+            if (equalSign > 0):
+                arguments.append((arg[:equalSign].strip(), arg[equalSign + 1:].strip()))
+            else:
+                missingEqualSigns += 1
+        parsed = (tuple(arguments), missingEqualSigns)
+        
+        if len(_parsedArguments) >= ARGUMENTS_CACHE_SIZE:
+            _parsedArguments.clear()
+        _parsedArguments[key] = parsed
+    
+    for i in range(parsed[1] if warn else 0):
+        print('WARNING: no equal sign found for component argument; on purpose?')
+    return parsed[0]
+
+class ComponentManifest(object):
+    # Components only exist in the remap rule set, which is used unless another is given
+    def __init__(self, elements = None, fountainRegex = None):
+        if fountainRegex is None:
+            fountainRegex = sharedRules(FountainRegexRemap)
+        self._fountainRegex = fountainRegex
+        # Component names in order of first use
+        self._names = []
+        # Name to element index of the first use
+        self._firstUses = {}
+        # Name to list of uses, as (element index, arguments, description)
+        self._uses = {}
+        
+        if elements is not None:
+            self.build(elements)
+        return
+    
+    def build(self, elements):
+        componentName = None
+        componentIndex = 0
+        arguments = ()
+        
+        index = 0
+        for element in elements:
+            kind = element._kind
+            if (kind == ElementKind.COMPONENT_NAME):
+                componentName = element._elementText
+                componentIndex = index
+                arguments = ()
+                if not (componentName in self._firstUses):
+                    self._names.append(componentName)
+                    self._firstUses[componentName] = index
+                    self._uses[componentName] = []
+            elif (kind == ElementKind.COMPONENT_ARGUMENTS and componentName is not None):
+                # the renderer warns about bad arguments when it renders the element
+                arguments = componentArgumentsOf(self._fountainRegex, element._elementText, False)
+            elif (kind == ElementKind.COMPONENT_DESCRIPTION and componentName is not None):
+                self._uses[componentName].append((componentIndex, arguments, element._elementText))
+                componentName = None
+            index += 1
+        return
+    
+    # Adds the components of another manifest, whose element indices start at 'offset'
+    # in this one; its elements come after the ones already in this manifest
+    def extend(self, other, offset = 0):
+        for componentName in other._names:
+            if not (componentName in self._firstUses):
+                self._names.append(componentName)
+                self._firstUses[componentName] = other._firstUses[componentName] + offset
+                self._uses[componentName] = []
+            self._uses[componentName].extend((index + offset, arguments, description) for index, arguments, description in other._uses[componentName])
+        return
+    
+    # Component names in order of first use
+    def componentNames(self):
+        return self._names
+    
+    def firstUse(self, componentName):
+        return self._firstUses.get(componentName)
+    
+    def uses(self, componentName):
+        return self._uses.get(componentName, [])
+    
+    # (names first used before element index fold, names first used from there on)
+    def splitAt(self, fold):
+        above = [name for name in self._names if self._firstUses[name] < fold]
+        below = [name for name in self._names if self._firstUses[name] >= fold]
+        return above, below
\ No newline at end of file
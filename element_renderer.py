@@ -0,0 +1,220 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+# This module defines the element renderers of the html generator, which turn runs of
+# parsed elements into body html.
+#
+# Every element kind has an entry in a table: the handler that renders it, and whether
+# it closes an open dual dialogue. Paragraph open tags are built once per kind (and once
+# more for centered text), so an element costs a table lookup, its handler and the
+# emphasis render of its text. The remap renderer adds web components as a layer of
+# handlers over the base ones, instead of a loop of its own.
+
+from fountain_element import ElementKind
+from component_manifest import componentArgumentsOf
+
+PARAGRAPH_CLOSE_TAG = '</p>\n'
+PAGE_BREAK_HTML = '</section>\n<section>\n'
+DUAL_DIALOGUE_CLOSE_HTML = '</div>\n</div>\n'
+
+# Kinds that keep a dual dialogue open
+DIALOGUE_KINDS = (ElementKind.CHARACTER, ElementKind.DIALOGUE, ElementKind.PARENTHETICAL)
+# Kinds left out of the html; they neither close a dual dialogue
+IGNORED_KINDS = (ElementKind.BONEYARD, ElementKind.COMMENT, ElementKind.SYNOPSIS, ElementKind.SECTION_HEADING)
+
+class ElementRenderer(object):
+    def __init__(self, fountainRegex, emphasisRenderer):
+        self._fountainRegex = fountainRegex
+        self._emphasisRenderer = emphasisRenderer
+        
+        self._dualDialogueOpenHtml = ('<div class=\'' + fountainRegex.DUAL_DIALOGUE_CLASS + '\'>\n' + 
+                                      '<div class=\'' + fountainRegex.DUAL_DIALOGUE_LEFT_CLASS + '\'>\n')
+        self._dualDialogueRightHtml = '<div class=\'' + fountainRegex.DUAL_DIALOGUE_RIGHT_CLASS + '\'>\n'
+        self._sceneNumberLeftTag = '<span class=\'' + fountainRegex.SCENE_NUMBER_LEFT_CLASS + '\'>'
+        self._sceneNumberRightTag = '<span class=\'' + fountainRegex.SCENE_NUMBER_RIGHT_CLASS + '\'>'
+        
+        # Kind to (handler, closes dual dialogue)
+        self._table = {}
+        # Kind to paragraph open tag, without and with the center class
+        self._openTags = {}
+        self._centeredOpenTags = {}
+        for kind in range(len(ElementKind.Names)):
+            self.addKind(kind)
+        
+        self.setHandler(ElementKind.SCENE_HEADING, self.renderSceneHeading)
+        self.setHandler(ElementKind.CHARACTER, self.renderCharacter, False)
+        self.setHandler(ElementKind.DIALOGUE, self.renderParagraph, False)
+        self.setHandler(ElementKind.PARENTHETICAL, self.renderParagraph, False)
+        self.setHandler(ElementKind.PAGE_BREAK, self.renderPageBreak, False)
+        for kind in IGNORED_KINDS:
+            self.setHandler(kind, self.renderNothing, False)
+        
+        # Dual dialogue character count of the elements rendered so far
+        self._dualDialogueCharacterCount = 0
+        return
+    
+    # HTML class is the element type with spaces replaced by dashes
+    def htmlClassForKind(self, kind):
+        return ElementKind.typeForCode(kind).lower().replace(' ', '-')
+    
+    # Table entry of a kind rendered as a plain paragraph; kinds that were added to
+    # ElementKind after the renderer was made get one on first use
+    def addKind(self, kind):
+        htmlClass = self.htmlClassForKind(kind)
+        self._openTags[kind] = '<p class=\'' + htmlClass + '\'>'
+        self._centeredOpenTags[kind] = '<p class=\'' + htmlClass + self._fountainRegex.CENTER_CLASS + '\'>'
+        entry = (self.renderParagraph, True)
+        self._table[kind] = entry
+        return entry
+    
+    def setHandler(self, kind, handler, closesDualDialogue = True):
+        self._table[kind] = (handler, closesDualDialogue)
+        return
+    
+    # Called before each run of elements
+    def reset(self, dualDialogueCharacterCount):
+        self._dualDialogueCharacterCount = dualDialogueCharacterCount
+        return
+    
+    # Body html of a run of elements; dual dialogue still open at the end is closed
+    # if closeDualDialogue is set, as the next (non dialogue) element would.
+    # dualDialogueCharacterCount carries the dual dialogue state over from the elements
+    # before; the state at the end is left in self._dualDialogueCharacterCount
+    def renderChunks(self, elements, closeDualDialogue = False, dualDialogueCharacterCount = 0):
+        self.reset(dualDialogueCharacterCount)
+        table = self._table
+        for element in elements:
+            entry = table.get(element._kind)
+            if entry is None:
+                entry = self.addKind(element._kind)
+            handler, closesDualDialogue = entry
+            
+            if (closesDualDialogue and self._dualDialogueCharacterCount >= 2):
+                self._dualDialogueCharacterCount = 0
+                yield DUAL_DIALOGUE_CLOSE_HTML
+            
+            html = handler(element)
+            if (html != ''):
+                yield html
+        
+        if (closeDualDialogue and self._dualDialogueCharacterCount >= 2):
+            self._dualDialogueCharacterCount = 0
+            yield DUAL_DIALOGUE_CLOSE_HTML
+        return
+    
+    # Paragraph of the element's kind around text, empty for empty text
+    def paragraph(self, element, text):
+        text = self._emphasisRenderer.render(text)
+        if (text == ''):
+            return ''
+        if (element._isCentered):
+            return self._centeredOpenTags[element._kind] + text + PARAGRAPH_CLOSE_TAG
+        return self._openTags[element._kind] + text + PARAGRAPH_CLOSE_TAG
+    
+    def renderParagraph(self, element):
+        return self.paragraph(element, element._elementText)
+    
+    def renderNothing(self, element):
+        return ''
+    
+    # Page breaks end the current section
+    def renderPageBreak(self, element):
+        return PAGE_BREAK_HTML
+    
+    def renderSceneHeading(self, element):
+        if (element._sceneNumber == None):
+            return self.paragraph(element, element._elementText)
+        sceneNumber = element._sceneNumber
+        return self.paragraph(element, self._sceneNumberLeftTag + sceneNumber + '</span>' + element._elementText + 
+                              self._sceneNumberRightTag + sceneNumber + '</span>')
+    
+    # Dual dialogue characters open the dual dialogue, or its right side
+    def renderCharacter(self, element):
+        if (not element._isDualDialogue):
+            return self.paragraph(element, element._elementText)
+        
+        self._dualDialogueCharacterCount += 1
+        html = ''
+        if (self._dualDialogueCharacterCount == 1):
+            html = self._dualDialogueOpenHtml
+        elif (self._dualDialogueCharacterCount == 2):
+            html = self._dualDialogueRightHtml
+        fountainRegex = self._fountainRegex
+        text = fountainRegex.DUAL_DIALOGUE_ANGLE_MARK_REGEX.sub(fountainRegex.EMPTY_REPLACEMENT, element._elementText)
+        return html + self.paragraph(element, text)
+
+# Renders web components on top of the base elements: a component name, its arguments
+# and its description become one custom element, named after the component. Elements
+# between the name and the description are left out. componentUsed is called with the
+# name of every component rendered.
+class RemapElementRenderer(ElementRenderer):
+    def __init__(self, fountainRegex, emphasisRenderer, componentUsed):
+        ElementRenderer.__init__(self, fountainRegex, emphasisRenderer)
+        self._componentUsed = componentUsed
+        
+        self.setHandler(ElementKind.COMPONENT_NAME, self.renderComponentName)
+        self.setHandler(ElementKind.COMPONENT_ARGUMENTS, self.renderComponentArguments)
+        self.setHandler(ElementKind.COMPONENT_DESCRIPTION, self.renderComponentDescription)
+        
+        # Flag for whether we are in a component definition, if so, elements should not appear as normal ones
+        self._inComponent = False
+        self._componentName = ''
+        self._componentArgs = dict()
+        return
+    
+    def reset(self, dualDialogueCharacterCount):
+        ElementRenderer.reset(self, dualDialogueCharacterCount)
+        self._inComponent = False
+        self._componentName = ''
+        self._componentArgs = dict()
+        return
+    
+    def paragraph(self, element, text):
+        if (self._inComponent):
+            return ''
+        return ElementRenderer.paragraph(self, element, text)
+    
+    def renderComponentName(self, element):
+        if (self._inComponent):
+            print('ERROR: Nested component definition in script. Not sure how to parse yet.')
+            return ''
+        self._componentUsed(element._elementText)
+        self._componentName = element._elementText
+        self._inComponent = True
+        return ''
+    
+    # Arguments without a component around them are rendered as a paragraph
+    def renderComponentArguments(self, element):
+        if (not self._inComponent):
+            return self.paragraph(element, element._elementText)
+        for argName, argValue in componentArgumentsOf(self._fountainRegex, element._elementText):
+            self._componentArgs[argName] = argValue
+        return ''
+    
+    def renderComponentDescription(self, element):
+        if (not self._inComponent):
+            return self.paragraph(element, element._elementText)
+        componentName = self._componentName
+        componentText = '<' + componentName
+        for argName, argValue in self._componentArgs.items():
+            componentText += ' ' + argName + '=' + argValue
+        
+        self._inComponent = False
+        self._componentName = ''
+        self._componentArgs = dict()
+        return componentText + '>' + element._elementText + '</' + componentName + '>\n'
\ No newline at end of file
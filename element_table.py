@@ -0,0 +1,153 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the element table, a columnar store for parsed script elements.
+# Each element attribute is kept in its own array column, and all element texts in
+# one concatenated text buffer with offsets, so that queries over a whole script
+# (counting, filtering by kind) and serialization work on columns instead of on
+# one Python object per element. The table is still iterable as FountainElements.
+
+from array import array
+
+from fountain_element import FountainElement, ElementKind
+
+# Flag bits of the flags column
+DUAL_DIALOGUE_FLAG = 1
+CENTERED_FLAG      = 2
+
+# Scene number column value for elements without one
+NO_SCENE_NUMBER    = -1
+
+class ElementTable(object):
+    def __init__(self, elements = None):
+        # Element kind codes, see ElementKind
+        self._kinds = array('H')
+        self._flags = array('B')
+        self._sectionDepths = array('H')
+        # Index into self._sceneNumberTexts, or NO_SCENE_NUMBER
+        self._sceneNumbers = array('i')
+        self._sceneNumberTexts = []
+        # Element i's text is self._text[self._textOffsets[i]:self._textOffsets[i + 1]]
+        self._textOffsets = array('q', [0])
+        self._text = ''
+        # Texts appended since the buffer was last joined
+        self._pendingTexts = []
+        
+        if elements is not None:
+            self.extend(elements)
+        return
+    
+    def append(self, element):
+        self._kinds.append(element._kind)
+        
+        flags = 0
+        if element._isDualDialogue:
+            flags |= DUAL_DIALOGUE_FLAG
+        if element._isCentered:
+            flags |= CENTERED_FLAG
+        self._flags.append(flags)
+        
+        self._sectionDepths.append(element._sectionDepth)
+        
+        if element._sceneNumber is None:
+            self._sceneNumbers.append(NO_SCENE_NUMBER)
+        else:
+            self._sceneNumbers.append(len(self._sceneNumberTexts))
+            self._sceneNumberTexts.append(element._sceneNumber)
+        
+        self._textOffsets.append(self._textOffsets[-1] + len(element._elementText))
+        self._pendingTexts.append(element._elementText)
+        return
+    
+    def extend(self, elements):
+        for element in elements:
+            self.append(element)
+        return
+    
+    def __len__(self):
+        return len(self._kinds)
+    
+    def __iter__(self):
+        for i in range(len(self._kinds)):
+            yield self.element(i)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.element(i) for i in range(*index.indices(len(self._kinds)))]
+        if index < 0:
+            index += len(self._kinds)
+        if index < 0 or index >= len(self._kinds):
+            raise IndexError('element table index out of range')
+        return self.element(index)
+    
+    # The concatenated text of all elements
+    def textBuffer(self):
+        if self._pendingTexts:
+            self._text += ''.join(self._pendingTexts)
+            self._pendingTexts = []
+        return self._text
+    
+    def elementText(self, index):
+        return self.textBuffer()[self._textOffsets[index]:self._textOffsets[index + 1]]
+    
+    def sceneNumber(self, index):
+        sceneNumber = self._sceneNumbers[index]
+        if sceneNumber == NO_SCENE_NUMBER:
+            return None
+        return self._sceneNumberTexts[sceneNumber]
+    
+    # Materializes element 'index' as a FountainElement
+    def element(self, index):
+        element = FountainElement(ElementKind.typeForCode(self._kinds[index]), self.elementText(index))
+        flags = self._flags[index]
+        element._isDualDialogue = bool(flags & DUAL_DIALOGUE_FLAG)
+        element._isCentered = bool(flags & CENTERED_FLAG)
+        element._sceneNumber = self.sceneNumber(index)
+        element._sectionDepth = self._sectionDepths[index]
+        return element
+    
+    # Column queries
+    
+    def kinds(self):
+        return self._kinds
+    
+    def countKind(self, kind):
+        return self._kinds.count(kind)
+    
+    # Kind code to element count, for every kind present
+    def countKinds(self):
+        counts = {}
+        for kind in set(self._kinds):
+            counts[kind] = self._kinds.count(kind)
+        return counts
+    
+    def indicesOfKind(self, kind):
+        indices = []
+        kinds = self._kinds
+        i = -1
+        try:
+            while True:
+                i = kinds.index(kind, i + 1)
+                indices.append(i)
+        except ValueError:
+            pass
+        return indices
+    
+    def textsOfKind(self, kind):
+        return [self.elementText(i) for i in self.indicesOfKind(kind)]
\ No newline at end of file
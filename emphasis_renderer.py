@@ -0,0 +1,132 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the emphasis renderer, which turns fountain emphasis markup
+# (*italic*, **bold**, ***bold italic***, _underline_) in element text into HTML.
+#
+# The text is scanned once for marker runs. Runs are paired first, each with the
+# closest earlier unpaired run of the same style; unpaired runs stay literal text.
+# Tags are then written out with a stack of open styles: closing a style that is not
+# on top closes the styles above it and opens them again right after, so the output
+# is always well-nested even for overlapping markup.
+
+# Style indices; star runs of one, two or three open or close these styles
+BOLD_STYLE      = 0
+ITALIC_STYLE    = 1
+UNDERLINE_STYLE = 2
+
+OPEN_ROLE       = 1
+CLOSE_ROLE      = 2
+
+class FountainEmphasisRenderer(object):
+    def __init__(self, fountainRegex):
+        self._fountainRegex = fountainRegex
+        self._markerRegex = fountainRegex.EMPHASIS_MARKER_REGEX
+        
+        tags = [fountainRegex.BOLD_HTML_TAG, fountainRegex.ITALIC_HTML_TAG, fountainRegex.UNDERLINE_HTML_TAG]
+        self._openTags = ['<' + tag + '>' for tag in tags]
+        self._closeTags = ['</' + tag + '>' for tag in tags]
+        
+        star = fountainRegex.EMPHASIS_STAR
+        underscore = fountainRegex.EMPHASIS_UNDERSCORE
+        # Styles of each marker run, in opening order; other runs are literal
+        self._markerStyles = {star: (ITALIC_STYLE,), star * 2: (BOLD_STYLE,), star * 3: (BOLD_STYLE, ITALIC_STYLE), 
+                              underscore: (UNDERLINE_STYLE,)}
+        # Literal text of a style whose run half is left unpaired
+        self._styleMarkers = [star * 2, star, underscore]
+        return
+    
+    def render(self, text):
+        fountainRegex = self._fountainRegex
+        if fountainRegex.FONT_EMPH_IGNORE_MARK in text:
+            text = fountainRegex.FONT_EMPH_IGNORE_REGEX.sub(fountainRegex.EMPTY_REPLACEMENT, text)
+        
+        # Most element text carries no emphasis at all
+        if fountainRegex.EMPHASIS_STAR not in text and fountainRegex.EMPHASIS_UNDERSCORE not in text:
+            return text
+        
+        # Pairing: each run becomes [start, end, styles, roles by style]
+        runs = []
+        openers = []
+        for match in self._markerRegex.finditer(text):
+            escape, marker = match.group(1, 2)
+            styles = self._markerStyles.get(marker)
+            if styles is None:
+                # Emphasis never spans < or >
+                if marker == fountainRegex.LESS_THAN_PATTERN or marker == fountainRegex.MORE_THAN_PATTERN:
+                    openers = []
+                continue
+            if escape:
+                continue
+            
+            roles = {}
+            for style in styles:
+                for i in range(len(openers) - 1, -1, -1):
+                    opener = openers[i]
+                    if opener[1] == style:
+                        opener[0][3][style] = OPEN_ROLE
+                        roles[style] = CLOSE_ROLE
+                        del openers[i]
+                        break
+            run = [match.start(2), match.end(2), styles, roles]
+            for style in styles:
+                if style not in roles:
+                    openers.append((run, style))
+            runs.append(run)
+        
+        if not runs:
+            return text
+        
+        # Writing: literal text between runs, then closing tags, unpaired markers and
+        # opening tags of each run
+        openTags = self._openTags
+        closeTags = self._closeTags
+        output = []
+        stack = []
+        pos = 0
+        for start, end, styles, roles in runs:
+            output.append(text[pos:start])
+            pos = end
+            
+            closing = [style for style in styles if roles.get(style) == CLOSE_ROLE]
+            if len(closing) > 1:
+                closing.sort(key = stack.index, reverse = True)
+            for style in closing:
+                reopen = []
+                while stack[-1] != style:
+                    top = stack.pop()
+                    output.append(closeTags[top])
+                    reopen.append(top)
+                stack.pop()
+                output.append(closeTags[style])
+                for top in reversed(reopen):
+                    stack.append(top)
+                    output.append(openTags[top])
+            
+            for style in styles:
+                if style not in roles:
+                    output.append(self._styleMarkers[style])
+            
+            for style in styles:
+                if roles.get(style) == OPEN_ROLE:
+                    stack.append(style)
+                    output.append(openTags[style])
+        
+        output.append(text[pos:])
+        return ''.join(output)
\ No newline at end of file
@@ -19,17 +19,93 @@
 
 # This class contains the elements parsed from string input
 
+import sys
+
+from regex_rules import FountainRegexRemap
+
+# Element kinds: every element type string is interned once and given a small int code,
+# so that elements store an int and kind checks are int comparisons.
+# Codes of the known types are fixed; types not listed here get the next free code on first use.
+class ElementKind(object):
+    SCENE_HEADING         = 0
+    ACTION                = 1
+    TRANSITION            = 2
+    CHARACTER             = 3
+    DIALOGUE              = 4
+    PARENTHETICAL         = 5
+    PAGE_BREAK            = 6
+    BONEYARD              = 7
+    COMMENT               = 8
+    SYNOPSIS              = 9
+    SECTION_HEADING       = 10
+    COMPONENT_NAME        = 11
+    COMPONENT_ARGUMENTS   = 12
+    COMPONENT_DESCRIPTION = 13
+    
+    # Type strings by code
+    Names = [sys.intern(name) for name in [FountainRegexRemap.SCENE_HEADING_PATTERN, FountainRegexRemap.ACTION_TAG_PATTERN, 
+             FountainRegexRemap.TRANSITION_TAG_PATTERN, FountainRegexRemap.CHARACTER_TAG_PATTERN, 
+             FountainRegexRemap.DIALOGUE_TAG_PATTERN, FountainRegexRemap.PARENTHETICAL_TAG_PATTERN, 
+             FountainRegexRemap.PAGE_BREAK_PATTERN, FountainRegexRemap.BONEYARD_TAG_PATTERN, 
+             FountainRegexRemap.COMMENT_TAG_PATTERN, FountainRegexRemap.SYNOPSIS_TAG_PATTERN, 
+             FountainRegexRemap.SECTION_HEADING_PATTERN, FountainRegexRemap.COMPONENT_NAME_PATTERN, 
+             FountainRegexRemap.COMPONENT_ARGUMENTS_PATTERN, FountainRegexRemap.COMPONENT_DESCRIPTION_PATTERN]]
+    
+    # Codes by type string
+    Codes = dict((name, code) for code, name in enumerate(Names))
+    
+    @staticmethod
+    def codeForType(elementType):
+        code = ElementKind.Codes.get(elementType)
+        if code is None:
+            code = len(ElementKind.Names)
+            ElementKind.Names.append(sys.intern(elementType))
+            ElementKind.Codes[elementType] = code
+        return code
+    
+    @staticmethod
+    def typeForCode(code):
+        return ElementKind.Names[code]
+
 class FountainElement(object):
+    __slots__ = ('_kind', '_elementText', '_isDualDialogue', '_isCentered', '_sceneNumber', '_sectionDepth')
+    
     def __init__(self, elementType = '', elementText = ''):
         self._isDualDialogue = False
         self._isCentered = False
         self._sceneNumber = None
         self._sectionDepth = 0
         
-        self._elementType = elementType
+        self._kind = ElementKind.codeForType(elementType)
         self._elementText = elementText
         
         return
+    
+    # Element kind code, see ElementKind
+    @property
+    def kind(self):
+        return self._kind
+    
+    def isKind(self, kind):
+        return self._kind == kind
+    
+    # Type string of the element kind; kept for code comparing against type strings
+    @property
+    def _elementType(self):
+        return ElementKind.Names[self._kind]
+    
+    @_elementType.setter
+    def _elementType(self, elementType):
+        self._kind = ElementKind.codeForType(elementType)
+    
+    # Codes of types outside the known list depend on the order they were first seen,
+    # so pickles carry the type string instead
+    def __getstate__(self):
+        return (self._elementType, self._elementText, self._isDualDialogue, self._isCentered, self._sceneNumber, self._sectionDepth)
+    
+    def __setstate__(self, state):
+        elementType, self._elementText, self._isDualDialogue, self._isCentered, self._sceneNumber, self._sectionDepth = state
+        self._kind = ElementKind.codeForType(elementType)
         
     def description(self):
         textOutput = self._elementText
@@ -40,7 +116,7 @@ class FountainElement(object):
             typeOutput += ' (centered)'
         elif (self._isDualDialogue):
             typeOutput += ' (dual)'
-        elif (self.__sectionDepth):
+        elif (self._sectionDepth):
             typeOutput += (' (' + str(self._sectionDepth) + ')')
         
         ret = typeOutput + ": " + textOutput
@@ -20,17 +20,29 @@
 # This module defines the Parser class for fountain scripts.
 # Ported to Python from objc in nyousefi/Fountain repository
 
-import re        
-    
-from fountain_element import FountainElement
+from fountain_element import FountainElement, ElementKind
+from fountain_tokenizer import FountainLineTokenizer
+from parse_stats import ParseStats
 from regex_rules import *
 
+# Most elements iterElements holds back for a dual dialogue cue that may still come; past
+# that many they are let go, and a later dual dialogue cue does not mark the cues among them
+DUAL_DIALOGUE_LOOKBACK_LIMIT = 256
+
 class ParserVersion(object):
     DEFAULT = 'remap'
     BASE = 'base'
     REMAP = 'remap'
     
     Versions = [DEFAULT, BASE, REMAP]
+    
+    # Parsing engines, independent of the version tag: 'regex' runs the rule set as
+    # whole-document regex passes, 'line' runs it in one pass of the line tokenizer
+    REGEX_ENGINE = 'regex'
+    LINE_ENGINE = 'line'
+    DEFAULT_ENGINE = REGEX_ENGINE
+    
+    Engines = [DEFAULT_ENGINE, REGEX_ENGINE, LINE_ENGINE]
 
 # TODO: Parser should be versioned as well as Regex
 #       As of right now, the remap update will make it unable to work with FountainRegexBase
@@ -41,26 +53,64 @@ class Parser(object):
 	# Right now each 'parser version tag' may correspond with a different function (largely duplicate of each other),
     # Though they don't necessarily need to: regex_rules are summarized in corresponding rule class variables.
     # Left here for future potential needs.    
-    def __init__(self, version = ParserVersion.DEFAULT):
+    def __init__(self, version = ParserVersion.DEFAULT, engine = ParserVersion.DEFAULT_ENGINE):
         self._version = version
         if self._version == ParserVersion.REMAP:
-            self._fountainRegex = FountainRegexRemap()
+            self._fountainRegex = sharedRules(FountainRegexRemap)
             self.parseBodyOfFile = self.parseBodyOfFileBase
             self.parseTitlePageOfFile = self.parseTitlePageOfFileBase
         elif self._version == ParserVersion.BASE:
-            self._fountainRegex = FountainRegexBase()
+            self._fountainRegex = sharedRules(FountainRegexBase)
             self.parseBodyOfFile = self.parseBodyOfFileBase
             self.parseTitlePageOfFile = self.parseTitlePageOfFileBase
         else:
             # Right now using remap as default
             self._version == ParserVersion.DEFAULT
-            self._fountainRegex = FountainRegexRemap()
+            self._fountainRegex = sharedRules(FountainRegexRemap)
             self.parseBodyOfFile = self.parseBodyOfFileBase
             self.parseTitlePageOfFile = self.parseTitlePageOfFileBase
+        
+        self._engine = engine
+        if self._engine == ParserVersion.LINE_ENGINE:
+            self._tokenizer = FountainLineTokenizer(self._fountainRegex)
+            self.parseBodyOfString = self.parseBodyOfStringLine
+            self.parseBodyOfContent = self.parseBodyOfContentLine
+            self.iterBodyOfContent = self.iterBodyOfContentLine
+        else:
+            self._engine = ParserVersion.REGEX_ENGINE
+            self.parseBodyOfString = self.parseBodyOfStringBase
+            self.parseBodyOfContent = self.parseBodyOfContentBase
+            self.iterBodyOfContent = self.iterBodyOfContentBase
+        
+        # Profiling is off unless enableStats is called
+        self._stats = None
+        # Tracing is off unless setTracer is called (see parse_trace)
+        self._tracer = None
+        # (body, chunks, settled end) of the last sceneChunksOfEditedBody call
+        self._editedBodyChunks = None
         return
     
-    def bodyOfString(self, string):
-        body = re.sub(self._fountainRegex.SLASH_N_PATTERN, self._fountainRegex.EMPTY_REPLACEMENT, string)
+    # Hands the markup and elements of every body parsed from now on to tracer;
+    # None turns tracing off
+    def setTracer(self, tracer):
+        self._tracer = tracer
+        return
+    
+    # Turns profiling on; the returned stats object collects timings of every body
+    # parsed from now on
+    def enableStats(self):
+        self._stats = ParseStats(self._fountainRegex._ruleNames, self._fountainRegex._patterns)
+        return self._stats
+    
+    def disableStats(self):
+        self._stats = None
+        return
+    
+    def splitString(self, string):
+        # Splits the document into its body and title page in one go; the title page
+        # is None if the document does not start with one
+        body = self._fountainRegex.SLASH_N_REGEX.sub(self._fountainRegex.EMPTY_REPLACEMENT, string)
+        titlePage = None
         
         # Find title page by looking for the first blank line, then checking the
         # text above it. If a title page is found we remove it, leaving only the
@@ -73,34 +123,263 @@ class Parser(object):
             documentTop += self._fountainRegex.NEWLINE_DEFAULT
             
             # check if this is a title page
-            if re.search(self._fountainRegex.TITLE_PAGE_PATTERN, documentTop):
+            if self._fountainRegex.TITLE_PAGE_REGEX.search(documentTop):
                 # TODO: check if the index is correct
                 body = body[firstBlankLine:]
                 
-        ret = self._fountainRegex.DOUBLE_NEWLINES_PATTERN + body + self._fountainRegex.DOUBLE_NEWLINES_PATTERN
-        return ret
+                documentTop = self._fountainRegex.TITLE_NEWLINE_ENDING_REGEX.sub(self._fountainRegex.EMPTY_REPLACEMENT, documentTop)
+                titlePage = self._fountainRegex.TITLE_NOT_NEWLINE_REGEX.sub(self._fountainRegex.EMPTY_REPLACEMENT, documentTop)
+                
+        body = self._fountainRegex.DOUBLE_NEWLINES_PATTERN + body + self._fountainRegex.DOUBLE_NEWLINES_PATTERN
+        return body, titlePage
+    
+    def bodyOfString(self, string):
+        return self.splitString(string)[0]
     
     def titlePageOfString(self, string):
-        body = re.sub(self._fountainRegex.SLASH_N_PATTERN, self._fountainRegex.EMPTY_REPLACEMENT, string)
+        return self.splitString(string)[1]
+    
+    # Parses body and title page of a document, splitting it only once;
+    # returns the element array and the title page contents dictionary
+    def parseString(self, string):
+        # Files are read with universal newlines, buffers may still carry \r
+        if self._fountainRegex.CARRIAGE_RETURN in string:
+            string = self._fountainRegex.UNIVERSAL_LINE_BREAKS_REGEX.sub(self._fountainRegex.UNIVERSAL_LINE_BREAKS_TEMPLATE, string)
         
-        # Find title page by looking for the first blank line, then checking the
-        # text above it. If a title page is found we remove it, leaving only the
-        # body content.
+        body, titlePage = self.splitString(string)
+        return self.parseBodyOfContent(body), self.parseTitlePageContents(titlePage)
+    
+    # Same as parseString, but the body elements come as an iterator that parses them
+    # while it is consumed, see iterElements; the title page is parsed right away
+    def iterString(self, string):
+        if self._fountainRegex.CARRIAGE_RETURN in string:
+            string = self._fountainRegex.UNIVERSAL_LINE_BREAKS_REGEX.sub(self._fountainRegex.UNIVERSAL_LINE_BREAKS_TEMPLATE, string)
         
-        firstBlankLine = body.find(self._fountainRegex.DOUBLE_NEWLINES_PATTERN)
-        if firstBlankLine > 0:
-            # TODO: check if the index is correct
-            documentTop = body[:(firstBlankLine + 1)]
-            documentTop += self._fountainRegex.NEWLINE_DEFAULT
-            
-            # check if this is a title page
-            if re.search(self._fountainRegex.TITLE_PAGE_PATTERN, documentTop):
-                documentTop = re.sub(self._fountainRegex.TITLE_NEWLINE_ENDING_PATTERN, self._fountainRegex.EMPTY_REPLACEMENT, documentTop)
-                documentTop = re.sub(self._fountainRegex.TITLE_NOT_NEWLINE_PATTERN, self._fountainRegex.EMPTY_REPLACEMENT, documentTop)
-                return documentTop
-        return
+        body, titlePage = self.splitString(string)
+        return self.iterBodyOfContent(body), self.parseTitlePageContents(titlePage)
+    
+    def parseFile(self, path):
+        with open(path) as inputFile:
+            data = inputFile.read()
+            return self.parseString(data)
+    
+    # Splits a body as returned by splitString into scene chunks, so that scenes can be
+    # parsed on their own (see parseSceneChunk); ''.join(chunks) is the body again.
+    # Every chunk but the first starts with a scene heading that follows a blank line
+    # not taken by the line before it.
+    def sceneChunksOfBody(self, body):
+        return self.sceneChunksAndSettledEnd(body)[0]
+    
+    # Same as sceneChunksOfBody, for a body that is an edit of the one of the last call:
+    # the chunks in front of the edit are kept, and only the body from there on is split
+    # again. A chunk is only kept if it ends before the settled end of the last body, so
+    # that no comment opening in front of it can be closed by text after the edit
+    def sceneChunksOfEditedBody(self, body):
+        chunks = []
+        resume = 0
+        if self._editedBodyChunks is not None:
+            lastBody, lastChunks, settledEnd = self._editedBodyChunks
+            if body == lastBody:
+                return list(lastChunks)
+            # the chunk a resume starts at must be unchanged too, for its heading line
+            chunkStart = 0
+            for index, chunk in enumerate(lastChunks):
+                if (chunkStart > settledEnd or not body.startswith(chunk, chunkStart)):
+                    break
+                if index > 0:
+                    chunks = list(lastChunks[:index])
+                    resume = chunkStart
+                chunkStart += len(chunk)
+        
+        tailChunks, tailSettledEnd = self.sceneChunksAndSettledEnd(body[resume:])
+        chunks += tailChunks
+        self._editedBodyChunks = (body, tuple(chunks), resume + tailSettledEnd)
+        return chunks
+    
+    # Scene chunks of body, and its settled end: the position of the first comment opening
+    # that one of the comment passes tried but could not close (the end of the body if there
+    # is none). Text appended after the settled end cannot change the comments in front of it
+    def sceneChunksAndSettledEnd(self, body):
+        # The comment openings the passes try: a boneyard or note opening mark after a newline
+        commentMarks = [(match.start(), match.group()) for match in self._fountainRegex.COMMENT_MARK_REGEX.finditer(body)]
+        blockOpenings = [position - 1 for (position, mark) in commentMarks if mark == self._fountainRegex.BONEYARD_OPEN_MARK and body[position - 1:position] == self._fountainRegex.NEWLINE_DEFAULT]
+        noteOpenings = [position - 1 for (position, mark) in commentMarks if mark == self._fountainRegex.NOTE_OPEN_MARK and body[position - 1:position] == self._fountainRegex.NEWLINE_DEFAULT]
+        
+        # Like parseBodyOfContentBase, look for notes once the newlines inside boneyards are
+        # gone, so that a note does not end inside a boneyard
+        blockSpans = [match.span() for match in self._fountainRegex.BLOCK_COMMENT_SPAN_REGEX.finditer(body)]
+        maskedBody = body
+        if blockSpans:
+            pieces = []
+            pieceStart = 0
+            for (spanStart, spanEnd) in blockSpans:
+                pieces.append(body[pieceStart:spanStart + 1])
+                pieces.append(body[spanStart + 1:spanEnd - 1].replace(self._fountainRegex.NEWLINE_DEFAULT, self._fountainRegex.MASKED_NEWLINE))
+                pieceStart = spanEnd - 1
+            pieces.append(body[pieceStart:])
+            maskedBody = ''.join(pieces)
+        noteSpans = [match.span() for match in self._fountainRegex.BRACKET_COMMENT_SPAN_REGEX.finditer(maskedBody)]
+        settledEnd = self.firstUnclosedOpening(blockOpenings, blockSpans, len(body))
+        settledEnd = self.firstUnclosedOpening(noteOpenings, noteSpans, settledEnd)
+        # and a comment may end up elsewhere once the markup passes are through with it
+        markupSpans, settledEnd = self.markupCommentSpans(body, blockOpenings, noteOpenings, settledEnd)
+        commentSpans = blockSpans + noteSpans + markupSpans
+        commentSpans.sort()
+        spanIndex = 0
+        # On top of that, the last note or boneyard opened before a heading must be closed
+        markIndex = 0
+        openMarks = {}
+        
+        chunks = []
+        chunkStart = 0
+        for match in self._fountainRegex.SCENE_BOUNDARY_REGEX.finditer(body):
+            boundary = match.start()
+            while spanIndex < len(commentSpans) and commentSpans[spanIndex][1] <= boundary:
+                spanIndex += 1
+            if spanIndex < len(commentSpans) and commentSpans[spanIndex][0] < boundary:
+                continue
+            while markIndex < len(commentMarks) and commentMarks[markIndex][0] < boundary:
+                mark = commentMarks[markIndex][1]
+                if mark == self._fountainRegex.NOTE_CLOSE_MARK:
+                    openMarks[self._fountainRegex.NOTE_OPEN_MARK] = False
+                elif mark == self._fountainRegex.BONEYARD_CLOSE_MARK:
+                    openMarks[self._fountainRegex.BONEYARD_OPEN_MARK] = False
+                else:
+                    openMarks[mark] = True
+                markIndex += 1
+            if openMarks.get(self._fountainRegex.NOTE_OPEN_MARK) or openMarks.get(self._fountainRegex.BONEYARD_OPEN_MARK):
+                continue
+            # the last non-blank line before the heading
+            lineEnd = boundary
+            while lineEnd > 0 and body[lineEnd - 1].isspace():
+                lineEnd -= 1
+            previousLine = body[body.rfind(self._fountainRegex.NEWLINE_DEFAULT, 0, lineEnd) + 1:lineEnd]
+            if self._fountainRegex.BLANK_EATING_LINE_REGEX.match(previousLine):
+                continue
+            chunks.append(body[chunkStart:boundary])
+            chunkStart = boundary
+        chunks.append(body[chunkStart:])
+        return chunks, settledEnd
+    
+    # The first of openings (sorted positions) at which none of spans (sorted, apart) starts
+    # or lies, that is one a pass tried and could not close, if it comes before end; else end
+    def firstUnclosedOpening(self, openings, spans, end):
+        spanIndex = 0
+        for position in openings:
+            if position >= end:
+                break
+            while (spanIndex < len(spans) and spans[spanIndex][1] <= position):
+                spanIndex += 1
+            if (spanIndex == len(spans) or spans[spanIndex][0] > position):
+                return position
+        return end
+    
+    # Spans of the boneyards and notes in the marked up body of markupOfContentBase. Its
+    # comment rules run on a copy of the body in the same order, with every replacement
+    # kept to the same length, so that the spans line up with the body: a boneyard that
+    # does not match before < and > are sanitized can still match after, and then end
+    # at a closing mark further down, when the one before it went into a note.
+    # settledEnd is lowered to the first of the boneyard and note openings a pass could not close
+    def markupCommentSpans(self, body, blockOpenings, noteOpenings, settledEnd):
+        fountainRegex = self._fountainRegex
+        if not (blockOpenings or noteOpenings):
+            return [], settledEnd
+        
+        passSpans = []
+        def maskNewlines(match):
+            return match.group(0).replace(fountainRegex.NEWLINE_DEFAULT, fountainRegex.MASKED_NEWLINE)
+        def maskInnerNewlines(match):
+            passSpans.append(match.span())
+            text = match.group(0)
+            return text[0] + maskNewlines(match)[1:-1] + text[-1]
+        
+        # 1st pass: newlines in boneyards, then in notes, then sanitizing
+        markup = fountainRegex.BLOCK_COMMENT_REGEX.sub(maskInnerNewlines, body)
+        settledEnd = self.firstUnclosedOpening(blockOpenings, passSpans, settledEnd)
+        passSpans = []
+        markup = fountainRegex.BRACKET_COMMENT_REGEX.sub(maskInnerNewlines, markup)
+        settledEnd = self.firstUnclosedOpening(noteOpenings, passSpans, settledEnd)
+        markup = markup.replace(fountainRegex.LESS_THAN_PATTERN, fountainRegex.MASKED_NEWLINE)
+        markup = markup.replace(fountainRegex.MORE_THAN_PATTERN, fountainRegex.MASKED_NEWLINE)
+        
+        # 2nd pass: boneyards are wrapped in tags, which no note can cross
+        spans = [match.span() for match in fountainRegex.BLOCK_COMMENT_REGEX.finditer(markup)]
+        if spans:
+            pieces = []
+            pieceStart = 0
+            for (spanStart, spanEnd) in spans:
+                pieces.append(markup[pieceStart:spanStart + 1])
+                pieces.append(fountainRegex.LESS_THAN_PATTERN * 2)
+                pieces.append(markup[spanStart + 3:spanEnd - 3])
+                pieces.append(fountainRegex.MORE_THAN_PATTERN * 2)
+                pieceStart = spanEnd - 1
+            pieces.append(markup[pieceStart:])
+            markup = ''.join(pieces)
+        settledEnd = self.firstUnclosedOpening(blockOpenings, spans, settledEnd)
+        noteSpans = [match.span() for match in fountainRegex.BRACKET_COMMENT_REGEX.finditer(markup)]
+        settledEnd = self.firstUnclosedOpening(noteOpenings, noteSpans, settledEnd)
+        return spans + noteSpans, settledEnd
+    
+    # Parses one chunk from sceneChunksOfBody; chunks after the first are parsed behind the
+    # blank line they follow in the body, which gives the elements the full body would.
+    # firstIndex is the number of elements before the chunk. A dual dialogue cue looks back
+    # for the cues it pairs with; if that lookback runs off the start of the chunk,
+    # _dualDialogueLookbackOpen is set and the chunk has to be parsed together with the
+    # one before it
+    def parseSceneChunk(self, chunk, first = False, firstIndex = 0):
+        self._dualDialogueLookbackOpen = False
+        if chunk.strip() == '':
+            return []
+        if not first:
+            chunk = self._fountainRegex.DOUBLE_NEWLINES_PATTERN + chunk
+        return self.parseBodyOfContent(chunk, firstIndex) or []
     
     def parseBodyOfStringBase(self, string):
+        return self.parseBodyOfContentBase(self.bodyOfString(string))
+    
+    def parseBodyOfStringLine(self, string):
+        return self.parseBodyOfContentLine(self.bodyOfString(string))
+    
+    # Takes the body as split by splitString
+    def parseBodyOfContentBase(self, scriptContent, firstIndex = 0):
+        scriptContent = self.markupOfContentBase(scriptContent)
+        if scriptContent is None:
+            return
+        
+        # 3rd pass - Array construction
+        stats = self._stats
+        if stats is not None:
+            passStart = stats.clock()
+        tagMatching = self._fountainRegex.TAG_REGEX.findall(scriptContent)
+        if not tagMatching:
+            print('WARNING: Tag patterns does not match scriptContent')
+            return
+        
+        elementsArray = self.constructElements(tagMatching, firstIndex)
+        if stats is not None:
+            stats.addPass('array construction pass', stats.clock() - passStart)
+        return elementsArray
+    
+    # Same as parseBodyOfContentBase, but yields the elements one by one from the marked up
+    # body instead of building the element array (see iterElements)
+    def iterBodyOfContentBase(self, scriptContent, firstIndex = 0):
+        scriptContent = self.markupOfContentBase(scriptContent)
+        if scriptContent is None:
+            return
+        
+        tagMatching = (match.groups() for match in self._fountainRegex.TAG_REGEX.finditer(scriptContent))
+        elementCount = 0
+        for element in self.iterElements(tagMatching, firstIndex):
+            if self._tracer is not None:
+                self._tracer.traceElement(element)
+            elementCount += 1
+            yield element
+        if elementCount == 0:
+            print('WARNING: Tag patterns does not match scriptContent')
+    
+    # The 1st and 2nd pass of parseBodyOfContentBase: the body in the intermediate marked
+    # up format, or None if the rule set is broken
+    def markupOfContentBase(self, scriptContent):
         # Three-pass parsing method. 
         # 1st we check for block comments, and manipulate them for regexes
         # 2nd we run regexes against the file to convert it into a marked up format 
@@ -111,37 +390,37 @@ class Parser(object):
         # even if it means less efficiency overall.
         #
         
-        scriptContent = self.bodyOfString(string)
-        
         # 1st pass - Block comments
         # The regexes aren't smart enough (yet) to deal with newlines in the
         # comments, so we need to convert them before processing.
         
-        # TODO: this tries to replace '\n' in block comments to '', but does not look smart
-        blockComments = re.findall(self._fountainRegex.BLOCK_COMMENT_PATTERN, scriptContent)
-        if blockComments:
-            for blockComment in blockComments:
-                modifiedBlock = blockComment.replace(self._fountainRegex.NEWLINE_DEFAULT, self._fountainRegex.NEWLINE_REPLACEMENT)
-                scriptContent = scriptContent.replace(blockComment, modifiedBlock)
-        
-        # TODO: this tries to replace '\n' in bracket comments to '', but does not look smart
-        bracketComments = re.findall(self._fountainRegex.BRACKET_COMMENT_PATTERN, scriptContent)
-        if bracketComments:
-            for bracketComment in bracketComments:
-                modifiedBlock = bracketComment.replace(self._fountainRegex.NEWLINE_DEFAULT, self._fountainRegex.NEWLINE_REPLACEMENT)
-                scriptContent = scriptContent.replace(bracketComment, modifiedBlock)
-            
+        stats = self._stats
+        if stats is not None:
+            stats.addParse(len(scriptContent))
+            passStart = stats.clock()
+        
+        scriptContent = self.maskedSceneNumbers(scriptContent)
+        
+        # Newlines in boneyards, then in notes, are replaced in one scan each; only the
+        # matched comment is touched, not the same text elsewhere in the script
+        scriptContent = self._fountainRegex.BLOCK_COMMENT_REGEX.sub(self.protectCommentNewlines, scriptContent)
+        scriptContent = self._fountainRegex.BRACKET_COMMENT_REGEX.sub(self.protectCommentNewlines, scriptContent)
+        
         # Sanitize < and > chars for conversion to the markup
         # TODO: need to make sure &lt and &gt are not special objc characters
         scriptContent = scriptContent.replace(self._fountainRegex.LESS_THAN_PATTERN, self._fountainRegex.LESS_THAN_REPLACEMENT)
         scriptContent = scriptContent.replace(self._fountainRegex.MORE_THAN_PATTERN, self._fountainRegex.MORE_THAN_REPLACEMENT)
         scriptContent = scriptContent.replace(self._fountainRegex.DOT_DOT_PATTERN, self._fountainRegex.DOT_DOT_REPLACEMENT)
         
+        if stats is not None:
+            stats.addPass('comment and sanitize pass', stats.clock() - passStart)
+            passStart = stats.clock()
+        
         # 2nd pass - Regexes
         # Blast the script with regexes. 
         # Make sure pattern and template regexes match up!
         
-        patterns = self._fountainRegex._patterns
+        patterns = self._fountainRegex._compiledPatterns
         templates = self._fountainRegex._templates
                      
         # Validate the array counts (protection purposes only)
@@ -149,104 +428,220 @@ class Parser(object):
             print('Templates and patterns length mismatch')
             return
         
-        for i in range(0, len(templates)):
-            scriptContent = re.sub(patterns[i], templates[i], scriptContent)
+        if stats is None:
+            for i in range(0, len(templates)):
+                scriptContent = patterns[i].sub(templates[i], scriptContent)
+        else:
+            # Same loop, with wall time, match count and size change recorded per rule
+            for i in range(0, len(templates)):
+                sizeBefore = len(scriptContent)
+                ruleStart = stats.clock()
+                scriptContent, matches = patterns[i].subn(templates[i], scriptContent)
+                stats.addRule(i, stats.clock() - ruleStart, matches, len(scriptContent) - sizeBefore)
+            stats.addPass('rule pass', stats.clock() - passStart)
             
-        # For debug only: make the intermediate content human readable
-        # TODO: Make sure this creates a copy of the string 'scriptContent'
-        if __debug__:
-            print('*** Parsed body string with elements ***\n')
-            debugContent = re.sub(self._fountainRegex.MULTI_NEWLINES_PATTERN, self._fountainRegex.EMPTY_REPLACEMENT, scriptContent)
-            debugContent = re.sub(self._fountainRegex.CLOSING_TAG_PATTERN, self._fountainRegex.CLOSING_TAG_REPLACEMENT, debugContent)
-            print(debugContent)
-            print('\n*** Individual elements from element array ***\n')
+        # For tracing only: make the intermediate content human readable
+        if self._tracer is not None:
+            debugContent = self._fountainRegex.MULTI_NEWLINES_REGEX.sub(self._fountainRegex.EMPTY_REPLACEMENT, scriptContent)
+            debugContent = self._fountainRegex.CLOSING_TAG_REGEX.sub(self._fountainRegex.CLOSING_TAG_REPLACEMENT, debugContent)
+            self._tracer.traceMarkup(debugContent)
         
-        # 3rd pass - Array construction
-        tagMatching = re.findall(self._fountainRegex.TAG_PATTERN, scriptContent)
+        return scriptContent
+    
+    # Takes the body as split by splitString
+    def parseBodyOfContentLine(self, scriptContent, firstIndex = 0):
+        # Single-pass parsing method.
+        # The line tokenizer classifies the sanitized script line by line, applying the
+        # same rules as the 2nd pass of parseBodyOfContentBase, and yields (type, text)
+        # pairs directly instead of going through the intermediate marked up format.
+        
+        scriptContent = self.sanitizedContentLine(scriptContent)
+        
+        stats = self._stats
+        if stats is not None:
+            passStart = stats.clock()
+        
+        # The tokenizer applies all rules line by line, so there are no per rule timings
+        tagMatching = list(self._tokenizer.tokenize(scriptContent))
         if not tagMatching:
             print('WARNING: Tag patterns does not match scriptContent')
             return
-        elementTexts = [temp[1] for temp in tagMatching]
-        elementTypes = [temp[0] for temp in tagMatching]
         
-        if (len(elementTexts) != len(elementTypes)):
-            print('ERROR: Text and Type counts don\'t match.')
-            return
+        if stats is not None:
+            stats.addPass('line tokenizer pass', stats.clock() - passStart)
+            passStart = stats.clock()
         
-        elementsArray = []
+        elementsArray = self.constructElements(tagMatching, firstIndex)
+        if stats is not None:
+            stats.addPass('array construction pass', stats.clock() - passStart)
+        return elementsArray
+    
+    # Same as parseBodyOfContentLine, but yields the elements one by one as the tokenizer
+    # classifies the lines, instead of building the element array (see iterElements)
+    def iterBodyOfContentLine(self, scriptContent, firstIndex = 0):
+        scriptContent = self.sanitizedContentLine(scriptContent)
         
-        for i in range(0, len(elementTypes)):
-            # Convert <, > and ... back to normal
-            cleanedText = elementTexts[i]
-            cleanedText = cleanedText.replace(self._fountainRegex.LESS_THAN_REPLACEMENT, self._fountainRegex.LESS_THAN_PATTERN)
-            cleanedText = cleanedText.replace(self._fountainRegex.MORE_THAN_REPLACEMENT, self._fountainRegex.MORE_THAN_PATTERN)
-            cleanedText = cleanedText.replace(self._fountainRegex.DOT_DOT_REPLACEMENT, self._fountainRegex.DOT_DOT_PATTERN)
-            
-            # TODO: strip() strips white space characters by default, though original method was only stripping newline characters
-            element = FountainElement(elementTypes[i], cleanedText.strip())
-            
-            # Deal with scene numbers if we are in a scene heading
-            if (elementTypes[i] != self._fountainRegex.SCENE_HEADING_PATTERN):
-                sceneMatching = re.search(self._fountainRegex.SCENE_NUMBER_PATTERN, cleanedText)
-                # TODO: Index checking
-                if sceneMatching:
-                    fullSceneNumberText = sceneMatching.group(1)
-                    sceneNumber = sceneMatching.group(2)
-                    # TODO: if statement checking
-                    if sceneNumber:
-                        element._sceneNumber = sceneNumber
-                        cleanedText = cleanedText.replace(fullSceneNumberText, self._fountainRegex.EMPTY_REPLACEMENT)
-            
-            # More refined processing of elements based on text/type
-            if (re.search(self._fountainRegex.CENTERED_TEXT_PATTERN, element._elementText)):
-                element._isCentered = True
-                # TODO: index checking; Original code contains stringByTrimmingCharactersInSet:[NSCharacterSet whitespaceCharacterSet]
-                element._elementText = re.search(self._fountainRegex.ELEMENT_TEXT_PATTERN, element._elementText).group(2).strip()
-            
-            if (element._elementType == self._fountainRegex.SCENE_HEADING_PATTERN):
-                # TODO: index checking
-                element._elementText = re.search(self._fountainRegex.ELEMENT_TEXT_WITH_SCENE_HEADING_PATTERN, element._elementText).group(1)
+        elementCount = 0
+        for element in self.iterElements(self._tokenizer.tokenize(scriptContent), firstIndex):
+            if self._tracer is not None:
+                self._tracer.traceElement(element)
+            elementCount += 1
+            yield element
+        if elementCount == 0:
+            print('WARNING: Tag patterns does not match scriptContent')
+    
+    # The body with <, > and ... sanitized as in parseBodyOfContentBase, for the line tokenizer
+    def sanitizedContentLine(self, scriptContent):
+        stats = self._stats
+        if stats is not None:
+            stats.addParse(len(scriptContent))
+            passStart = stats.clock()
+        
+        scriptContent = self.maskedSceneNumbers(scriptContent)
+        scriptContent = scriptContent.replace(self._fountainRegex.LESS_THAN_PATTERN, self._fountainRegex.LESS_THAN_REPLACEMENT)
+        scriptContent = scriptContent.replace(self._fountainRegex.MORE_THAN_PATTERN, self._fountainRegex.MORE_THAN_REPLACEMENT)
+        scriptContent = scriptContent.replace(self._fountainRegex.DOT_DOT_PATTERN, self._fountainRegex.DOT_DOT_REPLACEMENT)
+        scriptContent = self._fountainRegex.UNIVERSAL_LINE_BREAKS_REGEX.sub(self._fountainRegex.UNIVERSAL_LINE_BREAKS_TEMPLATE, scriptContent)
+        
+        if stats is not None:
+            stats.addPass('sanitize pass', stats.clock() - passStart)
+        return scriptContent
+    
+    # The body with the #s of scene numbers ending scene heading lines masked, so that
+    # no rule takes them for a section heading (see SCENE_NUMBER_MARK_PATTERN)
+    def maskedSceneNumbers(self, scriptContent):
+        if not (self._fountainRegex.SECTION_HEADER_MARK in scriptContent):
+            return scriptContent
+        return self._fountainRegex.SCENE_NUMBER_MARK_REGEX.sub(self._fountainRegex.SCENE_NUMBER_MARK_TEMPLATE, scriptContent)
+    
+    # Replacement for a block or bracket comment match in the 1st pass: newlines in the
+    # comment text (group 1) are hidden from the regexes, the rest of the match is kept
+    def protectCommentNewlines(self, match):
+        comment = match.group(1)
+        if not (self._fountainRegex.NEWLINE_DEFAULT in comment):
+            return match.group(0)
+        matchText = match.group(0)
+        commentStart = match.start(1) - match.start(0)
+        commentEnd = match.end(1) - match.start(0)
+        return matchText[:commentStart] + comment.replace(self._fountainRegex.NEWLINE_DEFAULT, self._fountainRegex.NEWLINE_REPLACEMENT) + matchText[commentEnd:]
+    
+    # Builds the element array from (type, text) pairs; text is still sanitized.
+    # firstIndex is the number of elements parsed before these ones
+    def constructElements(self, tagMatching, firstIndex = 0):
+        elementsArray = list(self.iterElements(tagMatching, firstIndex))
+        
+        if self._tracer is not None:
+            for element in elementsArray:
+                self._tracer.traceElement(element)
+        
+        return elementsArray
+    
+    # Yields the elements of (type, text) pairs, each one once it is final.
+    # A dual dialogue cue marks every character cue back to the last dialogue, parenthetical
+    # or scene heading as dual dialogue too, so cues after the last of those, and whatever
+    # follows them, are held back until the next one (or the end) shows no later cue can
+    # mark them any more. At most DUAL_DIALOGUE_LOOKBACK_LIMIT elements are held back.
+    def iterElements(self, tagMatching, firstIndex = 0):
+        self._dualDialogueLookbackOpen = False
+        # Elements held back, from the first character cue after the last dialogue, parenthetical or scene heading
+        lookback = []
+        # Whether a dialogue, parenthetical or scene heading was seen; the lookback of a dual dialogue cue stops there
+        dialogueSeen = False
+        
+        for i, (elementType, elementText) in enumerate(tagMatching):
+            element = self.elementForTag(elementType, elementText)
             
-            if (element._elementType == self._fountainRegex.SECTION_HEADING_PATTERN):
-                depthChars = re.search(self._fountainRegex.SECTION_HEADER_PATTERN, element._elementText).group(2)
-                depth = len(depthChars)
-                element._sectionDepth = depth
-                element._elementText = re.search(self._fountainRegex.SECTION_HEADER_PATTERN, element._elementText).group(3)
-                
             # TODO: Dual dialogue related features are not tested
-            if (i > 1 and element._elementType == self._fountainRegex.CHARACTER_TAG_PATTERN and re.search(self._fountainRegex.DUAL_DIALOGUE_PATTERN, element._elementText)):
+            if ((firstIndex + i) > 1 and element._kind == ElementKind.CHARACTER and self._fountainRegex.DUAL_DIALOGUE_REGEX.search(element._elementText)):
                 element._isDualDialogue = True
                 # clean the ^ mark
-                element._elementText = re.sub(self._fountainRegex.CHARACTER_DUAL_DIALOGUE_PATTERN, self._fountainRegex.EMPTY_REPLACEMENT, element._elementText);
-                # find the previous character cue
-                j = i - 1
-                
-                # Replacement for original do-while loop
-                while True:
-                    previousElement = elementsArray[j]
-                    if (previousElement._elementType == self._fountainRegex.CHARACTER_TAG_PATTERN):
+                element._elementText = self._fountainRegex.CHARACTER_DUAL_DIALOGUE_REGEX.sub(self._fountainRegex.EMPTY_REPLACEMENT, element._elementText);
+                # mark the previous character cues
+                for previousElement in lookback:
+                    if (previousElement._kind == ElementKind.CHARACTER):
                         previousElement._isDualDialogue = True
-                        previousElement._elementText = re.sub(self._fountainRegex.DUAL_DIALOGUE_ANGLE_MARK_PATTERN, self._fountainRegex.EMPTY_REPLACEMENT, previousElement._elementText)
-                    j -= 1
-                    if (j < 0 or previousElement._elementType == self._fountainRegex.DIALOGUE_TAG_PATTERN or previousElement._elementType == self._fountainRegex.PARENTHETICAL_TAG_PATTERN):
-                        break
+                        previousElement._elementText = self._fountainRegex.DUAL_DIALOGUE_ANGLE_MARK_REGEX.sub(self._fountainRegex.EMPTY_REPLACEMENT, previousElement._elementText)
+                # the lookback ran off the start of these elements
+                if (not dialogueSeen and firstIndex > 0):
+                    self._dualDialogueLookbackOpen = True
             
-            elementsArray.append(element)
-            
-            if __debug__:
-                print(element._elementText)
-                print(element._elementType + "\n")
+            if (element._kind == ElementKind.DIALOGUE or element._kind == ElementKind.PARENTHETICAL or element._kind == ElementKind.SCENE_HEADING):
+                dialogueSeen = True
+                for previousElement in lookback:
+                    yield previousElement
+                lookback = []
+                yield element
+            elif (lookback or element._kind == ElementKind.CHARACTER):
+                lookback.append(element)
+                # a cue left without dialogue this long is let go; as the limit counts from
+                # the first held cue, chunks parsed behind a dialogue or heading agree with
+                # the whole body on where that happens
+                if (len(lookback) >= DUAL_DIALOGUE_LOOKBACK_LIMIT):
+                    for previousElement in lookback:
+                        yield previousElement
+                    lookback = []
+            else:
+                yield element
         
-        return elementsArray
+        for previousElement in lookback:
+            yield previousElement
+    
+    # One element from a (type, text) pair; text is still sanitized
+    def elementForTag(self, elementType, elementText):
+        # Convert <, > and ... back to normal
+        cleanedText = elementText
+        cleanedText = cleanedText.replace(self._fountainRegex.LESS_THAN_REPLACEMENT, self._fountainRegex.LESS_THAN_PATTERN)
+        cleanedText = cleanedText.replace(self._fountainRegex.MORE_THAN_REPLACEMENT, self._fountainRegex.MORE_THAN_PATTERN)
+        cleanedText = cleanedText.replace(self._fountainRegex.DOT_DOT_REPLACEMENT, self._fountainRegex.DOT_DOT_PATTERN)
+        
+        # Deal with scene numbers if we are in a scene heading; elsewhere a masked scene
+        # number is put back as it was written
+        sceneNumber = None
+        if (self._fountainRegex.SCENE_NUMBER_MASK in cleanedText):
+            sceneMatching = self._fountainRegex.MASKED_SCENE_NUMBER_REGEX.search(cleanedText)
+            if (sceneMatching and elementType == self._fountainRegex.SCENE_HEADING_PATTERN):
+                sceneNumber = sceneMatching.group(1)
+                cleanedText = cleanedText[:sceneMatching.start()] + cleanedText[sceneMatching.end():]
+            else:
+                cleanedText = cleanedText.replace(self._fountainRegex.SCENE_NUMBER_MASK, self._fountainRegex.SECTION_HEADER_MARK)
+        
+        # TODO: strip() strips white space characters by default, though original method was only stripping newline characters
+        element = FountainElement(elementType, cleanedText.strip())
+        element._sceneNumber = sceneNumber
+        
+        # More refined processing of elements based on text/type
+        if (self._fountainRegex.CENTERED_TEXT_REGEX.search(element._elementText)):
+            element._isCentered = True
+            # TODO: index checking; Original code contains stringByTrimmingCharactersInSet:[NSCharacterSet whitespaceCharacterSet]
+            element._elementText = self._fountainRegex.ELEMENT_TEXT_REGEX.search(element._elementText).group(2).strip()
+        
+        if (element._kind == ElementKind.SCENE_HEADING):
+            # TODO: index checking
+            element._elementText = self._fountainRegex.ELEMENT_TEXT_WITH_SCENE_HEADING_REGEX.search(element._elementText).group(1)
+        
+        if (element._kind == ElementKind.SECTION_HEADING):
+            depthChars = self._fountainRegex.SECTION_HEADER_REGEX.search(element._elementText).group(2)
+            depth = len(depthChars)
+            element._sectionDepth = depth
+            element._elementText = self._fountainRegex.SECTION_HEADER_REGEX.search(element._elementText).group(3)
+        
+        return element
     
     def parseBodyOfFileBase(self, path):        
         with open(path) as inputFile:
             data = inputFile.read()
-            return self.parseBodyOfStringBase(data)
+            return self.parseBodyOfString(data)
         
     def parseTitlePageOfStringBase(self, string):
-        pageTitle = self.titlePageOfString(string)
+        return self.parseTitlePageContents(self.titlePageOfString(string))
+    
+    # Takes the title page as split by splitString
+    def parseTitlePageContents(self, pageTitle):
         contents = {}
+        # No title page, no contents
+        if pageTitle is None:
+            return contents
+        
         openDirective = ''
         directiveData = []
         
@@ -254,15 +649,15 @@ class Parser(object):
         lines = pageTitle.split('\n')
         for line in lines:
             # TODO: may want to use match instead of search here
-            if re.match(self._fountainRegex.INLINE_DIRECTIVE_PATTERN, line):
+            if self._fountainRegex.INLINE_DIRECTIVE_REGEX.match(line):
                 # if there's an open directive with data, save it
                 if (openDirective != '' and len(directiveData) > 0):
                     contents[openDirective] = directiveData
                     directiveData = []
                 openDirective = ''
                 
-                key = re.search(self._fountainRegex.INLINE_DIRECTIVE_PATTERN, line).group(1).lower()
-                val = re.search(self._fountainRegex.INLINE_DIRECTIVE_PATTERN, line).group(2)
+                key = self._fountainRegex.INLINE_DIRECTIVE_REGEX.search(line).group(1).lower()
+                val = self._fountainRegex.INLINE_DIRECTIVE_REGEX.search(line).group(2)
                 
                 if (key == 'author' or key == 'author(s)'):
                     key = self._fountainRegex.TITLE_AUTHOR_STRING
@@ -273,18 +668,18 @@ class Parser(object):
                 
                 # TODO: check if this append is working correctly: here val is string directly converted to array, potentially wrong.
                 contents[key] = [val]
-            elif re.match(self._fountainRegex.MULTI_LINE_DIRECTIVE_PATTERN, line):
+            elif self._fountainRegex.MULTI_LINE_DIRECTIVE_REGEX.match(line):
                 # if there's an open directive with data, save it
                 if (openDirective != '' and len(directiveData) > 0):
                     contents[openDirective] = directiveData
                     
-                openDirective = re.match(self._fountainRegex.MULTI_LINE_DIRECTIVE_PATTERN, line).group(1).lower()
+                openDirective = self._fountainRegex.MULTI_LINE_DIRECTIVE_REGEX.match(line).group(1).lower()
                 directiveData = []
                 
                 if (openDirective == 'author' or openDirective == 'author(s)'):
                     openDirective = self._fountainRegex.TITLE_AUTHOR_STRING
-            elif re.match(self._fountainRegex.MULTI_LINE_DATA_PATTERN, line):
-                directiveData.append(re.match(self._fountainRegex.MULTI_LINE_DATA_PATTERN, line).group(2))
+            elif self._fountainRegex.MULTI_LINE_DATA_REGEX.match(line):
+                directiveData.append(self._fountainRegex.MULTI_LINE_DATA_REGEX.match(line).group(2))
         
         if (openDirective != '' and len(directiveData) > 0):
             contents[openDirective] = directiveData
@@ -24,17 +24,83 @@
 # Ported to Python from objc in nyousefi/Fountain repository
 
 from fountain_parser import Parser, ParserVersion
+from element_table import ElementTable
+from scene_index import SceneIndex
+from component_manifest import ComponentManifest
 
 class FountainScript(object):
-    def __init__(self, fileName = '', parserVersion = ParserVersion.DEFAULT):
+    # An existing parser can be passed in to be reused; it then decides version and engine
+    def __init__(self, fileName = '', parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, parser = None):
+        self._elementTable = None
+        self._sceneIndex = None
+        self._componentManifest = None
+        # Per scene state kept by incremental_renderer, None until it renders the script
+        self._sceneTexts = None
         if (fileName == ''):
             return
         self._fileName = fileName
         
-        # This parser is not optimized
-        parser = Parser(parserVersion)
-        self._elements = parser.parseBodyOfFile(self._fileName)
-        self._titlePageContents = parser.parseTitlePageOfFile(self._fileName)
+        # Reads and splits the file once for both body and title page
+        if parser is None:
+            parser = Parser(parserVersion, parserEngine)
+        self._elements, self._titlePageContents = parser.parseFile(self._fileName)
+        self._sceneIndex = SceneIndex(self._elements or [])
+        self._componentManifest = ComponentManifest(self._elements or [], parser._fountainRegex)
         
         return
-        
\ No newline at end of file
+    
+    # Constructs a script from a string or bytes buffer instead of a file name;
+    # bytes are decoded with the given encoding
+    @classmethod
+    def fromString(cls, buffer, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, encoding = 'utf-8', parser = None):
+        script = cls()
+        script._fileName = ''
+        
+        if isinstance(buffer, bytes):
+            buffer = buffer.decode(encoding)
+        
+        if parser is None:
+            parser = Parser(parserVersion, parserEngine)
+        script._elements, script._titlePageContents = parser.parseString(buffer)
+        script._sceneIndex = SceneIndex(script._elements or [])
+        script._componentManifest = ComponentManifest(script._elements or [], parser._fountainRegex)
+        
+        return script
+    
+    # Columnar view of the elements, built on first use
+    def elementTable(self):
+        if self._elementTable is None:
+            self._elementTable = ElementTable(self._elements or [])
+        return self._elementTable
+    
+    # Keeps the elements in the columnar table only, dropping the element objects;
+    # the table iterates and indexes like the element array it replaces
+    def useElementTable(self):
+        self._elements = self.elementTable()
+        return
+    
+    # Scene index of the elements; built with the script, and again on first use
+    # after the elements were changed in place (which resets it to None)
+    def sceneIndex(self):
+        if self._sceneIndex is None:
+            self._sceneIndex = SceneIndex(self._elements or [])
+        return self._sceneIndex
+    
+    # Components of the elements, see component_manifest; built with the script, and
+    # again on first use after the elements were changed in place
+    def componentManifest(self):
+        if self._componentManifest is None:
+            self._componentManifest = ComponentManifest(self._elements or [])
+        return self._componentManifest
+    
+    # Elements of scene 'ordinal', from its scene heading up to the next one
+    def sceneElements(self, ordinal):
+        start, end = self.sceneIndex().sceneRange(ordinal)
+        return self._elements[start:end]
+    
+    # Same, for the scene numbered sceneNumber; None if no heading carries that number
+    def sceneElementsForNumber(self, sceneNumber):
+        ordinal = self.sceneIndex().ordinalForNumber(sceneNumber)
+        if ordinal is None:
+            return None
+        return self.sceneElements(ordinal)
\ No newline at end of file
@@ -0,0 +1,381 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the line tokenizer, a single-pass alternative to the
+# whole-document regex passes in Parser.parseBodyOfStringBase.
+#
+# The tokenizer walks the sanitized script content once, line by line, and decides
+# for each line which rule of the regex engine would claim it. Rules are tried in
+# the same order as FountainRegexBase._patterns, using the same patterns anchored at
+# the line start, so the (type, text) pairs it yields are the ones the regex engine
+# would find in its marked up content.
+#
+# Several rules of the regex engine consume the newline that ends the line they
+# match, which hides the next line from every rule applied after it (a line right
+# after a scene heading can never be a transition, for example). The tokenizer
+# tracks this per line with the index of the rule that ate the newline.
+#
+# Boneyards and notes are claimed first, over the whole content, in the order of the
+# regex engine: its first pass hides the newlines of every boneyard, then of every note,
+# that holds no < or >, and the boneyard rule then runs before the note rule. So where
+# the marks of the two overlap, or one of them is never closed, the same comment wins.
+#
+# Known differences from the regex engine, all on input the regex engine itself
+# mangles: multi-line boneyard and notes containing < or > stay whole, a section
+# heading inside another element does not swallow the text following that element,
+# tags the regex engine nests inside each other (a dialogue wrapping an action and a
+# section heading, or a one letter synopsis taking the newline after it and wrapping
+# an action, for example) come out as flat elements, and the literal text
+# 'Page Break' is not turned into a page break element.
+
+import re
+
+# Rule indices, in the order the regex engine applies them
+BLOCK_COMMENT_RULE     = 2
+BRACKET_COMMENT_RULE   = 3
+SYNOPSIS_RULE          = 4
+FALSE_TRANSITION_RULE  = 6
+FORCED_TRANSITION_RULE = 7
+SCENE_HEADER_RULE      = 8
+TRANSITION_RULE        = 10
+CHARACTER_CUE_RULE     = 11
+
+NO_RULE                = 100
+
+class FountainLineTokenizer(object):
+    def __init__(self, fountainRegex):
+        self._fountainRegex = fountainRegex
+
+        # Compiled once per rule set, see regex_rules.sharedRules
+        self._blockCommentRegex = fountainRegex.BLOCK_COMMENT_REGEX
+        self._bracketCommentRegex = fountainRegex.BRACKET_COMMENT_REGEX
+        # The same comments as the regex engine's first pass sees them, before < and >
+        # are sanitized: no sanitized < or > in the comment text
+        unsanitized = '(?:(?!' + re.escape(fountainRegex.LESS_THAN_REPLACEMENT) + '|' + re.escape(fountainRegex.MORE_THAN_REPLACEMENT) + ')[^<>])'
+        self._firstPassBlockCommentRegex = re.compile(fountainRegex.BLOCK_COMMENT_PATTERN.replace('[^<>]', unsanitized))
+        self._firstPassBracketCommentRegex = re.compile(fountainRegex.BRACKET_COMMENT_PATTERN.replace('[^<>]', unsanitized))
+        self._synopsisRegex = fountainRegex.SYNOPSIS_REGEX
+        self._falseTransitionRegex = fountainRegex.FALSE_TRANSITION_REGEX
+        self._forcedTransitionRegex = fountainRegex.FORCED_TRANSITION_REGEX
+        self._sceneHeaderRegex = fountainRegex.SCENE_HEADER_REGEX
+        self._firstLineActionRegex = fountainRegex.FIRST_LINE_ACTION_REGEX
+        self._transitionRegex = fountainRegex.TRANSITION_REGEX
+        self._characterCueRegex = fountainRegex.CHARACTER_CUE_REGEX
+        self._parentheticalRegex = fountainRegex.PARENTHETICAL_REGEX
+        self._sectionHeaderRegex = fountainRegex.SECTION_HEADER_REGEX
+
+        # Web components only exist in the remap rule set
+        self._webComponentRegex = getattr(fountainRegex, 'WEB_COMPONENT_REGEX', None)
+        return
+
+    # Newline eaten by rule 'eatenBy' is invisible to rules matching a leading newline
+    # from that rule on, and to rules looking behind for one after that rule
+    @staticmethod
+    def _available(eatenBy, rule):
+        return eatenBy > rule
+
+    @staticmethod
+    def _availableBehind(eatenBy, rule):
+        return eatenBy >= rule
+
+    # Boneyards and notes of the content, as {start: (element type, end)}; a comment
+    # spans from the newline in front of its opening mark to the one after its closing
+    # mark. The regex engine's comment passes run on a copy of the content with every
+    # replacement kept to the same length, so that the spans line up with the content
+    def commentSpans(self, content):
+        fountainRegex = self._fountainRegex
+        if not (fountainRegex.BONEYARD_OPEN_MARK in content or fountainRegex.NOTE_OPEN_MARK in content):
+            return {}
+        
+        def maskInnerNewlines(match):
+            text = match.group(0)
+            return text[0] + text[1:-1].replace(fountainRegex.NEWLINE_DEFAULT, fountainRegex.MASKED_NEWLINE) + text[-1]
+        
+        # 1st pass: newlines in boneyards, then in notes
+        markup = self._firstPassBlockCommentRegex.sub(maskInnerNewlines, content)
+        markup = self._firstPassBracketCommentRegex.sub(maskInnerNewlines, markup)
+        
+        # 2nd pass: boneyards are wrapped in tags, which no note can cross
+        spans = {}
+        pieces = []
+        pieceStart = 0
+        for match in self._blockCommentRegex.finditer(markup):
+            spanStart, spanEnd = match.span()
+            spans[spanStart] = (fountainRegex.BONEYARD_TAG_PATTERN, spanEnd)
+            pieces.append(markup[pieceStart:spanStart + 1])
+            pieces.append(fountainRegex.LESS_THAN_PATTERN * 2)
+            pieces.append(markup[spanStart + 3:spanEnd - 3])
+            pieces.append(fountainRegex.MORE_THAN_PATTERN * 2)
+            pieceStart = spanEnd - 1
+        if pieces:
+            pieces.append(markup[pieceStart:])
+            markup = ''.join(pieces)
+        for match in self._bracketCommentRegex.finditer(markup):
+            spans[match.start()] = (fountainRegex.COMMENT_TAG_PATTERN, match.end())
+        return spans
+    
+    # Takes sanitized content as produced by Parser.bodyOfString (starting with two
+    # newlines) and yields (elementType, elementText) pairs, with element text still
+    # sanitized, in document order
+    def tokenize(self, content):
+        fountainRegex = self._fountainRegex
+        newline = fountainRegex.NEWLINE_DEFAULT
+
+        length = len(content)
+        pos = len(fountainRegex.DOUBLE_NEWLINES_PATTERN)
+
+        # Rule that ate the newline in front of the current line; a comment or synopsis
+        # gives it back right away, so it only hides the line from the same rule
+        eatenBy = NO_RULE
+        consumedBy = NO_RULE
+        commentSpans = self.commentSpans(content)
+
+        # Unclaimed lines waiting to be split into dialogue and actions, starting with
+        # the blank line in front of the body
+        run = ['']
+        runGlued = False
+        runAfterCue = False
+        # Newline state in front of the last line in run
+        blankEatenBy = NO_RULE
+
+        # The content ends with a newline, and the empty line after it belongs to the last run
+        while pos <= length:
+            end = content.find(newline, pos)
+            if end < 0:
+                end = length
+            line = content[pos:end]
+
+            elementType = None
+            elementText = ''
+            nextPos = end + 1
+            nextEatenBy = NO_RULE
+            nextConsumedBy = NO_RULE
+
+            # Boneyard, notes and synopses
+            comment = commentSpans.get(pos - 1) if (line[:2] == '/*' or line[:2] == '[[') else None
+            if comment is not None:
+                elementType, nextPos = comment
+                # Both marks are two characters long
+                elementText = content[pos + 2:nextPos - 3]
+            elif line[:1] == '=' and consumedBy != SYNOPSIS_RULE:
+                match = self._synopsisRegex.match(content, pos - 1)
+                if match:
+                    elementType = fountainRegex.SYNOPSIS_TAG_PATTERN
+                    elementText = match.group(1)
+                    nextPos = match.end()
+                    nextConsumedBy = SYNOPSIS_RULE
+
+            # Centered text and forced transitions
+            if not elementType and line[:3] == fountainRegex.MORE_THAN_REPLACEMENT:
+                match = None
+                if self._available(eatenBy, FALSE_TRANSITION_RULE):
+                    match = self._falseTransitionRegex.match(content, pos - 1)
+                    if match:
+                        elementType = fountainRegex.ACTION_TAG_PATTERN
+                        nextEatenBy = FALSE_TRANSITION_RULE
+                if not match and self._available(eatenBy, FORCED_TRANSITION_RULE):
+                    match = self._forcedTransitionRegex.match(content, pos - 1)
+                    if match:
+                        elementType = fountainRegex.TRANSITION_TAG_PATTERN
+                        nextEatenBy = FORCED_TRANSITION_RULE
+                if match:
+                    elementText = match.group(1)
+                    nextPos = match.end()
+
+            # Scene headings; the non-word character in front of 'est' may be the
+            # newline of a blank line before it, which then belongs to the heading
+            if not elementType and self._availableBehind(eatenBy, SCENE_HEADER_RULE):
+                match = self._sceneHeaderRegex.match(content, pos)
+                if not match and run and run[-1] == '' and self._availableBehind(blankEatenBy, SCENE_HEADER_RULE):
+                    match = self._sceneHeaderRegex.match(content, pos - 1)
+                    if match:
+                        run.pop()
+                if match:
+                    elementType = fountainRegex.SCENE_HEADING_PATTERN
+                    elementText = match.group(1)
+                    nextPos = match.end()
+                    nextEatenBy = SCENE_HEADER_RULE
+
+            # The first line of the body is always an action
+            if not elementType and pos == len(fountainRegex.DOUBLE_NEWLINES_PATTERN) and line != '':
+                match = self._firstLineActionRegex.match(content)
+                if match:
+                    elementType = fountainRegex.ACTION_TAG_PATTERN
+                    elementText = match.group(1)
+
+            if not elementType and self._available(eatenBy, TRANSITION_RULE):
+                match = self._transitionRegex.match(content, pos - 1)
+                if match:
+                    elementType = fountainRegex.TRANSITION_TAG_PATTERN
+                    elementText = match.group(1)
+                    nextPos = match.end()
+                    nextEatenBy = TRANSITION_RULE
+
+            # Character cues need a non-blank line after them, and a scene heading
+            # below counts as blank since it is moved down by one newline
+            if not elementType and self._availableBehind(eatenBy, CHARACTER_CUE_RULE):
+                match = self._characterCueRegex.match(content, pos)
+                if match and not self.isSceneHeadingAt(content, match.end()):
+                    elementType = fountainRegex.CHARACTER_TAG_PATTERN
+                    elementText = match.group(1)
+                    nextPos = match.end()
+                    nextEatenBy = CHARACTER_CUE_RULE
+
+            if elementType:
+                for token in self.splitRun(run, runGlued, runAfterCue, elementType):
+                    yield token
+                for token in self.emitTagged(elementType, elementText):
+                    yield token
+                run = []
+                runGlued = nextEatenBy != NO_RULE
+                runAfterCue = elementType == fountainRegex.CHARACTER_TAG_PATTERN
+            else:
+                run.append(line)
+                blankEatenBy = eatenBy
+
+            pos = nextPos
+            eatenBy = nextEatenBy
+            consumedBy = nextConsumedBy
+
+        for token in self.splitRun(run, runGlued, runAfterCue, None):
+            yield token
+        return
+
+    def isSceneHeadingAt(self, content, pos):
+        # Comments and synopses are claimed before scene headings
+        if content[pos:pos + 2] in ('/*', '[[') or content[pos:pos + 1] == '=':
+            return False
+        return self._sceneHeaderRegex.match(content, pos) is not None
+
+    # Splits consecutive unclaimed lines the way the remaining rules do. Parentheticals
+    # are matched anywhere in the run, then dialogue, section headings and actions are
+    # taken from the text around them.
+    def splitRun(self, run, glued, afterCue, nextType):
+        fountainRegex = self._fountainRegex
+        newline = fountainRegex.NEWLINE_DEFAULT
+
+        # Newlines between the lines, in front of the first line unless the element
+        # before ate it, and behind the last line plus the one added before scene headings
+        text = newline.join(run)
+        if not glued:
+            text = newline + text
+        if run and nextType is not None:
+            text += newline
+        if nextType == fountainRegex.SCENE_HEADING_PATTERN:
+            text += newline
+
+        start = 0
+        for match in self._parentheticalRegex.finditer(text):
+            for token in self.splitSegment(text, start, match.start(), afterCue, fountainRegex.PARENTHETICAL_TAG_PATTERN):
+                yield token
+
+            # No dialogue follows a parenthetical spanning lines, and when it took a blank
+            # line along, the action rule splits its text into actions
+            elementText = match.group(1)
+            afterCue = newline not in elementText
+            if fountainRegex.SECTION_HEADER_MARK in elementText or not (elementText.endswith(newline) or fountainRegex.DOUBLE_NEWLINES_PATTERN in elementText):
+                tokens = self.emitTagged(fountainRegex.PARENTHETICAL_TAG_PATTERN, elementText)
+            else:
+                tokens = self.splitActions(elementText, 0, len(elementText), True)
+            for token in tokens:
+                yield token
+
+            start = match.end()
+
+        for token in self.splitSegment(text, start, len(text), afterCue, nextType):
+            yield token
+        return
+
+    # Dialogue runs from a character cue or parenthetical to the first blank line, or to
+    # a parenthetical on the next line. Section headings are cut out of the rest, and
+    # actions are made of what is left.
+    def splitSegment(self, text, start, end, afterCue, nextType):
+        fountainRegex = self._fountainRegex
+        newline = fountainRegex.NEWLINE_DEFAULT
+
+        if afterCue:
+            dialogueEnd = text.find(fountainRegex.DOUBLE_NEWLINES_PATTERN, start, end)
+            if dialogueEnd < 0 and nextType == fountainRegex.PARENTHETICAL_TAG_PATTERN and text[end - 1:end] == newline and end > start:
+                dialogueEnd = end - 1
+            if dialogueEnd >= 0:
+                for token in self.emitTagged(fountainRegex.DIALOGUE_TAG_PATTERN, text[start:dialogueEnd]):
+                    yield token
+                start = dialogueEnd
+
+        for match in self._sectionHeaderRegex.finditer(text, start, end):
+            for token in self.splitActions(text, start, match.start(), True):
+                yield token
+            for token in self.emit(fountainRegex.SECTION_HEADING_PATTERN, match.group(1)):
+                yield token
+            start = match.end()
+
+        for token in self.splitActions(text, start, end, nextType is not None):
+            yield token
+        return
+
+    # Actions run to the next blank line, or to the next element if it starts on a new
+    # line; text directly in front of an element on the same line belongs to nothing
+    def splitActions(self, text, start, end, beforeElement):
+        fountainRegex = self._fountainRegex
+        newline = fountainRegex.NEWLINE_DEFAULT
+
+        while True:
+            actionEnd = text.find(fountainRegex.DOUBLE_NEWLINES_PATTERN, start, end)
+            if actionEnd < 0:
+                if not beforeElement or start >= end or text[end - 1] != newline:
+                    break
+                actionEnd = end - 1
+            for token in self.emit(fountainRegex.ACTION_TAG_PATTERN, text[start:actionEnd]):
+                yield token
+            start = actionEnd + 2
+        return
+
+    # Section headings are found inside elements tagged before them as well, and the
+    # element is replaced by the section headings it contains
+    def emitTagged(self, elementType, elementText):
+        if not self._fountainRegex.SECTION_HEADER_MARK in elementText:
+            return self.emit(elementType, elementText)
+        return self.emitSections(elementText)
+
+    def emitSections(self, elementText):
+        for match in self._sectionHeaderRegex.finditer(elementText):
+            for token in self.emit(self._fountainRegex.SECTION_HEADING_PATTERN, match.group(1)):
+                yield token
+        return
+
+    # Empty actions are dropped, and an element containing web components is replaced
+    # by the components' name, arguments and description, like the regex engine does
+    def emit(self, elementType, elementText):
+        fountainRegex = self._fountainRegex
+        if elementType == fountainRegex.ACTION_TAG_PATTERN and not elementText.strip():
+            return
+        if self._webComponentRegex is None or not (fountainRegex.LESS_THAN_REPLACEMENT + fountainRegex.LESS_THAN_REPLACEMENT) in elementText:
+            yield (elementType, elementText)
+            return
+
+        components = self._webComponentRegex.findall(elementText)
+        if not components:
+            yield (elementType, elementText)
+            return
+
+        for component in components:
+            yield (fountainRegex.COMPONENT_NAME_PATTERN, component[0])
+            yield (fountainRegex.COMPONENT_ARGUMENTS_PATTERN, component[1])
+            yield (fountainRegex.COMPONENT_DESCRIPTION_PATTERN, component[2])
+        return
@@ -20,14 +20,22 @@
 # This module defines the HTML generator class for parsed fountain scripts.
 # Ported to Python from objc in nyousefi/Fountain repository
 
-# For HTML output, paginator is ignored right now.
+# The html document is one section per explicit page break; paginator lays it out on
+# screenplay pages instead, one html fragment per page. The elements of the body are
+# rendered by the table driven renderers in element_renderer.
 
-import re
-import sys
+import itertools
 
 from fountain_parser import ParserVersion
+from emphasis_renderer import FountainEmphasisRenderer
+from title_renderer import sharedTitleRenderer
+from element_renderer import ElementRenderer, RemapElementRenderer
+from fountain_element import ElementKind
 from regex_rules import *
 
+# Write buffer size in bytes for html output files
+OUTPUT_BUFFER_SIZE = 1 << 16
+
 class FountainHTMLGenerator(object):
     def __init__(self, script, cssFile = '', componentParent = 'components', version = ParserVersion.DEFAULT):
         self._script = script
@@ -37,325 +45,221 @@ class FountainHTMLGenerator(object):
         
         self._version = version
         if self._version == ParserVersion.REMAP:
-            self._fountainRegex = FountainRegexRemap()
+            self._fountainRegex = sharedRules(FountainRegexRemap)
             self.generateHtml = self.generateHtmlRemap
+            self.iterHtml = self.iterHtmlRemap
             self._componentList = []
+            self._componentNames = set()
         elif self._version == ParserVersion.BASE:
-            self._fountainRegex = FountainRegexBase()
+            self._fountainRegex = sharedRules(FountainRegexBase)
             self.generateHtml = self.generateHtmlBase
+            self.iterHtml = self.iterHtmlBase
         else:
             # Right now using remap as default; DEFAULT value was not really useful, 
             # since self._fountainRegex is using Remap class
             self._version == ParserVersion.DEFAULT
-            self._fountainRegex = FountainRegexRemap()
+            self._fountainRegex = sharedRules(FountainRegexRemap)
             self.generateHtml = self.generateHtmlRemap
+            self.iterHtml = self.iterHtmlRemap
             self._componentList = []
+            self._componentNames = set()
+        
+        self._emphasisRenderer = FountainEmphasisRenderer(self._fountainRegex)
+        self._titleRenderer = sharedTitleRenderer(self._fountainRegex)
+        if self._version == ParserVersion.BASE:
+            self._elementRenderer = ElementRenderer(self._fountainRegex, self._emphasisRenderer)
+        else:
+            self._elementRenderer = RemapElementRenderer(self._fountainRegex, self._emphasisRenderer, self.componentUsed)
+        # Body html of a run of elements, see ElementRenderer.renderChunks
+        self.elementChunks = self._elementRenderer.renderChunks
+        # Element index from which component imports load asynchronously, None for none
+        self._importFold = None
+        return
+    
+    # Points the generator at another script, so that one generator can be reused
+    def setScript(self, script):
+        self._script = script
+        self._bodyText = ''
+        self._componentList = []
+        self._componentNames = set()
         return
     
-    # HTML class is elementType with spaces replaced by dashes
-    def htmlClassForType(self, elementType):
-        return re.sub(" ", "-", elementType.lower())
+    # Components first used at or after element index 'elementIndex' are imported
+    # asynchronously in the remap head, so the page does not wait for them; None
+    # imports every component up front again
+    def deferImportsAfter(self, elementIndex):
+        self._importFold = elementIndex
+        return
+    
+    # Dual dialogue character count at the end of the last run of elements rendered,
+    # to be carried over into the run after it
+    def dualDialogueCharacterCount(self):
+        return self._elementRenderer._dualDialogueCharacterCount
+    
+    # Adds a component the body uses to the head imports, once
+    def componentUsed(self, componentName):
+        if not (componentName in self._componentNames):
+            self._componentNames.add(componentName)
+            self._componentList.append(componentName)
+        return
     
     def generateHtmlBase(self):
         if (self._bodyText == ''):
             self._bodyText = self.bodyForScriptBase()
-        html = '<!DOCTYPE html>\n<html>\n<head>\n'
-        if (self._cssFile != ''):
-            html += '<link rel=\"stylesheet\" type=\"text/css\" href=\"' + self._cssFile + '\">\n'
-        # Note: here a <section> tag is added by default.
-        html += '</head>\n<body>\n<section>\n' + self._bodyText + '</section>\n</body>\n</html>\n'
-        return html
+        return ''.join(self.iterHtmlBase())
     
     def generateHtmlRemap(self):
         if (self._bodyText == ''):
             self._bodyText = self.bodyForScriptRemap()
+        return ''.join(self.iterHtmlRemap())
+    
+    # Writes the html document into a writable text stream chunk by chunk,
+    # instead of building it as one string first
+    def writeHtml(self, stream):
+        for chunk in self.iterHtml():
+            stream.write(chunk)
+        return
+    
+    # Yields the html document in chunks; the body is rendered while iterating,
+    # unless it was already generated
+    def iterHtmlBase(self):
+        yield self.headForScript([])
+        if (self._bodyText != ''):
+            yield self._bodyText
+        else:
+            for chunk in self.bodyChunksForScriptBase():
+                yield chunk
+        yield self.tailForScript()
+    
+    def iterHtmlRemap(self):
+        deferredList = []
+        if (self._importFold is not None):
+            # Imports are taken from the manifest, so the body can be left as it is
+            self._componentList, deferredList = self._script.componentManifest().splitAt(self._importFold)
+        elif (self._bodyText == ''):
+            # The head imports every component, so they are collected before any of the body is out
+            self._componentList = self.componentListForScript()
+        yield self.headForScript(self._componentList, deferredList)
+        if (self._bodyText != ''):
+            yield self._bodyText
+        else:
+            for chunk in self.bodyChunksForScriptRemap():
+                yield chunk
+        yield self.tailForScript()
+    
+    # Yields the html document of elements as they come out of a parser stream (see
+    # Parser.iterString), each element rendered as soon as it is parsed, without a script.
+    # The remap head imports every component of the body, so in that version the stream
+    # is collected before the head is out, unless componentList is given. With an import
+    # fold (see deferImportsAfter) only the elements before the fold are collected, and
+    # the components first used after them are imported with async at the end of the body
+    def iterHtmlForStream(self, elements, titlePageContents, componentList = None):
+        lateImports = False
+        if (self._version == ParserVersion.BASE):
+            componentList = []
+        elif (componentList is None and self._importFold is not None):
+            elements = iter(elements)
+            leadingElements = list(itertools.islice(elements, self._importFold))
+            componentList = self.componentListForElements(leadingElements)
+            elements = itertools.chain(leadingElements, elements)
+            lateImports = True
+        elif componentList is None:
+            elements = list(elements)
+            componentList = self.componentListForElements(elements)
+        yield self.headForScript(componentList)
+        
+        self._componentList = []
+        self._componentNames = set()
+        titleText = self.titleForScript(titlePageContents)
+        if (titleText != ''):
+            yield titleText
+        for chunk in self.elementChunks(elements):
+            yield chunk
+        if lateImports:
+            headComponents = set(componentList)
+            yield self.importsForComponents([componentName for componentName in self._componentList if not (componentName in headComponents)], True)
+        yield self.tailForScript()
+    
+    def writeHtmlForStream(self, stream, elements, titlePageContents, componentList = None):
+        for chunk in self.iterHtmlForStream(elements, titlePageContents, componentList):
+            stream.write(chunk)
+        return
+    
+    # Components in deferredList are imported with async, after those of componentList
+    def headForScript(self, componentList, deferredList = None):
         html = '<!DOCTYPE html>\n<html>\n<head>\n'
         if (self._cssFile != ''):
             html += '<link rel=\"stylesheet\" type=\"text/css\" href=\"' + self._cssFile + '\">\n'
-        # bodyForScript fills self._componentList; Right now, components are supposed to end with a .html
-        for componentName in self._componentList:
-            html += '<link rel=\"import\" href=\"' + self._componentParent + componentName + '.html\">\n'
+        html += self.importsForComponents(componentList)
+        html += self.importsForComponents(deferredList or [], True)
         # Note: here a <section> tag is added by default.
-        html += '</head>\n<body>\n<section>\n' + self._bodyText + '</section>\n</body>\n</html>\n'
+        html += '</head>\n<body>\n<section>\n'
         return html
     
-    def bodyForScriptRemap(self):
-        bodyText = ''
-        # add title page
-        titleElements = self._script._titlePageContents
-        
-        if titleElements:
-            bodyText += '<div id=\'' + self._fountainRegex.TITLE_DIV + '\'>'
-            
-            # Titles
-            bodyText += '<p class=\'' + self._fountainRegex.TITLE_TITLE_CLASS + '\'>'
-            if titleElements[self._fountainRegex.TITLE_TITLE_STRING]:
-                for temp in titleElements[self._fountainRegex.TITLE_TITLE_STRING]:
-                    bodyText += temp + '<br>'
-            else:
-                bodyText += 'Untitled'
-            bodyText += '</p>'
-                
-            # Credit
-            bodyText += '<p class=\'' + self._fountainRegex.TITLE_CREDIT_CLASS + '\'>'
-            if self._fountainRegex.TITLE_CREDIT_STRING in titleElements:
-                for temp in titleElements[self._fountainRegex.TITLE_CREDIT_STRING]:
-                    bodyText += temp + '<br>'
+    # Import links of the components in componentList, with async if deferred
+    def importsForComponents(self, componentList, deferred = False):
+        html = ''
+        # Right now, components are supposed to end with a .html
+        for componentName in componentList:
+            if deferred:
+                html += '<link rel=\"import\" href=\"' + self._componentParent + componentName + '.html\" async>\n'
             else:
-                bodyText += 'written by'
-            bodyText += '</p>'
-            
-            # Authors
-            bodyText += '<p class=\'' + self._fountainRegex.TITLE_AUTHOR_CLASS + '\'>'
-            if self._fountainRegex.TITLE_AUTHOR_STRING in titleElements:
-                for temp in titleElements[self._fountainRegex.TITLE_AUTHOR_STRING]:
-                    bodyText += temp + '<br>'
-            else:
-                bodyText += 'Anonymous'
-            bodyText += '</p>'
-            
-            # Sources
-            if self._fountainRegex.TITLE_SOURCE_STRING in titleElements:
-                bodyText += '<p class=\'' + self._fountainRegex.TITLE_SOURCE_CLASS + '\'>'
-                for temp in titleElements[self._fountainRegex.TITLE_SOURCE_STRING]:
-                    bodyText += temp + '<br>'
-                bodyText += '</p>'
-            
-            # Draft date
-            if self._fountainRegex.TITLE_DRAFT_DATE_STRING in titleElements:
-                bodyText += '<p class=\'' + self._fountainRegex.TITLE_DRAFT_DATE_CLASS + '\'>'
-                for temp in titleElements[self._fountainRegex.TITLE_DRAFT_DATE_STRING]:
-                    bodyText += temp + '<br>'
-                bodyText += '</p>'
-            
-            # Contact
-            if self._fountainRegex.TITLE_CONTACT_STRING in titleElements:
-                bodyText += '<p class=\'' + self._fountainRegex.TITLE_CONTACT_CLASS + '\'>'
-                for temp in titleElements[self._fountainRegex.TITLE_CONTACT_STRING]:
-                    bodyText += temp + '<br>'
-                bodyText += '</p>'
-            
-            bodyText += '</div>'
-            
-        # Page breaks are not handled in current HTML output
-        dialogueTypes = [self._fountainRegex.CHARACTER_TAG_PATTERN, self._fountainRegex.DIALOGUE_TAG_PATTERN, self._fountainRegex.PARENTHETICAL_TAG_PATTERN]
-        ignoreTypes = [self._fountainRegex.BONEYARD_TAG_PATTERN, self._fountainRegex.COMMENT_TAG_PATTERN, self._fountainRegex.SYNOPSIS_TAG_PATTERN, self._fountainRegex.SECTION_HEADING_PATTERN]
-        
-        dualDialogueCharacterCount = 0
-        
-        elements = self._script._elements
-        
-        try:
-            self._fountainRegex.COMPONENT_PATTERN
-        except NameError:
-            print('Fountain Regex pattern does not contain definition for Web component. Version mismatch?')
-            sys.exit(0)
-        else:
-            self._componentList = []
-            # Flag for whether we are in a component definition, if so, this element should not appear as normal ones
-            inComponent = False
-            # Flag for whether this component is ready for generation.
-            generateComponent = False
-            componentName = ''
-            componentArgs = dict()
-            componentDesc = ''
-            
+                html += '<link rel=\"import\" href=\"' + self._componentParent + componentName + '.html\">\n'
+        return html
+    
+    def tailForScript(self):
+        return '</section>\n</body>\n</html>\n'
+    
+    # Component names in order of first appearance, same as bodyChunksForScriptRemap collects them
+    def componentListForScript(self):
+        return list(self._script.componentManifest().componentNames())
+    
+    def componentListForElements(self, elements):
+        componentList = []
+        componentNames = set()
         for element in elements:
-            if (element._elementType in ignoreTypes):
-                continue
-            
-            if (element._elementType == self._fountainRegex.PAGE_BREAK_PATTERN):
-                bodyText += '</section>\n<section>\n'
-                continue
-            
-            if (element._elementType == self._fountainRegex.CHARACTER_TAG_PATTERN and element._isDualDialogue):
-                dualDialogueCharacterCount += 1
-                if (dualDialogueCharacterCount == 1):
-                    bodyText += '<div class=\'' + self._fountainRegex.DUAL_DIALOGUE_CLASS + '\'>\n'
-                    bodyText += '<div class=\'' + self._fountainRegex.DUAL_DIALOGUE_LEFT_CLASS + '\'>\n'
-                elif (dualDialogueCharacterCount == 2):
-                    bodyText += '<div class=\'' + self._fountainRegex.DUAL_DIALOGUE_RIGHT_CLASS + '\'>\n'
-            
-            if (dualDialogueCharacterCount >= 2 and not (element._elementType in dialogueTypes)):
-                dualDialogueCharacterCount = 0
-                bodyText += '</div>\n</div>\n'
-            
-            text = ''
-            if (element._elementType == self._fountainRegex.SCENE_HEADING_PATTERN and element._sceneNumber != None):
-                text += '<span class=\'' + self._fountainRegex.SCENE_NUMBER_LEFT + '\'>' + element._sceneNumber + '</span>'
-                text += element._elementText
-                text += '<span class=\'' + self._fountainRegex.SCENE_NUMBER_RIGHT + '\'>' + element._sceneNumber + '</span>'
-            else:
-                text += element._elementText
-                # Special generation step for component and arguments
-                if (element._elementType == self._fountainRegex.COMPONENT_NAME_PATTERN):
-                    if (not inComponent):
-                        if (element._elementText in self._componentList):
-                            pass
-                        else:
-                            self._componentList.append(element._elementText)
-                        componentName = element._elementText
-                        inComponent = True
-                    else:
-                        print('ERROR: Nested component definition in script. Not sure how to parse yet.')
-                if (element._elementType == self._fountainRegex.COMPONENT_ARGUMENTS_PATTERN):
-                    if (inComponent):
-                        args = re.findall(self._fountainRegex.COMPONENT_ARGUMENTS_SPLIT, element._elementText)
-                        for arg in args:
-                            equalSign = arg.find('=')
-                            if (equalSign > 0):
-                                argName = arg[:equalSign].strip()
-                                argValue = arg[equalSign + 1:].strip()
-                                componentArgs[argName] = argValue
-                            else:
-                                print('WARNING: no equal sign found for component argument; on purpose?')
-                if (element._elementType == self._fountainRegex.COMPONENT_DESCRIPTION_PATTERN):
-                    if (inComponent):
-                        generateComponent = True
-                        componentDesc = element._elementText
-                        
-            if (element._elementType == self._fountainRegex.CHARACTER_TAG_PATTERN and element._isDualDialogue):
-                text = re.sub(self._fountainRegex.DUAL_DIALOGUE_ANGLE_MARK_PATTERN, self._fountainRegex.EMPTY_REPLACEMENT, text)
-            
-            text = re.sub(self._fountainRegex.BOLD_ITALIC_UNDERLINE_PATTERN, self._fountainRegex.BOLD_ITALIC_UNDERLINE_TAG, text)
-            text = re.sub(self._fountainRegex.BOLD_ITALIC_PATTERN, self._fountainRegex.BOLD_ITALIC_TAG, text)
-            text = re.sub(self._fountainRegex.BOLD_UNDERLINE_PATTERN, self._fountainRegex.BOLD_UNDERLINE_TAG, text)
-            text = re.sub(self._fountainRegex.ITALIC_UNDERLINE_PATTERN, self._fountainRegex.ITALIC_UNDERLINE_TAG, text)
-            text = re.sub(self._fountainRegex.BOLD_PATTERN, self._fountainRegex.BOLD_TAG, text)
-            text = re.sub(self._fountainRegex.ITALIC_PATTERN, self._fountainRegex.ITALIC_TAG, text)
-            text = re.sub(self._fountainRegex.UNDERLINE_PATTERN, self._fountainRegex.UNDERLINE_TAG, text)
-            text = re.sub(self._fountainRegex.FONT_EMPH_IGNORE_TAG, self._fountainRegex.EMPTY_REPLACEMENT, text)
-            
-            if (not inComponent):
-                if (text != ''):
-                    additionalClasses = ''
-                    if (element._isCentered):
-                        additionalClasses += self._fountainRegex.CENTER_CLASS
-                    bodyText += '<p class=\'' + self.htmlClassForType(element._elementType) + additionalClasses + '\'>' + text + '</p>\n'
-            elif (generateComponent):
-                bodyText += '<' + componentName
-                for argName, argValue in componentArgs.items():
-                    bodyText += ' ' + argName + '=' + argValue
-                bodyText += '>' + componentDesc + '</' + componentName + '>\n'
-                
-                generateComponent = False
-                inComponent = False
-                componentName = ''
-                componentArgs = dict()
-                componentDesc = ''
-                
-        return bodyText
+            if (element._kind == ElementKind.COMPONENT_NAME and not (element._elementText in componentNames)):
+                componentNames.add(element._elementText)
+                componentList.append(element._elementText)
+        return componentList
+    
+    # Body html of scene 'ordinal' alone, as it appears in the whole body; only that
+    # scene's elements are rendered. Dual dialogue carried over from the scene before is
+    # picked up from the scene index, and closed at the end as the next heading would.
+    def htmlForScene(self, ordinal):
+        sceneIndex = self._script.sceneIndex()
+        dualDialogueCharacterCount = sceneIndex.dualDialogueCountBefore(ordinal)
+        # A dual dialogue of two or more characters is closed by the scene heading,
+        # so it belongs to the html of the scene before
+        if (dualDialogueCharacterCount >= 2):
+            dualDialogueCharacterCount = 0
+        return ''.join(self.elementChunks(self._script.sceneElements(ordinal), True, dualDialogueCharacterCount))
+    
+    def bodyForScriptRemap(self):
+        return ''.join(self.bodyChunksForScriptRemap())
     
     def bodyForScriptBase(self):
-        bodyText = ''
-        # add title page
-        titleElements = self._script._titlePageContents
-        
-        if titleElements:
-            bodyText += '<div id=\'' + self._fountainRegex.TITLE_DIV + '\'>'
-            
-            # Titles
-            bodyText += '<p class=\'' + self._fountainRegex.TITLE_TITLE_CLASS + '\'>'
-            if titleElements[self._fountainRegex.TITLE_TITLE_STRING]:
-                for temp in titleElements[self._fountainRegex.TITLE_TITLE_STRING]:
-                    bodyText += temp + '<br>'
-            else:
-                bodyText += 'Untitled'
-            bodyText += '</p>'
-                
-            # Credit
-            bodyText += '<p class=\'' + self._fountainRegex.TITLE_CREDIT_CLASS + '\'>'
-            if self._fountainRegex.TITLE_CREDIT_STRING in titleElements:
-                for temp in titleElements[self._fountainRegex.TITLE_CREDIT_STRING]:
-                    bodyText += temp + '<br>'
-            else:
-                bodyText += 'written by'
-            bodyText += '</p>'
-            
-            # Authors
-            bodyText += '<p class=\'' + self._fountainRegex.TITLE_AUTHOR_CLASS + '\'>'
-            if self._fountainRegex.TITLE_AUTHOR_STRING in titleElements:
-                for temp in titleElements[self._fountainRegex.TITLE_AUTHOR_STRING]:
-                    bodyText += temp + '<br>'
-            else:
-                bodyText += 'Anonymous'
-            bodyText += '</p>'
-            
-            # Sources
-            if self._fountainRegex.TITLE_SOURCE_STRING in titleElements:
-                bodyText += '<p class=\'' + self._fountainRegex.TITLE_SOURCE_CLASS + '\'>'
-                for temp in titleElements[self._fountainRegex.TITLE_SOURCE_STRING]:
-                    bodyText += temp + '<br>'
-                bodyText += '</p>'
-            
-            # Draft date
-            if self._fountainRegex.TITLE_DRAFT_DATE_STRING in titleElements:
-                bodyText += '<p class=\'' + self._fountainRegex.TITLE_DRAFT_DATE_CLASS + '\'>'
-                for temp in titleElements[self._fountainRegex.TITLE_DRAFT_DATE_STRING]:
-                    bodyText += temp + '<br>'
-                bodyText += '</p>'
-            
-            # Contact
-            if self._fountainRegex.TITLE_CONTACT_STRING in titleElements:
-                bodyText += '<p class=\'' + self._fountainRegex.TITLE_CONTACT_CLASS + '\'>'
-                for temp in titleElements[self._fountainRegex.TITLE_CONTACT_STRING]:
-                    bodyText += temp + '<br>'
-                bodyText += '</p>'
-            
-            bodyText += '</div>'
-            
-        # Page breaks are not handled in current HTML output
-        dialogueTypes = [self._fountainRegex.CHARACTER_TAG_PATTERN, self._fountainRegex.DIALOGUE_TAG_PATTERN, self._fountainRegex.PARENTHETICAL_TAG_PATTERN]
-        ignoreTypes = [self._fountainRegex.BONEYARD_TAG_PATTERN, self._fountainRegex.COMMENT_TAG_PATTERN, self._fountainRegex.SYNOPSIS_TAG_PATTERN, self._fountainRegex.SECTION_HEADING_PATTERN]
-        
-        dualDialogueCharacterCount = 0
-        
-        elements = self._script._elements
-        for element in elements:
-            if (element._elementType in ignoreTypes):
-                continue
-            
-            if (element._elementType == self._fountainRegex.PAGE_BREAK_PATTERN):
-                bodyText += '</section>\n<section>\n'
-                continue
-            
-            if (element._elementType == self._fountainRegex.CHARACTER_TAG_PATTERN and element._isDualDialogue):
-                dualDialogueCharacterCount += 1
-                if (dualDialogueCharacterCount == 1):
-                    bodyText += '<div class=\'' + self._fountainRegex.DUAL_DIALOGUE_CLASS + '\'>\n'
-                    bodyText += '<div class=\'' + self._fountainRegex.DUAL_DIALOGUE_LEFT_CLASS + '\'>\n'
-                elif (dualDialogueCharacterCount == 2):
-                    bodyText += '<div class=\'' + self._fountainRegex.DUAL_DIALOGUE_RIGHT_CLASS + '\'>\n'
-            
-            if (dualDialogueCharacterCount >= 2 and not (element._elementType in dialogueTypes)):
-                dualDialogueCharacterCount = 0
-                bodyText += '</div>\n</div>\n'
-            
-            text = ''
-            if (element._elementType == self._fountainRegex.SCENE_HEADING_PATTERN and element._sceneNumber != None):
-                text += '<span class=\'' + self._fountainRegex.SCENE_NUMBER_LEFT + '\'>' + element._sceneNumber + '</span>'
-                text += element._elementText
-                text += '<span class=\'' + self._fountainRegex.SCENE_NUMBER_RIGHT + '\'>' + element._sceneNumber + '</span>'
-            else:
-                text += element._elementText
-                
-            if (element._elementType == self._fountainRegex.CHARACTER_TAG_PATTERN and element._isDualDialogue):
-                text = re.sub(self._fountainRegex.DUAL_DIALOGUE_ANGLE_MARK_PATTERN, self._fountainRegex.EMPTY_REPLACEMENT, text)
-                
-            text = re.sub(self._fountainRegex.BOLD_ITALIC_UNDERLINE_PATTERN, self._fountainRegex.BOLD_ITALIC_UNDERLINE_TAG, text)
-            text = re.sub(self._fountainRegex.BOLD_ITALIC_PATTERN, self._fountainRegex.BOLD_ITALIC_TAG, text)
-            text = re.sub(self._fountainRegex.BOLD_UNDERLINE_PATTERN, self._fountainRegex.BOLD_UNDERLINE_TAG, text)
-            text = re.sub(self._fountainRegex.ITALIC_UNDERLINE_PATTERN, self._fountainRegex.ITALIC_UNDERLINE_TAG, text)
-            text = re.sub(self._fountainRegex.BOLD_PATTERN, self._fountainRegex.BOLD_TAG, text)
-            text = re.sub(self._fountainRegex.ITALIC_PATTERN, self._fountainRegex.ITALIC_TAG, text)
-            text = re.sub(self._fountainRegex.UNDERLINE_PATTERN, self._fountainRegex.UNDERLINE_TAG, text)
-            text = re.sub(self._fountainRegex.FONT_EMPH_IGNORE_TAG, self._fountainRegex.EMPTY_REPLACEMENT, text)
-            
-            if (text != ''):
-                additionalClasses = ''
-                if (element._isCentered):
-                    additionalClasses += self._fountainRegex.CENTER_CLASS
-                bodyText += '<p class=\'' + self.htmlClassForType(element._elementType) + additionalClasses + '\'>' + text + '</p>\n'
-        
-        return bodyText
-   
\ No newline at end of file
+        return ''.join(self.bodyChunksForScriptBase())
+    
+    def bodyChunksForScriptRemap(self):
+        self._componentList = []
+        self._componentNames = set()
+        titleText = self.titleForScript()
+        if (titleText != ''):
+            yield titleText
+        for chunk in self.elementChunks(self._script._elements):
+            yield chunk
+    
+    # Title page div, empty if the script has no title page; titleElements are
+    # the title page contents to use instead of the script's
+    def titleForScript(self, titleElements = None):
+        if titleElements is None:
+            titleElements = self._script._titlePageContents
+        return self._titleRenderer.render(titleElements)
+    
+    def bodyChunksForScriptBase(self):
+        titleText = self.titleForScript()
+        if (titleText != ''):
+            yield titleText
+        for chunk in self.elementChunks(self._script._elements):
+            yield chunk
\ No newline at end of file
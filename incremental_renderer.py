@@ -0,0 +1,237 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the incremental renderer, which keeps a script and its html
+# up to date with an edited document by reparsing only the scenes that changed.
+#
+# The body is split into scene chunks (see Parser.sceneChunksOfBody). For every scene the
+# script keeps its text, elements, html and components; an update compares the new
+# chunks with the old scenes from both ends, reparses and re-renders the chunks in
+# between, and splices the results into the element array and the scene lists. The
+# document is then put together from the per scene html. Unchanged scenes are never
+# reparsed, so the cost of an update follows the size of the edit; what remains linear
+# in the size of the document is comparing text and joining the html, and splitting the
+# body from the edit on (the chunks in front of it are kept from the last update).
+
+from fountain_script import FountainScript
+from html_generator import FountainHTMLGenerator
+from fountain_parser import Parser, ParserVersion
+
+class IncrementalRenderer(object):
+    def __init__(self, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, cssFile = '', componentParent = 'components'):
+        self._parser = Parser(parserVersion, parserEngine)
+        self._fountainRegex = self._parser._fountainRegex
+        self._generator = FountainHTMLGenerator(None, cssFile, componentParent, parserVersion)
+        # Number of chunks reparsed by the last update
+        self._reparsedChunks = 0
+        return
+    
+    # Builds a script from scratch; same as updating nothing
+    def load(self, text):
+        return self.update(None, text)
+    
+    # Brings script up to date with text (string or utf-8 bytes) and returns it.
+    # script must come from this renderer (or be None); other scripts are rebuilt whole
+    def update(self, script, text):
+        if isinstance(text, bytes):
+            text = text.decode('utf-8')
+        if self._fountainRegex.CARRIAGE_RETURN in text:
+            text = self._fountainRegex.UNIVERSAL_LINE_BREAKS_REGEX.sub(self._fountainRegex.UNIVERSAL_LINE_BREAKS_TEMPLATE, text)
+        
+        if script is None:
+            script = FountainScript()
+            script._fileName = ''
+        if script._sceneTexts is None:
+            self.resetScenes(script)
+        
+        body, titlePage = self._parser.splitString(text)
+        chunks = self._parser.sceneChunksOfEditedBody(body)
+        
+        self._generator.setScript(script)
+        if (titlePage != script._titlePage or script._titleHtml is None):
+            script._titlePage = titlePage
+            script._titlePageContents = self._parser.parseTitlePageContents(titlePage)
+            script._titleHtml = self._generator.titleForScript()
+        
+        sceneTexts = script._sceneTexts
+        chunkCounts = script._sceneChunkCounts
+        elementCounts = script._sceneElementCounts
+        sceneCount = len(sceneTexts)
+        
+        # Scenes kept at the front; the last scene is rendered without closing dual
+        # dialogue, so a scene only stays if it is still last, or still not last
+        prefix = 0
+        chunkStart = 0
+        while prefix < sceneCount:
+            end = chunkStart + chunkCounts[prefix]
+            if (end > len(chunks) or self.joinChunks(chunks, chunkStart, end) != sceneTexts[prefix]):
+                break
+            if ((prefix == sceneCount - 1) != (end == len(chunks))):
+                break
+            chunkStart = end
+            prefix += 1
+        
+        # Scenes kept at the back; the first scene is parsed without a blank line in
+        # front of it, so it only stays if it is still first
+        suffix = 0
+        chunkEnd = len(chunks)
+        while suffix < sceneCount - prefix:
+            index = sceneCount - 1 - suffix
+            start = chunkEnd - chunkCounts[index]
+            if (start < chunkStart or self.joinChunks(chunks, start, chunkEnd) != sceneTexts[index]):
+                break
+            if (index == 0 and start != 0):
+                break
+            chunkEnd = start
+            suffix += 1
+        
+        elementStart = sum(elementCounts[:prefix])
+        oldElementEnd = len(script._elements) - sum(elementCounts[sceneCount - suffix:])
+        
+        newTexts = []
+        newChunkCounts = []
+        newElements = []
+        parsedCount = 0
+        position = chunkStart
+        self._reparsedChunks = 0
+        while position < chunkEnd:
+            unitStart = position
+            unitText = chunks[position]
+            unitCount = 1
+            position += 1
+            while True:
+                elements = self._parser.parseSceneChunk(unitText, unitStart == 0, elementStart + parsedCount)
+                self._reparsedChunks += unitCount
+                if not self._parser._dualDialogueLookbackOpen:
+                    break
+                # A dual dialogue cue pairs with cues in the scene before; parse them as one
+                if newTexts:
+                    unitText = newTexts.pop() + unitText
+                    unitCount += newChunkCounts.pop()
+                    parsedCount -= len(newElements.pop())
+                elif prefix > 0:
+                    prefix -= 1
+                    unitText = sceneTexts[prefix] + unitText
+                    unitCount += chunkCounts[prefix]
+                    elementStart -= elementCounts[prefix]
+                else:
+                    break
+                unitStart = position - unitCount
+            newTexts.append(unitText)
+            newChunkCounts.append(unitCount)
+            newElements.append(elements)
+            parsedCount += len(elements)
+            
+            # Whether a dual dialogue cue counts depends on how many elements come before
+            # it, so a kept scene moved to or from the very start is reparsed as well
+            if (position == chunkEnd and suffix > 0):
+                index = sceneCount - suffix
+                oldStart = oldElementEnd
+                newStart = elementStart + parsedCount
+                if (newStart != oldStart and min(newStart, oldStart) < 2):
+                    chunkEnd += chunkCounts[index]
+                    oldElementEnd += elementCounts[index]
+                    suffix -= 1
+        
+        spliced = []
+        for elements in newElements:
+            spliced.extend(elements)
+        oldSceneEnd = sceneCount - suffix
+        newSceneEnd = prefix + len(newElements)
+        script._elements[elementStart:oldElementEnd] = spliced
+        sceneTexts[prefix:oldSceneEnd] = newTexts
+        chunkCounts[prefix:oldSceneEnd] = newChunkCounts
+        elementCounts[prefix:oldSceneEnd] = [len(elements) for elements in newElements]
+        script._sceneComponents[prefix:oldSceneEnd] = [self._generator.componentListForElements(elements) for elements in newElements]
+        script._sceneHtml[prefix:oldSceneEnd] = [None] * len(newElements)
+        script._sceneDualDialogueIn[prefix:oldSceneEnd] = [None] * len(newElements)
+        script._sceneDualDialogueOut[prefix:oldSceneEnd] = [None] * len(newElements)
+        
+        # Render the new scenes, then the kept ones after them for as long as the dual
+        # dialogue state coming into them differs from what they were rendered with
+        dualDialogueCount = 0
+        if prefix > 0:
+            dualDialogueCount = script._sceneDualDialogueOut[prefix - 1]
+        index = prefix
+        elementOffset = elementStart
+        while index < len(sceneTexts):
+            if (index >= newSceneEnd and script._sceneDualDialogueIn[index] == dualDialogueCount):
+                break
+            elements = script._elements[elementOffset:elementOffset + elementCounts[index]]
+            last = (index == len(sceneTexts) - 1)
+            script._sceneHtml[index] = ''.join(self._generator.elementChunks(elements, not last, dualDialogueCount))
+            script._sceneDualDialogueIn[index] = dualDialogueCount
+            dualDialogueCount = self._generator.dualDialogueCharacterCount()
+            script._sceneDualDialogueOut[index] = dualDialogueCount
+            elementOffset += elementCounts[index]
+            index += 1
+        script._elementTable = None
+        script._sceneIndex = None
+        script._componentManifest = None
+        return script
+    
+    def resetScenes(self, script):
+        script._elements = []
+        script._titlePage = None
+        script._titlePageContents = {}
+        script._titleHtml = None
+        script._elementTable = None
+        script._sceneIndex = None
+        script._componentManifest = None
+        script._sceneTexts = []
+        script._sceneChunkCounts = []
+        script._sceneElementCounts = []
+        script._sceneHtml = []
+        script._sceneComponents = []
+        script._sceneDualDialogueIn = []
+        script._sceneDualDialogueOut = []
+        return
+    
+    def joinChunks(self, chunks, start, end):
+        if (end - start == 1):
+            return chunks[start]
+        return ''.join(chunks[start:end])
+    
+    # Component names of the whole script in order of first appearance
+    def componentListForScript(self, script):
+        componentList = []
+        componentNames = set()
+        for sceneComponents in script._sceneComponents:
+            for componentName in sceneComponents:
+                if not (componentName in componentNames):
+                    componentNames.add(componentName)
+                    componentList.append(componentName)
+        return componentList
+    
+    # Yields the html document in chunks, same as FountainHTMLGenerator.iterHtml would
+    def iterHtml(self, script):
+        yield self._generator.headForScript(self.componentListForScript(script))
+        if (script._titleHtml != ''):
+            yield script._titleHtml
+        for sceneHtml in script._sceneHtml:
+            yield sceneHtml
+        yield self._generator.tailForScript()
+    
+    def htmlForScript(self, script):
+        return ''.join(self.iterHtml(script))
+    
+    def writeHtml(self, script, stream):
+        for chunk in self.iterHtml(script):
+            stream.write(chunk)
+        return
\ No newline at end of file
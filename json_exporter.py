@@ -0,0 +1,119 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+# This module defines the JSON exporter, which writes a parsed script as NDJSON (one
+# JSON record per line) for clients that need the elements but not their html.
+#
+# The first record is the header: export format and parser version, the title page
+# contents, the component manifest (see component_manifest) and the counts of elements
+# and scenes. Every element follows as one record, in script order, with its kind, its
+# text, and only those of scene ordinal, scene number, dual dialogue, centering, section
+# depth and component arguments that apply. Keys can be shortened to one letter and
+# kinds written as integer codes; the header then lists both mappings. The stream is
+# flushed at every scene heading, so a reader can act on a scene as soon as it is out.
+
+import json
+
+from fountain_element import ElementKind
+from fountain_parser import ParserVersion
+from component_manifest import componentArgumentsOf
+
+EXPORT_FORMAT = 'fountainhead-ndjson'
+EXPORT_FORMAT_VERSION = 1
+
+# Element record keys, by long name
+SHORT_KEYS = {'kind': 'k', 'text': 't', 'scene': 's', 'number': 'n', 'dual': 'd', 'centered': 'c', 'depth': 'h', 'args': 'a'}
+
+class FountainJSONExporter(object):
+    def __init__(self, script, version = ParserVersion.DEFAULT, shortKeys = False, kindCodes = False):
+        self._script = script
+        self._version = version
+        self._shortKeys = shortKeys
+        self._kindCodes = kindCodes
+        
+        self._keys = dict((name, SHORT_KEYS[name] if shortKeys else name) for name in SHORT_KEYS)
+        self._encoder = json.JSONEncoder(ensure_ascii = False, check_circular = False, separators = (',', ':'))
+        return
+    
+    def headerRecord(self):
+        script = self._script
+        manifest = script.componentManifest()
+        components = []
+        for componentName in manifest.componentNames():
+            uses = [[index, dict(arguments), description] for index, arguments, description in manifest.uses(componentName)]
+            components.append({'name': componentName, 'firstUse': manifest.firstUse(componentName), 'uses': uses})
+        
+        header = {'format': EXPORT_FORMAT, 'formatVersion': EXPORT_FORMAT_VERSION, 'version': self._version, 
+                  'title': script._titlePageContents or {}, 'components': components, 
+                  'elementCount': len(script._elements or []), 'sceneCount': script.sceneIndex().sceneCount()}
+        if self._shortKeys:
+            header['keys'] = SHORT_KEYS
+        if self._kindCodes:
+            header['kinds'] = list(ElementKind.Names)
+        return header
+    
+    # Records of the script's elements, in order
+    def iterElementRecords(self):
+        keys = self._keys
+        kindKey = keys['kind']
+        textKey = keys['text']
+        kindCodes = self._kindCodes
+        names = ElementKind.Names
+        fountainRegex = self._script.componentManifest()._fountainRegex
+        
+        ordinal = 0
+        for element in (self._script._elements or []):
+            kind = element._kind
+            record = {kindKey: kind if kindCodes else names[kind], textKey: element._elementText}
+            if (kind == ElementKind.SCENE_HEADING):
+                record[keys['scene']] = ordinal
+                ordinal += 1
+            if (element._sceneNumber is not None):
+                record[keys['number']] = element._sceneNumber
+            if (element._isDualDialogue):
+                record[keys['dual']] = True
+            if (element._isCentered):
+                record[keys['centered']] = True
+            if (element._sectionDepth):
+                record[keys['depth']] = element._sectionDepth
+            if (kind == ElementKind.COMPONENT_ARGUMENTS):
+                record[keys['args']] = dict(componentArgumentsOf(fountainRegex, element._elementText))
+            yield record
+    
+    # Yields the NDJSON lines, header first
+    def iterLines(self):
+        encode = self._encoder.encode
+        yield encode(self.headerRecord()) + '\n'
+        for record in self.iterElementRecords():
+            yield encode(record) + '\n'
+    
+    # Writes the NDJSON into a writable text stream, flushing it before every scene heading
+    def writeNDJSON(self, stream):
+        sceneKey = self._keys['scene']
+        encode = self._encoder.encode
+        stream.write(encode(self.headerRecord()) + '\n')
+        for record in self.iterElementRecords():
+            if sceneKey in record:
+                stream.flush()
+            stream.write(encode(record) + '\n')
+        stream.flush()
+        return
+    
+    # The same records as one JSON document: {"header": ..., "elements": [...]}
+    def exportJSON(self):
+        return self._encoder.encode({'header': self.headerRecord(), 'elements': list(self.iterElementRecords())})
\ No newline at end of file
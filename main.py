@@ -20,23 +20,66 @@
 # main script for debugging
 
 from fountain_script import FountainScript
-from html_generator import FountainHTMLGenerator
-from fountain_parser import ParserVersion
+from html_generator import FountainHTMLGenerator, OUTPUT_BUFFER_SIZE
+from fountain_parser import Parser, ParserVersion
+from batch_renderer import BatchRenderer
+from render_cache import RenderCache, DEFAULT_CACHE_SIZE
+from watch_renderer import WatchRenderer, DEBOUNCE_DELAY
+from render_server import RenderServer, ScriptPool, DEFAULT_POOL_SIZE, DEFAULT_HOST
+from parse_trace import LoggingTracer
+from parse_archive import loadArchive, writeArchive
+from parallel_renderer import ParallelRenderer
+from paginator import PagedHtmlWriter
+from json_exporter import FountainJSONExporter
 
-import sys, getopt
+import sys, getopt, time, json, logging
 
 def usage():
-    print('main.py -v <parser version tag> -i <inputfile> -c <cssfile: relevant to outputFile path> -o <outputfile> -f <component parent folder name, relevant to outputFile path>')
+    print('main.py -v <parser version tag> -e <parser engine> -i <inputfile> -c <cssfile: relevant to outputFile path> -o <outputfile> -f <component parent folder name, relevant to outputFile path>')
+    print('main.py -b <input directory or glob> [-d <output directory>] [-j <worker count>] [-v, -e, -c, -f as above]')
+    print('  add -k <cache folder> [--cachesize <megabytes>] to either form to reuse renders of unchanged input')
+    print('  add -w [--debounce <milliseconds>] to the first form to keep rendering the input file whenever it changes')
+    print('  add -p [--profilejson <stats file>] to the first form to print (and save) per rule parse timings')
+    print('  add -t [--tracefile <markup file>] to the first form to log every parsed element (and dump the intermediate markup)')
+    print('  add --parallel [-j <worker count>] to the first form to parse and render the input in parts on several cores')
+    print('  add --pages to the first form to write every page as its own fragment, and an output file that loads them on demand')
+    print('  add --ndjson [--shortkeys] [--kindcodes] to the first form to write the parsed elements as NDJSON records instead of html')
+    print('  add --deferimports <element count> to the first form to import components first used after that many elements asynchronously')
+    print('  add -a <parse archive> to the first form to load the parsed script from the archive while it matches the input, and write it otherwise')
+    print('main.py --serve <port> [--host <address>] [--root <script folder>] [--poolsize <scripts>] [-v, -e, -c, -f as above]')
 
 def main(argv):
     parserVersion = ParserVersion.DEFAULT
+    parserEngine = ParserVersion.DEFAULT_ENGINE
     inputFile = 'html-test/remap-script.txt'
     outputFile = 'html-test/debug.html'
     cssFile = 'ScriptCSS.css'
     componentParent = 'components'
+    batchInput = ''
+    batchOutputDir = ''
+    batchWorkers = None
+    cacheDir = ''
+    cacheSize = DEFAULT_CACHE_SIZE
+    watch = False
+    debounceDelay = DEBOUNCE_DELAY
+    servePort = None
+    serveHost = DEFAULT_HOST
+    serveRoot = '.'
+    poolSize = DEFAULT_POOL_SIZE
+    profile = False
+    profileFile = ''
+    trace = False
+    traceFile = ''
+    archiveFile = ''
+    parallel = False
+    pages = False
+    deferImports = None
+    ndjson = False
+    shortKeys = False
+    kindCodes = False
     
     try:
-        opts, args = getopt.getopt(argv, 'hv:i:c:o:f:', ['version=', 'ifile=', 'cssfile=', 'ofile=', 'compfolder='])
+        opts, args = getopt.getopt(argv, 'hv:e:i:c:o:f:b:d:j:k:wpta:', ['version=', 'engine=', 'ifile=', 'cssfile=', 'ofile=', 'compfolder=', 'batch=', 'outdir=', 'jobs=', 'cache=', 'cachesize=', 'watch', 'debounce=', 'serve=', 'host=', 'root=', 'poolsize=', 'profile', 'profilejson=', 'trace', 'tracefile=', 'archive=', 'parallel', 'pages', 'deferimports=', 'ndjson', 'shortkeys', 'kindcodes'])
     except getopt.GetoptError:
         usage()
         sys.exit(2)
@@ -50,13 +93,96 @@ def main(argv):
             outputFile = arg
         elif opt in ('-v', '--version'):
             parserVersion = arg.lower()
+        elif opt in ('-e', '--engine'):
+            parserEngine = arg.lower()
         elif opt in ('-c', '--cfile'):
             cssFile = arg
         elif opt in ('-f', '--compfolder'):
             componentParent = arg
+        elif opt in ('-b', '--batch'):
+            batchInput = arg
+        elif opt in ('-d', '--outdir'):
+            batchOutputDir = arg
+        elif opt in ('-j', '--jobs'):
+            try:
+                batchWorkers = int(arg)
+            except ValueError:
+                usage()
+                sys.exit(2)
+            if batchWorkers < 1:
+                usage()
+                sys.exit(2)
+        elif opt in ('-k', '--cache'):
+            cacheDir = arg
+        elif opt == '--cachesize':
+            try:
+                cacheSize = int(float(arg) * 1024 * 1024)
+            except ValueError:
+                usage()
+                sys.exit(2)
+        elif opt in ('-w', '--watch'):
+            watch = True
+        elif opt == '--debounce':
+            try:
+                debounceDelay = float(arg) / 1000
+            except ValueError:
+                usage()
+                sys.exit(2)
+        elif opt == '--serve':
+            try:
+                servePort = int(arg)
+            except ValueError:
+                usage()
+                sys.exit(2)
+        elif opt == '--host':
+            serveHost = arg
+        elif opt == '--root':
+            serveRoot = arg
+        elif opt == '--poolsize':
+            try:
+                poolSize = int(arg)
+            except ValueError:
+                usage()
+                sys.exit(2)
+        elif opt in ('-p', '--profile'):
+            profile = True
+        elif opt == '--profilejson':
+            profile = True
+            profileFile = arg
+        elif opt in ('-t', '--trace'):
+            trace = True
+        elif opt == '--tracefile':
+            trace = True
+            traceFile = arg
+        elif opt in ('-a', '--archive'):
+            archiveFile = arg
+        elif opt == '--parallel':
+            parallel = True
+        elif opt == '--pages':
+            pages = True
+        elif opt == '--deferimports':
+            try:
+                deferImports = int(arg)
+            except ValueError:
+                usage()
+                sys.exit(2)
+            if deferImports < 0:
+                usage()
+                sys.exit(2)
+        elif opt == '--ndjson':
+            ndjson = True
+        elif opt == '--shortkeys':
+            shortKeys = True
+        elif opt == '--kindcodes':
+            kindCodes = True
             
-    print('fountainhead: Input file is \'' + inputFile + '\'')
-    print('fountainhead: Output file is \'' + outputFile + '\'')
+    if servePort is not None:
+        print('fountainhead: Serving scripts under \'' + serveRoot + '\'')
+    elif batchInput == '':
+        print('fountainhead: Input file is \'' + inputFile + '\'')
+        print('fountainhead: Output file is \'' + outputFile + '\'')
+    else:
+        print('fountainhead: Batch input is \'' + batchInput + '\'')
     print('fountainhead: CSS file is \'' + cssFile + '\' (relevant to output file path)')
     print('fountainhead: Component html parent folder is \'' + componentParent + '\' (relevant to output file path)')
     
@@ -65,16 +191,152 @@ def main(argv):
     else:
         print('WARNING: Unknown version tag \'' + parserVersion + '\'; using default version \'' + ParserVersion.DEFAULT + '\' instead')
         parserVersion = ParserVersion.DEFAULT
+    
+    if parserEngine in ParserVersion.Engines:
+        print('fountainhead: Parser engine is \'' + parserEngine + '\'')
+    else:
+        print('WARNING: Unknown parser engine \'' + parserEngine + '\'; using default engine \'' + ParserVersion.DEFAULT_ENGINE + '\' instead')
+        parserEngine = ParserVersion.DEFAULT_ENGINE
+    
+    if servePort is not None:
+        serveMain(servePort, serveHost, serveRoot, poolSize, parserVersion, parserEngine, cssFile, componentParent)
+        return
+    
+    if batchInput != '':
+        batchMain(batchInput, batchOutputDir, batchWorkers, parserVersion, parserEngine, cssFile, componentParent, cacheDir, cacheSize)
+        return
+    
+    if watch:
+        watchRenderer = WatchRenderer(inputFile, outputFile, parserVersion, parserEngine, cssFile, componentParent, debounceDelay)
+        try:
+            watchRenderer.run()
+        except KeyboardInterrupt:
+            print('fountainhead: Stopped watching')
+        return
+    
+    if (cacheDir != '' and (profile or trace)):
+        print('WARNING: Profiling and tracing parse the input, so the render cache is not used')
+    elif (cacheDir != '' and deferImports is not None):
+        print('WARNING: Cached renders import every component up front, so the render cache is not used')
+    elif (cacheDir != '' and ndjson):
+        print('WARNING: The render cache only holds html, so it is not used for NDJSON output')
+    elif (cacheDir != '' and pages):
+        print('WARNING: The render cache only holds single file html, so it is not used for paged output')
+    elif (cacheDir != '' and archiveFile != ''):
+        print('WARNING: Parse archives hold the parsed script, which the render cache never builds, so the render cache is not used')
+    elif (cacheDir != '' and parallel):
+        print('WARNING: The render cache renders the input in one process, so it is not used with --parallel')
+    elif cacheDir != '':
+        # parsing and rendering are skipped when this input was rendered with the same settings before
+        renderCache = RenderCache(cacheDir, cacheSize)
+        with open(inputFile, 'rb') as file:
+            data = file.read()
+        htmlOutput = renderCache.renderHtml(data, parserVersion, parserEngine, cssFile, componentParent)
+        with open(outputFile, 'w', buffering = OUTPUT_BUFFER_SIZE) as file:
+            file.write(htmlOutput)
+        print('SUCCESS: HTML file written to ' + outputFile)
+        return
+    
+    if (parallel and (profile or trace or archiveFile != '' or pages or deferImports is not None or ndjson)):
+        print('WARNING: Profiling, tracing, parse archives, pages, deferred imports and NDJSON need the script parsed in one process, so --parallel is ignored')
+    elif parallel:
+        parallelRenderer = ParallelRenderer(parserVersion, parserEngine, cssFile, componentParent, batchWorkers)
+        with open(inputFile, 'rb') as file:
+            data = file.read()
+        try:
+            htmlOutput = parallelRenderer.renderHtml(data)
+        finally:
+            parallelRenderer.close()
+        with open(outputFile, 'w', buffering = OUTPUT_BUFFER_SIZE) as file:
+            file.write(htmlOutput)
+        print('SUCCESS: HTML file written to ' + outputFile + ' (' + str(parallelRenderer._partCount) + ' parts)')
+        return
         
-    fountainScript = FountainScript(inputFile, parserVersion)
+    fountainScript = None
+    if (archiveFile != '' and (profile or trace)):
+        print('WARNING: Profiling and tracing parse the input, so the parse archive is not used')
+        archiveFile = ''
+    elif archiveFile != '':
+        with open(inputFile, 'rb') as file:
+            data = file.read()
+        # the archive is only used if it holds this input, parsed with the same version, engine and rules
+        fountainScript = loadArchive(archiveFile, parserVersion, parserEngine, data)
+        if fountainScript is not None:
+            print('fountainhead: Parsed script loaded from ' + archiveFile)
+    
+    if fountainScript is None:
+        parser = Parser(parserVersion, parserEngine)
+        if profile:
+            parseStats = parser.enableStats()
+        if trace:
+            logging.basicConfig(level = logging.DEBUG, format = '%(message)s')
+            parser.setTracer(LoggingTracer(markupFile = traceFile))
+        if archiveFile != '':
+            fountainScript = FountainScript.fromString(data, parser = parser)
+            writeArchive(archiveFile, fountainScript, parserVersion, parserEngine, data)
+            print('SUCCESS: Parse archive written to ' + archiveFile)
+        elif (profile or pages or ndjson):
+            # the element array is built in one go, so that its construction is timed,
+            # the pages can be laid out or the elements exported
+            fountainScript = FountainScript(inputFile, parser = parser)
+        else:
+            # no script is kept: elements are rendered as the parser yields them
+            with open(inputFile) as file:
+                elements, titlePageContents = parser.iterString(file.read())
     fountainHTML = FountainHTMLGenerator(fountainScript, cssFile, componentParent, parserVersion)
-    htmlOutput = fountainHTML.generateHtml()
+    if deferImports is not None:
+        fountainHTML.deferImportsAfter(deferImports)
+    
+    if ndjson:
+        exporter = FountainJSONExporter(fountainScript, parserVersion, shortKeys, kindCodes)
+        with open(outputFile, 'w', encoding = 'utf-8', buffering = OUTPUT_BUFFER_SIZE) as file:
+            exporter.writeNDJSON(file)
+        print('SUCCESS: NDJSON file written to ' + outputFile)
+    elif pages:
+        pagedWriter = PagedHtmlWriter(fountainHTML)
+        pageCount = pagedWriter.write(outputFile)
+        print('SUCCESS: ' + str(pageCount) + ' pages written to ' + pagedWriter.pagesFolderFor(outputFile) + ', loaded by ' + outputFile)
+    else:
+        # stream html into the file through a buffered writer
+        with open(outputFile, 'w', buffering = OUTPUT_BUFFER_SIZE) as file:
+            if fountainScript is None:
+                fountainHTML.writeHtmlForStream(file, elements, titlePageContents)
+            else:
+                fountainHTML.writeHtml(file)
+        
+        print('SUCCESS: HTML file written to ' + outputFile)
     
-    # write html to file
-    file = open(outputFile, 'w')
-    file.write(htmlOutput)
+    if profile:
+        print(parseStats.report())
+        if profileFile != '':
+            with open(profileFile, 'w') as file:
+                json.dump(parseStats.asDict(), file, indent = 2)
+            print('SUCCESS: Parse statistics written to ' + profileFile)
+
+def batchMain(batchInput, outputDir, workers, parserVersion, parserEngine, cssFile, componentParent, cacheDir, cacheSize):
+    batchRenderer = BatchRenderer(parserVersion, parserEngine, cssFile, componentParent, workers, cacheDir, cacheSize)
+    inputFiles = batchRenderer.inputFiles(batchInput)
+    if not inputFiles:
+        print('WARNING: No input files found for \'' + batchInput + '\'')
+        return
+    
+    start = time.perf_counter()
+    results = batchRenderer.render(inputFiles, outputDir)
+    batchRenderer.printReport(results, time.perf_counter() - start)
     
-    print('SUCCESS: HTML file written to ' + outputFile)
+    if any(result[3] is not None for result in results):
+        sys.exit(1)
+
+def serveMain(port, host, root, poolSize, parserVersion, parserEngine, cssFile, componentParent):
+    scriptPool = ScriptPool(parserVersion, parserEngine, cssFile, componentParent, poolSize)
+    renderServer = RenderServer((host, port), root, scriptPool)
+    print('fountainhead: Listening on ' + str(renderServer.server_address[0]) + ' port ' + str(renderServer.server_address[1]) + '; press Ctrl-C to stop')
+    try:
+        renderServer.serve_forever()
+    except KeyboardInterrupt:
+        print('fountainhead: Stopped serving')
+    finally:
+        renderServer.server_close()
     
 if __name__ == "__main__":
     main(sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,264 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the paginator, which lays a script out on screenplay pages, and the
+# paged html writer, which writes every page as its own html fragment plus a small index
+# document that loads the pages as they are scrolled to (main.py --pages).
+#
+# Page breaks are estimated with the usual screenplay metrics: 12pt Courier at ten
+# characters per inch, 55 lines per page, and per element type a line width and a number
+# of blank lines in front of it (left out at the top of a page). Element texts are
+# wrapped word by word; line counts are cached per text and width. Explicit page breaks
+# (===) always end a page. A page never ends after a scene heading, character cue,
+# parenthetical or the start of a component, nor inside a dual dialogue, so pages render
+# to balanced html on their own.
+
+import os
+
+from fountain_element import ElementKind
+from html_generator import OUTPUT_BUFFER_SIZE
+from fountain_parser import ParserVersion
+
+LINES_PER_PAGE = 55
+
+# Per element kind, (line width in characters, blank lines in front); kinds not listed
+# take no room on the page
+ELEMENT_METRICS = {
+    ElementKind.SCENE_HEADING:         (61, 2),
+    ElementKind.ACTION:                (61, 1),
+    ElementKind.TRANSITION:            (61, 1),
+    ElementKind.CHARACTER:             (38, 1),
+    ElementKind.DIALOGUE:              (35, 0),
+    ElementKind.PARENTHETICAL:         (26, 0),
+    ElementKind.COMPONENT_DESCRIPTION: (61, 1),
+}
+
+# Kinds that stay on the page of the element after them
+KEEP_WITH_NEXT_KINDS = (ElementKind.SCENE_HEADING, ElementKind.CHARACTER, ElementKind.PARENTHETICAL, ElementKind.COMPONENT_NAME, ElementKind.COMPONENT_ARGUMENTS)
+
+# Kinds the html generator skips
+SKIPPED_KINDS = (ElementKind.BONEYARD, ElementKind.COMMENT, ElementKind.SYNOPSIS, ElementKind.SECTION_HEADING)
+
+# Cached line counts before the cache is cleared
+LINE_CACHE_SIZE = 1 << 16
+
+# Page fragments are written to <index name>PAGES_FOLDER_SUFFIX/PAGE_FILE_TEMPLATE
+PAGES_FOLDER_SUFFIX = '.pages'
+PAGE_FILE_TEMPLATE = 'page-%04d.html'
+PAGE_FILE_PREFIX = 'page-'
+PAGE_FILE_EXTENSION = '.html'
+PAGE_CLASS = 'page'
+
+# Loads a page into its section once the section comes near the viewport
+PAGE_LOADER_SCRIPT = '''<script>
+(function () {
+  var pages = document.querySelectorAll('section[data-src]');
+  function load(page) {
+    var src = page.getAttribute('data-src');
+    page.removeAttribute('data-src');
+    fetch(src).then(function (response) { return response.text(); }).then(function (html) {
+      page.innerHTML = html;
+      page.style.minHeight = '';
+    });
+  }
+  if (!('IntersectionObserver' in window)) {
+    for (var i = 0; i < pages.length; i++) load(pages[i]);
+    return;
+  }
+  var observer = new IntersectionObserver(function (entries) {
+    entries.forEach(function (entry) {
+      if (entry.isIntersecting) {
+        observer.unobserve(entry.target);
+        load(entry.target);
+      }
+    });
+  }, { rootMargin: '200% 0px' });
+  for (var i = 0; i < pages.length; i++) observer.observe(pages[i]);
+})();
+</script>
+'''
+
+class Paginator(object):
+    def __init__(self, linesPerPage = LINES_PER_PAGE):
+        self._linesPerPage = linesPerPage
+        self._lineCounts = {}
+        return
+    
+    # Number of lines text takes when wrapped at width characters
+    def lineCount(self, text, width):
+        key = (width, text)
+        count = self._lineCounts.get(key)
+        if count is not None:
+            return count
+        
+        count = 0
+        for line in text.split('\n'):
+            count += 1
+            column = 0
+            for word in line.split():
+                if column == 0:
+                    column = len(word)
+                elif column + 1 + len(word) <= width:
+                    column += 1 + len(word)
+                else:
+                    count += 1
+                    column = len(word)
+                # words longer than a line are cut
+                while column > width:
+                    count += 1
+                    column -= width
+        
+        if len(self._lineCounts) >= LINE_CACHE_SIZE:
+            self._lineCounts = {}
+        self._lineCounts[key] = count
+        return count
+    
+    # (blank lines in front, lines of text) of an element
+    def elementLines(self, element):
+        metrics = ELEMENT_METRICS.get(element._kind)
+        if metrics is None:
+            return (0, 0)
+        width, spacing = metrics
+        return (spacing, self.lineCount(element._elementText, width))
+    
+    # Pages of elements as a list of (start, end) element ranges; explicit page break
+    # elements are left out of the ranges
+    def paginate(self, elements):
+        pages = []
+        pageStart = 0
+        # Lines used on the current page
+        used = 0
+        # Elements that have to stay together and are not on the page yet
+        blockStart = 0
+        blockLines = 0
+        blockSpacing = None
+        keepWithNext = False
+        # Dual dialogue state of the html generator, see ElementRenderer.renderChunks
+        dualDialogueCount = 0
+        
+        index = 0
+        for element in elements:
+            kind = element._kind
+            if (kind == ElementKind.PAGE_BREAK):
+                # Elements still held together end the page, if they fit on it
+                if (blockSpacing is not None and used > 0 and used + blockLines > self._linesPerPage):
+                    pages.append((pageStart, blockStart))
+                    pageStart = blockStart
+                if pageStart < index:
+                    pages.append((pageStart, index))
+                pageStart = index + 1
+                used = 0
+                blockStart = index + 1
+                blockLines = 0
+                blockSpacing = None
+                keepWithNext = False
+                index += 1
+                continue
+            
+            if not (kind in SKIPPED_KINDS):
+                spacing, lines = self.elementLines(element)
+                if blockSpacing is None:
+                    blockSpacing = spacing
+                blockLines += spacing + lines
+                keepWithNext = (kind in KEEP_WITH_NEXT_KINDS)
+                
+                if (kind == ElementKind.CHARACTER and element._isDualDialogue):
+                    dualDialogueCount += 1
+                if (dualDialogueCount >= 2 and not (kind in (ElementKind.CHARACTER, ElementKind.DIALOGUE, ElementKind.PARENTHETICAL))):
+                    dualDialogueCount = 0
+            index += 1
+            
+            # A page may end after this element
+            if (blockSpacing is not None and not keepWithNext and dualDialogueCount == 0):
+                if (used > 0 and used + blockLines > self._linesPerPage):
+                    pages.append((pageStart, blockStart))
+                    pageStart = blockStart
+                    used = 0
+                if used == 0:
+                    used = blockLines - blockSpacing
+                else:
+                    used += blockLines
+                blockStart = index
+                blockLines = 0
+                blockSpacing = None
+        
+        if pageStart < index:
+            pages.append((pageStart, index))
+        return pages
+
+class PagedHtmlWriter(object):
+    def __init__(self, generator, paginator = None):
+        self._generator = generator
+        self._paginator = paginator or Paginator()
+        return
+    
+    def pagesFolderFor(self, indexFile):
+        return os.path.splitext(indexFile)[0] + PAGES_FOLDER_SUFFIX
+    
+    # Writes the pages of the generator's script as fragments next to indexFile, and the
+    # index document loading them into indexFile; returns the page count
+    def write(self, indexFile):
+        generator = self._generator
+        script = generator._script
+        elements = script._elements or []
+        pages = self._paginator.paginate(elements)
+        
+        pagesFolder = self.pagesFolderFor(indexFile)
+        if not os.path.isdir(pagesFolder):
+            os.makedirs(pagesFolder)
+        
+        # Pages are rendered one at a time, so only one page of html is held at once
+        pageSections = []
+        pageFiles = set()
+        for number, (start, end) in enumerate(pages, 1):
+            generator.setScript(script)
+            pageFiles.add(PAGE_FILE_TEMPLATE % number)
+            with open(os.path.join(pagesFolder, PAGE_FILE_TEMPLATE % number), 'w', encoding = 'utf-8', buffering = OUTPUT_BUFFER_SIZE) as file:
+                for chunk in generator.elementChunks(elements[start:end], True):
+                    file.write(chunk)
+            pageLines = sum(sum(self._paginator.elementLines(element)) for element in elements[start:end])
+            source = os.path.basename(pagesFolder) + '/' + PAGE_FILE_TEMPLATE % number
+            pageSections.append('<section class=\'' + PAGE_CLASS + '\' data-src=\'' + source + '\' style=\'min-height: ' + str(pageLines) + 'em\'></section>\n')
+        
+        # Pages left from an earlier, longer render of the script
+        for name in os.listdir(pagesFolder):
+            if (name.startswith(PAGE_FILE_PREFIX) and name.endswith(PAGE_FILE_EXTENSION) and name not in pageFiles):
+                os.remove(os.path.join(pagesFolder, name))
+        
+        # The index imports every component, since the pages end up in its document;
+        # those below the generator's import fold load asynchronously
+        componentList = []
+        deferredList = []
+        if (generator._version != ParserVersion.BASE):
+            manifest = script.componentManifest()
+            if (generator._importFold is None):
+                componentList = list(manifest.componentNames())
+            else:
+                componentList, deferredList = manifest.splitAt(generator._importFold)
+        head = generator.headForScript(componentList, deferredList)
+        # headForScript opens the first section, which the index keeps for the title page
+        with open(indexFile, 'w', encoding = 'utf-8', buffering = OUTPUT_BUFFER_SIZE) as file:
+            file.write(head)
+            file.write(generator.titleForScript())
+            file.write('</section>\n')
+            for section in pageSections:
+                file.write(section)
+            file.write(PAGE_LOADER_SCRIPT)
+            file.write('</body>\n</html>\n')
+        return len(pages)
\ No newline at end of file
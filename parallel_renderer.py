@@ -0,0 +1,212 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the parallel renderer, which parses and renders one large script
+# on several cores (main.py --parallel).
+#
+# The body is split into scene chunks (see Parser.sceneChunksOfBody), which are grouped
+# into parts of about equal size. Worker processes parse and render the parts, and the
+# results are joined in order. A part is rendered as if no dual dialogue were open in
+# front of it and as if at least two elements came before it; the few parts for which
+# that does not hold (a dual dialogue cue pairing with cues in the part before, or a
+# part right after near-empty ones) are parsed or rendered again in this process with
+# the right state. The component manifests of the parts are merged in order, so the
+# head imports the same components as FountainHTMLGenerator's would.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from fountain_script import FountainScript
+from html_generator import FountainHTMLGenerator
+from fountain_parser import Parser, ParserVersion
+from component_manifest import ComponentManifest
+
+# Parts are at least this many characters, so small scripts are not cut up for nothing
+MIN_PART_SIZE = 32 * 1024
+# Parts per worker, so that workers finishing early pick up more
+PARTS_PER_WORKER = 4
+# Scripts of fewer scene chunks than this are parsed and rendered whole in this
+# process, as they are with one worker; splitting them costs more than it saves
+MIN_PARALLEL_CHUNKS = 16
+# Elements assumed in front of every part but the first; a dual dialogue cue
+# only counts from the third element of a script on
+ASSUMED_FIRST_INDEX = 2
+
+# Per worker process parser and generator, set up by initPartWorker
+_workerParser = None
+_workerGenerator = None
+
+def initPartWorker(parserVersion, parserEngine, cssFile, componentParent):
+    global _workerParser, _workerGenerator
+    _workerParser = Parser(parserVersion, parserEngine)
+    _workerGenerator = FountainHTMLGenerator(None, cssFile, componentParent, parserVersion)
+    return
+
+# Parses and renders one part in a worker, see renderPartWith
+def renderPart(text, first, last, keepElements):
+    return renderPartWith(_workerParser, _workerGenerator, text, first, last, keepElements)
+
+# Returns (elements if keepElements else None, element count, whether the dual dialogue lookback
+# ran off the start of the part, html, dual dialogue count at the end, component manifest)
+def renderPartWith(parser, generator, text, first, last, keepElements):
+    elements = parser.parseSceneChunk(text, first, 0 if first else ASSUMED_FIRST_INDEX)
+    lookbackOpen = parser._dualDialogueLookbackOpen
+    generator.setScript(None)
+    html = ''.join(generator.elementChunks(elements, not last))
+    manifest = ComponentManifest(elements, parser._fountainRegex)
+    return (elements if keepElements else None, len(elements), lookbackOpen, html, generator.dualDialogueCharacterCount(), manifest)
+
+class ParallelRenderer(object):
+    def __init__(self, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, cssFile = '', componentParent = 'components', workers = None):
+        self._parserVersion = parserVersion
+        self._parserEngine = parserEngine
+        self._cssFile = cssFile
+        self._componentParent = componentParent
+        # None uses one worker per CPU
+        self._workers = workers or os.cpu_count() or 1
+        self._parser = Parser(parserVersion, parserEngine)
+        self._fountainRegex = self._parser._fountainRegex
+        self._generator = FountainHTMLGenerator(None, cssFile, componentParent, parserVersion)
+        # Worker pool, started on first use and kept for later scripts
+        self._executor = None
+        # Number of parts of the last script, and how many were done again in this process
+        self._partCount = 0
+        self._redoneParts = 0
+        return
+    
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        return
+    
+    def executor(self):
+        if self._executor is None:
+            initArgs = (self._parserVersion, self._parserEngine, self._cssFile, self._componentParent)
+            self._executor = ProcessPoolExecutor(max_workers = self._workers, initializer = initPartWorker, initargs = initArgs)
+        return self._executor
+    
+    # Groups consecutive chunks into part texts of at least partSize characters
+    # (the last part may be shorter)
+    def partsOfChunks(self, chunks, partSize):
+        parts = []
+        pieces = []
+        size = 0
+        for chunk in chunks:
+            pieces.append(chunk)
+            size += len(chunk)
+            if size >= partSize:
+                parts.append(''.join(pieces))
+                pieces = []
+                size = 0
+        if pieces:
+            parts.append(''.join(pieces))
+        return parts
+    
+    # Parses and renders text (string or utf-8 bytes) part by part; returns the title page
+    # contents and per unit lists of elements (None unless keepElements), html and component manifests.
+    # A unit is one part, or several when they had to be parsed as one
+    def renderUnits(self, text, keepElements):
+        if isinstance(text, bytes):
+            text = text.decode('utf-8')
+        if self._fountainRegex.CARRIAGE_RETURN in text:
+            text = self._fountainRegex.UNIVERSAL_LINE_BREAKS_REGEX.sub(self._fountainRegex.UNIVERSAL_LINE_BREAKS_TEMPLATE, text)
+        
+        body, titlePage = self._parser.splitString(text)
+        titlePageContents = self._parser.parseTitlePageContents(titlePage)
+        parts = [body]
+        if (self._workers > 1):
+            chunks = self._parser.sceneChunksOfBody(body)
+            if (len(chunks) >= MIN_PARALLEL_CHUNKS):
+                partSize = max(MIN_PART_SIZE, len(body) // (self._workers * PARTS_PER_WORKER))
+                parts = self.partsOfChunks(chunks, partSize)
+        firsts = [i == 0 for i in range(len(parts))]
+        lasts = [i == len(parts) - 1 for i in range(len(parts))]
+        if (len(parts) > 1 and self._workers > 1):
+            results = list(self.executor().map(renderPart, parts, firsts, lasts, repeat(keepElements)))
+        else:
+            results = [renderPartWith(self._parser, self._generator, part, first, last, keepElements) for part, first, last in zip(parts, firsts, lasts)]
+        self._partCount = len(parts)
+        self._redoneParts = 0
+        
+        # Units as [text, first, last, element index, elements, element count, html, dual dialogue count at the end, component manifest];
+        # html is None where it is still to be rendered
+        units = []
+        elementCount = 0
+        for i in range(len(parts)):
+            elements, count, lookbackOpen, html, dualDialogueOut, manifest = results[i]
+            if (i > 0 and (lookbackOpen or elementCount < ASSUMED_FIRST_INDEX)):
+                # The part was parsed with the wrong elements in front of it, or its dual
+                # dialogue cue pairs with cues before it; parse it here, with the units it reaches into
+                unitText = parts[i]
+                unitFirst = False
+                elements = self._parser.parseSceneChunk(unitText, unitFirst, elementCount)
+                self._redoneParts += 1
+                while (self._parser._dualDialogueLookbackOpen and units):
+                    previous = units.pop()
+                    unitText = previous[0] + unitText
+                    unitFirst = previous[1]
+                    elementCount = previous[3]
+                    elements = self._parser.parseSceneChunk(unitText, unitFirst, elementCount)
+                    self._redoneParts += 1
+                units.append([unitText, unitFirst, lasts[i], elementCount, elements, len(elements), None, None, ComponentManifest(elements, self._fountainRegex)])
+                elementCount += len(elements)
+            else:
+                units.append([parts[i], firsts[i], lasts[i], elementCount, elements, count, html, dualDialogueOut, manifest])
+                elementCount += count
+        
+        # Parts were rendered with no dual dialogue open in front of them
+        dualDialogueCount = 0
+        for unit in units:
+            if (unit[6] is None or dualDialogueCount != 0):
+                if unit[4] is None:
+                    unit[4] = self._parser.parseSceneChunk(unit[0], unit[1], unit[3])
+                self._generator.setScript(None)
+                unit[6] = ''.join(self._generator.elementChunks(unit[4], not unit[2], dualDialogueCount))
+                unit[7] = self._generator.dualDialogueCharacterCount()
+            dualDialogueCount = unit[7]
+        
+        return titlePageContents, units
+    
+    # FountainScript of text, parsed in parts
+    def parseScript(self, text):
+        titlePageContents, units = self.renderUnits(text, True)
+        script = FountainScript()
+        script._fileName = ''
+        script._titlePageContents = titlePageContents
+        script._elements = []
+        for unit in units:
+            script._elements.extend(unit[4])
+        return script
+    
+    # Html document of text, parsed and rendered in parts
+    def renderHtml(self, text):
+        titlePageContents, units = self.renderUnits(text, False)
+        
+        manifest = ComponentManifest()
+        if (self._parserVersion != ParserVersion.BASE):
+            for unit in units:
+                manifest.extend(unit[8], unit[3])
+        
+        self._generator.setScript(None)
+        html = [self._generator.headForScript(list(manifest.componentNames())), self._generator.titleForScript(titlePageContents)]
+        html.extend(unit[6] for unit in units)
+        html.append(self._generator.tailForScript())
+        return ''.join(html)
\ No newline at end of file
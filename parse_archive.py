@@ -0,0 +1,208 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the parse archive, a binary file holding a parsed script, so that
+# a script can be loaded again without parsing its text.
+#
+# An archive is a fixed prefix (magic, format version, header length), a JSON header,
+# and the columns of the script's element table (see element_table) as raw arrays,
+# followed by the element texts as one UTF-8 buffer. The header names the parser
+# version and engine and carries a digest of the version's rule set, plus optionally
+# a digest of the source text; an archive that does not match is not loaded.
+# Scene number texts, the kind names of the kind column and the title page contents
+# are in the header too.
+#
+# Loading maps the file with mmap and only copies the small numeric columns; element
+# texts are decoded from the mapping when an element is used.
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from element_table import ElementTable
+from fountain_element import ElementKind
+from fountain_parser import ParserVersion
+from fountain_script import FountainScript
+from regex_rules import *
+
+ARCHIVE_MAGIC = b'FHPARSE\0'
+# Bump when the layout below changes
+ARCHIVE_FORMAT_VERSION = 2
+# Magic, format version, header length
+ARCHIVE_PREFIX = struct.Struct('<8sII')
+# Columns start at multiples of this
+ARCHIVE_ALIGNMENT = 8
+
+# Element table columns, in file order
+ARCHIVE_COLUMNS = ['_kinds', '_flags', '_sectionDepths', '_sceneNumbers', '_textOffsets']
+
+# Digest of the rule patterns of a parser version; parses with other rules are not loaded
+def rulesDigest(parserVersion = ParserVersion.DEFAULT):
+    if parserVersion == ParserVersion.BASE:
+        fountainRegex = sharedRules(FountainRegexBase)
+    else:
+        fountainRegex = sharedRules(FountainRegexRemap)
+    digest = hashlib.sha256()
+    digest.update(type(fountainRegex).__name__.encode('utf-8'))
+    for pattern in fountainRegex._patterns:
+        digest.update(b'\0')
+        digest.update(pattern.encode('utf-8'))
+    return digest.hexdigest()
+
+def sourceDigest(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+def alignedLength(length):
+    return (length + ARCHIVE_ALIGNMENT - 1) // ARCHIVE_ALIGNMENT * ARCHIVE_ALIGNMENT
+
+# Archive bytes of a parsed script; source, the text or bytes it was parsed from,
+# ties the archive to that text
+def archiveBytes(script, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, source = None):
+    header = {
+        'parserVersion': parserVersion,
+        'parserEngine': parserEngine,
+        'rules': rulesDigest(parserVersion),
+        'source': sourceDigest(source) if source is not None else '',
+        'byteOrder': sys.byteorder,
+        'titlePage': script._titlePageContents,
+        'hasElements': script._elements is not None,
+    }
+    
+    table = script.elementTable()
+    # Texts are stored as UTF-8, so offsets are recomputed in bytes
+    texts = [table.elementText(i).encode('utf-8') for i in range(len(table))]
+    textOffsets = array('q', [0])
+    for text in texts:
+        textOffsets.append(textOffsets[-1] + len(text))
+    columnData = [table._kinds.tobytes(), table._flags.tobytes(), table._sectionDepths.tobytes(), table._sceneNumbers.tobytes(), textOffsets.tobytes()]
+    typeCodes = [table._kinds.typecode, table._flags.typecode, table._sectionDepths.typecode, table._sceneNumbers.typecode, textOffsets.typecode]
+    
+    header['elementCount'] = len(table)
+    header['kindNames'] = ElementKind.Names[:max(table._kinds) + 1] if len(table) else []
+    header['sceneNumbers'] = table._sceneNumberTexts
+    
+    # Column offsets are relative to the end of the header, so they do not depend on its length
+    columns = []
+    offset = 0
+    for name, data, typeCode in zip(ARCHIVE_COLUMNS, columnData, typeCodes):
+        columns.append([name, typeCode, offset, len(data)])
+        offset = alignedLength(offset + len(data))
+    header['columns'] = columns
+    header['text'] = [offset, textOffsets[-1]]
+    
+    headerBytes = json.dumps(header, separators = (',', ':')).encode('utf-8')
+    headerBytes += b' ' * (alignedLength(ARCHIVE_PREFIX.size + len(headerBytes)) - ARCHIVE_PREFIX.size - len(headerBytes))
+    
+    parts = [ARCHIVE_PREFIX.pack(ARCHIVE_MAGIC, ARCHIVE_FORMAT_VERSION, len(headerBytes)), headerBytes]
+    for data in columnData:
+        parts.append(data)
+        parts.append(b'\0' * (alignedLength(len(data)) - len(data)))
+    parts.extend(texts)
+    return b''.join(parts)
+
+# Writes the archive of script to path, replacing it in one rename
+def writeArchive(path, script, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, source = None):
+    data = archiveBytes(script, parserVersion, parserEngine, source)
+    fd, tempPath = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)), prefix = '.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(tempPath, path)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+    return
+
+# FountainScript loaded from the archive at path, or None if there is no readable archive,
+# or it was written by another parser version, engine or rule set, or (if source is given)
+# from another source text
+def loadArchive(path, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, source = None):
+    try:
+        with open(path, 'rb') as file:
+            mapping = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return None
+    
+    try:
+        magic, formatVersion, headerLength = ARCHIVE_PREFIX.unpack_from(mapping, 0)
+        if magic != ARCHIVE_MAGIC or formatVersion != ARCHIVE_FORMAT_VERSION:
+            print('WARNING: ' + path + ' is not a parse archive of this format version')
+            return None
+        header = json.loads(mapping[ARCHIVE_PREFIX.size:ARCHIVE_PREFIX.size + headerLength].decode('utf-8'))
+    except (struct.error, ValueError):
+        print('WARNING: ' + path + ' is not a readable parse archive')
+        return None
+    
+    if (header['parserVersion'] != parserVersion or header['parserEngine'] != parserEngine or header['rules'] != rulesDigest(parserVersion)):
+        return None
+    if (source is not None and header['source'] != sourceDigest(source)):
+        return None
+    
+    script = FountainScript()
+    script._fileName = ''
+    script._titlePageContents = header['titlePage']
+    if header['hasElements']:
+        script._elements = MappedElementTable(mapping, ARCHIVE_PREFIX.size + headerLength, header)
+    else:
+        script._elements = None
+    return script
+
+# Element table over an archive mapping; columns are copied out of the mapping,
+# texts are decoded from it on access, so self._textOffsets are byte offsets into
+# the UTF-8 text of the mapping. Mapped tables are read only.
+class MappedElementTable(ElementTable):
+    def __init__(self, mapping, dataStart, header):
+        ElementTable.__init__(self)
+        self._mapping = mapping
+        
+        for name, typeCode, offset, length in header['columns']:
+            column = array(typeCode)
+            column.frombytes(mapping[dataStart + offset:dataStart + offset + length])
+            if header['byteOrder'] != sys.byteorder:
+                column.byteswap()
+            setattr(self, name, column)
+        
+        # Kind codes of names not known yet are assigned in this process, and may differ
+        codes = [ElementKind.codeForType(name) for name in header['kindNames']]
+        if codes != list(range(len(codes))):
+            self._kinds = array(self._kinds.typecode, [codes[kind] for kind in self._kinds])
+        
+        self._sceneNumberTexts = header['sceneNumbers']
+        self._textStart = dataStart + header['text'][0]
+        self._text = None
+        return
+    
+    def append(self, element):
+        raise TypeError('parse archive element tables are read only')
+    
+    def textBuffer(self):
+        if self._text is None:
+            self._text = self._mapping[self._textStart:self._textStart + self._textOffsets[-1]].decode('utf-8')
+        return self._text
+    
+    def elementText(self, index):
+        return self._mapping[self._textStart + self._textOffsets[index]:self._textStart + self._textOffsets[index + 1]].decode('utf-8')
\ No newline at end of file
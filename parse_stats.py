@@ -0,0 +1,113 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the parse statistics collected by a parser with profiling turned on
+# (Parser.enableStats, main.py -p): for every rule of the regex pipeline its wall time,
+# match count and the change in size of the marked up content, and the wall time of each
+# pass. Statistics add up over every body parsed until they are reset.
+
+import time
+
+class RuleStats(object):
+    def __init__(self, index, name, pattern):
+        self._index = index
+        self._name = name
+        self._pattern = pattern
+        self._calls = 0
+        self._seconds = 0.0
+        self._matches = 0
+        self._sizeDelta = 0
+        return
+    
+    def asDict(self):
+        return {
+            'index': self._index,
+            'name': self._name,
+            'pattern': self._pattern,
+            'calls': self._calls,
+            'seconds': self._seconds,
+            'matches': self._matches,
+            'sizeDelta': self._sizeDelta,
+        }
+
+class ParseStats(object):
+    def __init__(self, ruleNames, rulePatterns):
+        self._ruleNames = ruleNames
+        self._rulePatterns = rulePatterns
+        self.reset()
+        return
+    
+    def reset(self):
+        self._rules = [RuleStats(i, self._ruleNames[i], self._rulePatterns[i]) for i in range(len(self._rulePatterns))]
+        # pass name -> [calls, seconds], in the order the passes first ran
+        self._passes = {}
+        self._parses = 0
+        self._inputSize = 0
+        return
+    
+    def clock(self):
+        return time.perf_counter()
+    
+    def addParse(self, inputSize):
+        self._parses += 1
+        self._inputSize += inputSize
+        return
+    
+    def addRule(self, index, seconds, matches, sizeDelta):
+        rule = self._rules[index]
+        rule._calls += 1
+        rule._seconds += seconds
+        rule._matches += matches
+        rule._sizeDelta += sizeDelta
+        return
+    
+    def addPass(self, name, seconds):
+        passStats = self._passes.setdefault(name, [0, 0.0])
+        passStats[0] += 1
+        passStats[1] += seconds
+        return
+    
+    def rules(self):
+        return self._rules
+    
+    # Rules by time spent, slowest first
+    def slowestRules(self):
+        return sorted(self._rules, key = lambda rule: rule._seconds, reverse = True)
+    
+    def asDict(self):
+        return {
+            'parses': self._parses,
+            'inputSize': self._inputSize,
+            'passes': dict((name, {'calls': calls, 'seconds': seconds}) for name, (calls, seconds) in self._passes.items()),
+            'rules': [rule.asDict() for rule in self._rules],
+        }
+    
+    # Human readable table, passes first, then rules slowest first
+    def report(self):
+        lines = ['Parse statistics: %d parse(s), %d characters' % (self._parses, self._inputSize)]
+        lines.append('pass'.ljust(32) + 'calls'.rjust(8) + 'ms'.rjust(12))
+        for name, (calls, seconds) in self._passes.items():
+            lines.append(name.ljust(32) + str(calls).rjust(8) + ('%.2f' % (seconds * 1000)).rjust(12))
+        
+        if any(rule._calls for rule in self._rules):
+            totalSeconds = sum(rule._seconds for rule in self._rules) or 1.0
+            lines.append('rule'.ljust(32) + 'calls'.rjust(8) + 'ms'.rjust(12) + 'share'.rjust(8) + 'matches'.rjust(10) + 'size delta'.rjust(12))
+            for rule in self.slowestRules():
+                lines.append(('%2d ' % rule._index + rule._name).ljust(32) + str(rule._calls).rjust(8) + ('%.2f' % (rule._seconds * 1000)).rjust(12) + ('%.1f%%' % (rule._seconds * 100 / totalSeconds)).rjust(8) + str(rule._matches).rjust(10) + str(rule._sizeDelta).rjust(12))
+        return '\n'.join(lines)
\ No newline at end of file
@@ -0,0 +1,54 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines parse tracers, which replace the parser's old debug printing.
+# A parser only traces once it is given a tracer (Parser.setTracer); without one it
+# does no tracing work at all, with or without -O.
+#
+# A tracer is any object with these two methods:
+#   traceMarkup(markup)    the marked up body after the rule pass of the regex engine,
+#                          one element per line (the line engine has no markup)
+#   traceElement(element)  every FountainElement, after the element array is built
+# LoggingTracer sends both to a logging channel, and can dump the markup to a file.
+
+import logging
+
+TRACE_LOGGER_NAME = 'fountainhead.parser'
+
+class LoggingTracer(object):
+    def __init__(self, logger = None, markupFile = ''):
+        if logger is None:
+            logger = logging.getLogger(TRACE_LOGGER_NAME)
+        self._logger = logger
+        self._markupFile = markupFile
+        return
+    
+    def traceMarkup(self, markup):
+        if self._markupFile != '':
+            # each parse overwrites the dump of the one before
+            with open(self._markupFile, 'w') as file:
+                file.write(markup)
+            self._logger.debug('Parsed body markup written to %s', self._markupFile)
+        elif self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('Parsed body markup:\n%s', markup)
+        return
+    
+    def traceElement(self, element):
+        self._logger.debug('%s: %s', element._elementType, element._elementText)
+        return
\ No newline at end of file
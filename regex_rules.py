@@ -44,6 +44,70 @@ class FountainRegexBase(object):
                  self.CHARACTER_CUE_TEMPLATE, self.PARENTHETICAL_TEMPLATE, 
                  self.DIALOGUE_TEMPLATE, self.SECTION_HEADER_TEMPLATE,
                  self.ACTION_TEMPLATE, self.CLEANUP_TEMPLATE, self.NEWLINE_RESTORE]
+        
+        # Rule names for profiling (see parse_stats)
+        self._ruleNames = ['UNIVERSAL_LINE_BREAKS', 'BLOCK_COMMENT',
+                'BRACKET_COMMENT', 'SYNOPSIS',
+                'PAGE_BREAK', 'FALSE_TRANSITION',
+                'FORCED_TRANSITION', 'SCENE_HEADER',
+                'FIRST_LINE_ACTION', 'TRANSITION',
+                'CHARACTER_CUE', 'PARENTHETICAL',
+                'DIALOGUE', 'SECTION_HEADER',
+                'ACTION', 'CLEANUP', 'NEWLINE_RESTORE']
+        
+        self.extendRules()
+        self.compileRules()
+        return
+    
+    # Hook for child classes to append their own patterns and templates
+    def extendRules(self):
+        return
+    
+    # Compiled versions of the pattern summary and of every pattern used outside of it,
+    # so that the parser and generator loops don't go through the re module cache
+    def compileRules(self):
+        self._compiledPatterns = [re.compile(pattern) for pattern in self._patterns]
+        
+        self.UNIVERSAL_LINE_BREAKS_REGEX   = re.compile(self.UNIVERSAL_LINE_BREAKS_PATTERN)
+        self.BLOCK_COMMENT_REGEX           = re.compile(self.BLOCK_COMMENT_PATTERN)
+        self.BRACKET_COMMENT_REGEX         = re.compile(self.BRACKET_COMMENT_PATTERN)
+        self.SYNOPSIS_REGEX                = re.compile(self.SYNOPSIS_PATTERN)
+        self.FALSE_TRANSITION_REGEX        = re.compile(self.FALSE_TRANSITION_PATTERN)
+        self.FORCED_TRANSITION_REGEX       = re.compile(self.FORCED_TRANSITION_PATTERN)
+        self.SCENE_HEADER_REGEX            = re.compile(self.SCENE_HEADER_PATTERN)
+        self.FIRST_LINE_ACTION_REGEX       = re.compile(self.FIRST_LINE_ACTION_PATTERN)
+        self.TRANSITION_REGEX              = re.compile(self.TRANSITION_PATTERN)
+        self.CHARACTER_CUE_REGEX           = re.compile(self.CHARACTER_CUE_PATTERN)
+        self.PARENTHETICAL_REGEX           = re.compile(self.PARENTHETICAL_PATTERN)
+        self.SECTION_HEADER_REGEX          = re.compile(self.SECTION_HEADER_PATTERN)
+        self.SCENE_NUMBER_MARK_REGEX       = re.compile(self.SCENE_NUMBER_MARK_PATTERN)
+        self.MASKED_SCENE_NUMBER_REGEX     = re.compile(self.MASKED_SCENE_NUMBER_PATTERN)
+        self.SCENE_BOUNDARY_REGEX          = re.compile(self.SCENE_BOUNDARY_PATTERN)
+        self.BLOCK_COMMENT_SPAN_REGEX      = re.compile(self.BLOCK_COMMENT_SPAN_PATTERN)
+        self.BRACKET_COMMENT_SPAN_REGEX    = re.compile(self.BRACKET_COMMENT_SPAN_PATTERN)
+        self.COMMENT_MARK_REGEX            = re.compile(self.COMMENT_MARK_PATTERN)
+        self.BLANK_EATING_LINE_REGEX       = re.compile(self.BLANK_EATING_LINE_PATTERN)
+        
+        self.TITLE_PAGE_REGEX              = re.compile(self.TITLE_PAGE_PATTERN)
+        self.INLINE_DIRECTIVE_REGEX        = re.compile(self.INLINE_DIRECTIVE_PATTERN)
+        self.MULTI_LINE_DIRECTIVE_REGEX    = re.compile(self.MULTI_LINE_DIRECTIVE_PATTERN)
+        self.MULTI_LINE_DATA_REGEX         = re.compile(self.MULTI_LINE_DATA_PATTERN)
+        self.TITLE_NOT_NEWLINE_REGEX       = re.compile(self.TITLE_NOT_NEWLINE_PATTERN)
+        self.TITLE_NEWLINE_ENDING_REGEX    = re.compile(self.TITLE_NEWLINE_ENDING_PATTERN)
+        
+        self.DUAL_DIALOGUE_REGEX           = re.compile(self.DUAL_DIALOGUE_PATTERN)
+        self.CENTERED_TEXT_REGEX           = re.compile(self.CENTERED_TEXT_PATTERN)
+        self.TAG_REGEX                     = re.compile(self.TAG_PATTERN)
+        self.CLOSING_TAG_REGEX             = re.compile(self.CLOSING_TAG_PATTERN)
+        self.MULTI_NEWLINES_REGEX          = re.compile(self.MULTI_NEWLINES_PATTERN)
+        self.SLASH_N_REGEX                 = re.compile(self.SLASH_N_PATTERN)
+        self.ELEMENT_TEXT_REGEX            = re.compile(self.ELEMENT_TEXT_PATTERN)
+        self.ELEMENT_TEXT_WITH_SCENE_HEADING_REGEX = re.compile(self.ELEMENT_TEXT_WITH_SCENE_HEADING_PATTERN)
+        self.CHARACTER_DUAL_DIALOGUE_REGEX = re.compile(self.CHARACTER_DUAL_DIALOGUE_PATTERN)
+        self.DUAL_DIALOGUE_ANGLE_MARK_REGEX = re.compile(self.DUAL_DIALOGUE_ANGLE_MARK_PATTERN)
+        
+        self.FONT_EMPH_IGNORE_REGEX        = re.compile(self.FONT_EMPH_IGNORE_TAG)
+        self.EMPHASIS_MARKER_REGEX         = re.compile(self.EMPHASIS_MARKER_PATTERN)
         return
     #------------------------------------------------------------------------------
     # Rule string
@@ -67,8 +131,32 @@ class FountainRegexBase(object):
     PAGE_BREAK_PATTERN         = '(?<=\\n)(\\s*[\\=\\-\\_]{3,8}\\s*)\\n{1}'
     CLEANUP_PATTERN            = '<Action>\\s*<\\/Action>'
     FIRST_LINE_ACTION_PATTERN  = '^\\n\\n([^<>\\n#]*?)\\n'
-    SCENE_NUMBER_PATTERN       = '(\\#([0-9A-Za-z\\.\\)-]+)\\#)'
+    # A scene number (#1#, #12A#) ends a scene heading line. Its #s would make the line a
+    # section heading, so before the rules run they are masked, and the scene number is
+    # taken out of the scene heading text again when the element is made
+    SCENE_NUMBER_MARK_PATTERN  = '(?m)^((?:[iI][nN][tT]|[eE][xX][tT]|[^\\w\\n][eE][sS][tT]|\\.|[iI]\\.?\\/[eE]\\.?)[^\\n#]*?)\\#([0-9A-Za-z\\.\\)-]+)\\#[ \\t]*$'
+    SCENE_NUMBER_MASK          = '\x01'
+    SCENE_NUMBER_MARK_TEMPLATE = '\\1\x01\\2\x01'
+    MASKED_SCENE_NUMBER_PATTERN = '\\s*\x01([^\x01]+)\x01'
     SECTION_HEADER_PATTERN     = '((#+)(\\s*[^\\n]*))\\n?'
+    SECTION_HEADER_MARK        = '#'
+    
+    # Scene chunks for incremental parsing: an INT/EXT, I/E or forced scene heading right
+    # after a blank line starts a new chunk, unless it is inside a (possibly multi-line)
+    # boneyard or note. EST headings only match with the blank line in front of them, so
+    # they never start a chunk
+    SCENE_BOUNDARY_PATTERN     = '(?<=\\n\\n)(?:[iI][nN][tT]|[eE][xX][tT]|\\.(?!\\.\\.)|[iI]\\.?\\/[eE]\\.?)[^\\n]+\\n'
+    BLOCK_COMMENT_SPAN_PATTERN   = '(?s)\\n\\/\\*.*?\\*\\/\\n'
+    BRACKET_COMMENT_SPAN_PATTERN = '(?s)\\n\\[{2}.*?\\]{2}\\n'
+    COMMENT_MARK_PATTERN         = '\\[\\[|\\]\\]|\\/\\*|\\*\\/'
+    NOTE_OPEN_MARK               = '[['
+    NOTE_CLOSE_MARK              = ']]'
+    BONEYARD_OPEN_MARK           = '/*'
+    BONEYARD_CLOSE_MARK          = '*/'
+    MASKED_NEWLINE               = ' '
+    # Last non-blank lines whose transition, synopsis or parenthetical match takes the
+    # following blank lines along, which keeps the scene heading after them from being one
+    BLANK_EATING_LINE_PATTERN  = '^(>.*<\\s*|>\\s*|=[^<>=]|\\(.*)$'
 
     # Templates (TODO: Not yet sure if it's the correct usage of 'raw' marker)
 
@@ -101,6 +189,7 @@ class FountainRegexBase(object):
     NEWLINE_REPLACEMENT        = '@@@@'
     NEWLINE_RESTORE            = '\n'
     NEWLINE_DEFAULT            = '\n'
+    CARRIAGE_RETURN            = '\r'
 
     # Title Page
 
@@ -173,6 +262,8 @@ class FountainRegexBase(object):
     
     SCENE_HEADING_PATTERN          = 'Scene Heading'
     # Rendered in html by default
+    ACTION_TAG_PATTERN             = 'Action'
+    TRANSITION_TAG_PATTERN         = 'Transition'
     CHARACTER_TAG_PATTERN          = 'Character'
     DIALOGUE_TAG_PATTERN           = 'Dialogue'
     PARENTHETICAL_TAG_PATTERN      = 'Parenthetical'
@@ -194,41 +285,23 @@ class FountainRegexBase(object):
     SCENE_NUMBER_RIGHT_CLASS       = 'scene-number-right'
     
     #------------------------------------------------------------------------------
-    # The following regexes aren't used by the code here, but may be useful
-
-    # Styling for FDX
-
-    BOLD_ITALIC_UNDERLINE_PATTERN  = '(_\\*{3}|\\*{3}_)([^<>]+)(_\\*{3}|\\*{3}_)'
-    BOLD_ITALIC_PATTERN            = '(\\*{3})([^<>]+)(\\*{3})'
-    BOLD_UNDERLINE_PATTERN         = '(_\\*{2}|\\*{2}_)([^<>]+)(_\\*{2}|\\*{2}_)'
-    ITALIC_UNDERLINE_PATTERN       = '(_\\*{1}|\\*{1}_)([^<>]+)(_\\*{1}|\\*{1}_)'
-    BOLD_PATTERN                   = '(\\*{2})([^<>]+)(\\*{2})'
-    ITALIC_PATTERN                 = '(?<!\\\\)(\\*{1})([^<>]+)(\\*{1})'
-    UNDERLINE_PATTERN              = '(_)([^<>_]+)(_)'
-
-    # Styling templates
-
-    BOLD_ITALIC_UNDERLINE_TEMPLATE = 'Bold+Italic+Underline'
-    BOLD_ITALIC_TEMPLATE           = 'Bold+Italic'
-    BOLD_UNDERLINE_TEMPLATE        = 'Bold+Underline'
-    ITALIC_UNDERLINE_TEMPLATE      = 'Italic+Underline'
-    BOLD_TEMPLATE                  = 'Bold'
-    ITALIC_TEMPLATE                = 'Italic'
-    UNDERLINE_TEMPLATE             = 'Underline'
+    # Centered text and emphasis
     
-    # Corresponding HTML styling replacements
-    
-    BOLD_ITALIC_UNDERLINE_TAG          = r'<strong><em><u>\2</strong></em></u>'
-    BOLD_ITALIC_TAG                    = r'<strong><em>\2</strong></em>'
-    BOLD_UNDERLINE_TAG                 = r'<strong><u>\2</u></strong>'
-    ITALIC_UNDERLINE_TAG               = r'<em><u>\2</em></u>'
-    BOLD_TAG                           = r'<strong>\2</strong>'
-    ITALIC_TAG                         = r'<em>\2</em>'
-    UNDERLINE_TAG                      = r'<u>\2</u>'
     CENTER_CLASS                       = ' center'
     
     # TODO: don't know what this is yet
     FONT_EMPH_IGNORE_TAG               = '\\[{2}(.*?)\\]{2}'
+    FONT_EMPH_IGNORE_MARK              = '[['
+    
+    # Single-pass emphasis rendering (see emphasis_renderer): marker runs (optionally
+    # escaped), and < > which no emphasis may span
+    
+    EMPHASIS_MARKER_PATTERN            = '(\\\\?)(\\*+|_+|[<>])'
+    EMPHASIS_STAR                      = '*'
+    EMPHASIS_UNDERSCORE                = '_'
+    BOLD_HTML_TAG                      = 'strong'
+    ITALIC_HTML_TAG                    = 'em'
+    UNDERLINE_HTML_TAG                 = 'u'
     
 # Child class for selecting which version of the parser, as well as defining remap specific tags 
 class FountainRegexRemap(FountainRegexBase):
@@ -251,12 +324,30 @@ class FountainRegexRemap(FountainRegexBase):
     COMPONENT_ARGUMENTS_SPLIT          = '(?:[^,[(\']|\\[[^]]*\\]|\\([^)]*\\)|\'[^\']*\')+'
     
     # TODO: Argument parsing. Right now we don't do nested Component/CompArg definition
-    def __init__(self):
-        FountainRegexBase.__init__(self) 
+    def extendRules(self):
         # Summary of pattern definition; 
         self._patterns.append(self.WEB_COMPONENT_PATTERN)
         
         # Summary of template definition
         self._templates.append(self.WEB_COMPONENT_TEMPLATE)
+        
+        self._ruleNames.append('WEB_COMPONENT')
+        return
+    
+    def compileRules(self):
+        FountainRegexBase.compileRules(self)
+        self.WEB_COMPONENT_REGEX           = re.compile(self.WEB_COMPONENT_PATTERN)
+        self.COMPONENT_ARGUMENTS_SPLIT_REGEX = re.compile(self.COMPONENT_ARGUMENTS_SPLIT)
         return
+
+# Rule sets are read-only once built, so every parser and generator of the same
+# version shares one instance; each is constructed (and compiled) on first use
+_sharedRules = {}
+
+def sharedRules(ruleClass):
+    rules = _sharedRules.get(ruleClass)
+    if rules is None:
+        rules = ruleClass()
+        _sharedRules[ruleClass] = rules
+    return rules
     
\ No newline at end of file
@@ -0,0 +1,177 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the render cache, an on-disk cache of parsed elements and
+# rendered html keyed by a hash of the input bytes and of every setting that
+# changes the output (parser version and engine, css file, component folder).
+#
+# Each entry is two files in the cache folder: <key>.elements holds the pickled
+# element array and title page contents, <key>.html the rendered document.
+# A hit touches the html file, so modification times order entries by last use;
+# when the folder grows past its size cap, least recently used entries are removed.
+# Files are written under a temporary name and renamed into place, so concurrent
+# renderers (see batch_renderer) never read partial entries.
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from fountain_script import FountainScript
+from html_generator import FountainHTMLGenerator
+from fountain_parser import Parser, ParserVersion
+
+# Bump when parser or generator output changes, to invalidate existing entries
+CACHE_FORMAT_VERSION = '2'
+
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+ELEMENTS_EXTENSION = '.elements'
+HTML_EXTENSION = '.html'
+
+class RenderCache(object):
+    def __init__(self, cacheDir, maxBytes = DEFAULT_CACHE_SIZE):
+        self._cacheDir = cacheDir
+        self._maxBytes = maxBytes
+        if not os.path.isdir(self._cacheDir):
+            os.makedirs(self._cacheDir, exist_ok = True)
+        return
+    
+    def keyFor(self, data, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, cssFile = '', componentParent = 'components'):
+        digest = hashlib.sha256()
+        settings = '\0'.join([CACHE_FORMAT_VERSION, parserVersion, parserEngine, cssFile, componentParent])
+        digest.update(settings.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(data)
+        return digest.hexdigest()
+    
+    def pathFor(self, key, extension):
+        return os.path.join(self._cacheDir, key + extension)
+    
+    # Cached html for key, or None
+    def getHtml(self, key):
+        path = self.pathFor(key, HTML_EXTENSION)
+        try:
+            with open(path, encoding = 'utf-8') as file:
+                html = file.read()
+        except (IOError, OSError):
+            return None
+        self.touch(path)
+        return html
+    
+    # Cached (elements, title page contents) for key, or None
+    def getElements(self, key):
+        try:
+            with open(self.pathFor(key, ELEMENTS_EXTENSION), 'rb') as file:
+                elements, titlePageContents = pickle.load(file)
+        except (IOError, OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        self.touch(self.pathFor(key, HTML_EXTENSION))
+        return elements, titlePageContents
+    
+    def put(self, key, elements, titlePageContents, html):
+        self.writeAtomic(self.pathFor(key, ELEMENTS_EXTENSION), pickle.dumps((elements, titlePageContents), pickle.HIGHEST_PROTOCOL))
+        self.writeAtomic(self.pathFor(key, HTML_EXTENSION), html.encode('utf-8'))
+        self.evict()
+        return
+    
+    def touch(self, path):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return
+    
+    def writeAtomic(self, path, data):
+        fd, tempPath = tempfile.mkstemp(dir = self._cacheDir, prefix = '.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tempPath, path)
+        except BaseException:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+            raise
+        return
+    
+    # Removes least recently used entries until the cache fits its size cap
+    def evict(self):
+        entries = {}
+        totalSize = 0
+        for dirEntry in os.scandir(self._cacheDir):
+            key, extension = os.path.splitext(dirEntry.name)
+            if extension != ELEMENTS_EXTENSION and extension != HTML_EXTENSION:
+                continue
+            try:
+                stat = dirEntry.stat()
+            except OSError:
+                continue
+            size, lastUsed = entries.get(key, (0, 0))
+            if extension == HTML_EXTENSION:
+                lastUsed = stat.st_mtime
+            entries[key] = (size + stat.st_size, lastUsed)
+            totalSize += stat.st_size
+        
+        if totalSize <= self._maxBytes:
+            return
+        for key, (size, lastUsed) in sorted(entries.items(), key = lambda item: item[1][1]):
+            for extension in (ELEMENTS_EXTENSION, HTML_EXTENSION):
+                try:
+                    os.remove(self.pathFor(key, extension))
+                except OSError:
+                    pass
+            totalSize -= size
+            if totalSize <= self._maxBytes:
+                break
+        return
+    
+    # Html for the fountain document in data (bytes), parsed and rendered only on a miss.
+    # parser and generator may be passed in to be reused across calls.
+    def renderHtml(self, data, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, cssFile = '', componentParent = 'components', parser = None, generator = None):
+        key = self.keyFor(data, parserVersion, parserEngine, cssFile, componentParent)
+        html = self.getHtml(key)
+        if html is not None:
+            return html
+        
+        if parser is None:
+            parser = Parser(parserVersion, parserEngine)
+        fountainScript = FountainScript.fromString(data, parser = parser)
+        if generator is None:
+            generator = FountainHTMLGenerator(fountainScript, cssFile, componentParent, parserVersion)
+        else:
+            generator.setScript(fountainScript)
+        html = generator.generateHtml()
+        
+        self.put(key, fountainScript._elements, fountainScript._titlePageContents, html)
+        return html
+    
+    # FountainScript for data (bytes) built from cached elements, or parsed on a miss
+    def loadScript(self, data, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, cssFile = '', componentParent = 'components'):
+        key = self.keyFor(data, parserVersion, parserEngine, cssFile, componentParent)
+        cached = self.getElements(key)
+        if cached is None:
+            self.renderHtml(data, parserVersion, parserEngine, cssFile, componentParent)
+            cached = self.getElements(key)
+            if cached is None:
+                return FountainScript.fromString(data, parserVersion, parserEngine)
+        
+        fountainScript = FountainScript()
+        fountainScript._fileName = ''
+        fountainScript._elements, fountainScript._titlePageContents = cached
+        return fountainScript
\ No newline at end of file
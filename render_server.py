@@ -0,0 +1,197 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the render server, a long running http server that serves the
+# rendered html of the fountain scripts under a root folder (main.py --serve).
+#
+# Parsed scripts and their html are kept in a script pool, an in-memory LRU keyed by
+# path; an entry is used while the file keeps the modification time and size it was
+# rendered from. Every response carries an ETag, so a conditional GET of an unchanged
+# script is answered with 304 and no body. Requests are served on their own threads, so
+# a slow render does not hold up 304s and static files; rendering is pure Python and
+# holds the GIL, so renders of different scripts take turns rather than run in parallel.
+# Each thread has its own parser and generator, and a script asked for concurrently is
+# rendered once. Other files under the root are served as is if they are of a kind the
+# rendered html loads (css, scripts, component html); hidden files and folders (those
+# starting with a dot, such as .git) are never served.
+#
+# The server listens on the loopback interface unless another host is given.
+
+import collections
+import hashlib
+import mimetypes
+import os
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from fountain_script import FountainScript
+from html_generator import FountainHTMLGenerator
+from fountain_parser import Parser, ParserVersion
+
+DEFAULT_POOL_SIZE = 64
+DEFAULT_PORT = 8000
+DEFAULT_HOST = '127.0.0.1'
+
+# Count of render locks; paths are spread over them by hash, so the locks stay fixed in
+# number however many scripts are served
+LOCK_STRIPES = 64
+
+# Files rendered as fountain scripts
+FOUNTAIN_EXTENSIONS = ('.fountain', '.txt')
+# Files served as is; anything else under the root is answered with 404
+STATIC_EXTENSIONS = ('.css', '.js', '.html', '.htm')
+
+class ScriptPool(object):
+    def __init__(self, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, cssFile = '', componentParent = 'components', maxEntries = DEFAULT_POOL_SIZE):
+        self._parserVersion = parserVersion
+        self._parserEngine = parserEngine
+        self._cssFile = cssFile
+        self._componentParent = componentParent
+        self._maxEntries = maxEntries
+        
+        # path -> (signature, script, html bytes, etag), least recently used first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # path hash -> lock, so that a script is rendered once even if asked for concurrently
+        self._pathLocks = [threading.Lock() for i in range(LOCK_STRIPES)]
+        self._local = threading.local()
+        return
+    
+    # Parser and generator of the calling thread
+    def parserAndGenerator(self):
+        if not hasattr(self._local, 'parser'):
+            self._local.parser = Parser(self._parserVersion, self._parserEngine)
+            self._local.generator = FountainHTMLGenerator(None, self._cssFile, self._componentParent, self._parserVersion)
+        return self._local.parser, self._local.generator
+    
+    def signatureFor(self, path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    # Pool entry for the current version of path, if there is one
+    def lookup(self, path, signature):
+        with self._lock:
+            entry = self._entries.get(path)
+            if (entry is not None and entry[0] == signature):
+                self._entries.move_to_end(path)
+                return entry
+        return None
+    
+    # (signature, script, html bytes, etag) for the script at path, rendered if the
+    # pool has no entry for the file as it is now; raises OSError if it can't be read
+    def get(self, path):
+        signature = self.signatureFor(path)
+        entry = self.lookup(path, signature)
+        if entry is not None:
+            return entry
+        
+        pathLock = self._pathLocks[hash(path) % LOCK_STRIPES]
+        with pathLock:
+            # rendered by another request while this one waited
+            entry = self.lookup(path, signature)
+            if entry is not None:
+                return entry
+            
+            with open(path, 'rb') as file:
+                data = file.read()
+            parser, generator = self.parserAndGenerator()
+            script = FountainScript.fromString(data, parser = parser)
+            generator.setScript(script)
+            html = generator.generateHtml().encode('utf-8')
+            etag = '"' + hashlib.sha1(html).hexdigest() + '"'
+            entry = (signature, script, html, etag)
+            
+            with self._lock:
+                self._entries[path] = entry
+                self._entries.move_to_end(path)
+                while len(self._entries) > self._maxEntries:
+                    self._entries.popitem(last = False)
+        return entry
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'fountainhead'
+    
+    def do_GET(self):
+        self.respond(True)
+        return
+    
+    def do_HEAD(self):
+        self.respond(False)
+        return
+    
+    def respond(self, sendBody):
+        path = self.server.pathFor(self.path)
+        if (path is None or not os.path.isfile(path) or not path.lower().endswith(FOUNTAIN_EXTENSIONS + STATIC_EXTENSIONS)):
+            self.send_error(404)
+            return
+        
+        try:
+            if path.lower().endswith(FOUNTAIN_EXTENSIONS):
+                signature, script, body, etag = self.server._pool.get(path)
+                contentType = 'text/html; charset=utf-8'
+            else:
+                with open(path, 'rb') as file:
+                    body = file.read()
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                contentType = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        except (IOError, OSError):
+            self.send_error(404)
+            return
+        except Exception as error:
+            print('ERROR: Rendering \'' + path + '\' failed: ' + repr(error))
+            self.send_error(500)
+            return
+        
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if sendBody:
+            self.wfile.write(body)
+        return
+
+class RenderServer(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def __init__(self, address, root, pool):
+        self._root = os.path.realpath(root)
+        self._pool = pool
+        ThreadingHTTPServer.__init__(self, address, RenderRequestHandler)
+        return
+    
+    # File system path for a request path, or None if it is outside of the root or
+    # goes through a hidden file or folder
+    def pathFor(self, requestPath):
+        relativePath = unquote(urlsplit(requestPath).path).lstrip('/')
+        if any(segment.startswith('.') for segment in relativePath.replace('\\', '/').split('/')):
+            return None
+        path = os.path.realpath(os.path.join(self._root, relativePath))
+        if (path != self._root and not path.startswith(self._root + os.sep)):
+            return None
+        return path
\ No newline at end of file
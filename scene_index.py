@@ -0,0 +1,142 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the scene index of a parsed script. Scenes are numbered by
+# ordinal in order of their scene headings, and scene i spans the elements from its
+# heading up to the next heading; elements before the first heading are in no scene.
+# The index maps ordinals and scene numbers to element ranges, finds the scene of an
+# element by bisection, and keeps the section heading hierarchy around every scene,
+# so that one scene can be looked up and rendered without scanning the whole script.
+
+from array import array
+from bisect import bisect_right
+
+from fountain_element import ElementKind
+
+# Ordinal of elements (and sections) outside of any scene
+NO_SCENE = -1
+
+class SceneIndex(object):
+    def __init__(self, elements = None):
+        # Element index of each scene heading, by ordinal
+        self._sceneStarts = array('i')
+        self._elementCount = 0
+        # Scene number text to ordinal, for headings that carry one
+        self._ordinalsByNumber = {}
+        # Section headings as element indices, with their depths and the first ordinal after each
+        self._sectionStarts = array('i')
+        self._sectionDepths = array('H')
+        self._sectionFirstScenes = array('i')
+        # Per ordinal, the section heading indices (into self._sectionStarts) enclosing the scene, outermost first
+        self._sceneSections = []
+        # Per ordinal, dual dialogue character count of the html generator when the scene starts
+        self._sceneDualDialogueIn = array('B')
+        
+        if elements is not None:
+            self.build(elements)
+        return
+    
+    def build(self, elements):
+        dialogueKinds = (ElementKind.CHARACTER, ElementKind.DIALOGUE, ElementKind.PARENTHETICAL)
+        # Kinds the html generator skips, without closing dual dialogue
+        skipKinds = (ElementKind.BONEYARD, ElementKind.COMMENT, ElementKind.SYNOPSIS, ElementKind.SECTION_HEADING, ElementKind.PAGE_BREAK)
+        # Open section headings, as indices into self._sectionStarts
+        sectionStack = []
+        dualDialogueCount = 0
+        
+        index = 0
+        for element in elements:
+            kind = element._kind
+            if (kind == ElementKind.SCENE_HEADING):
+                ordinal = len(self._sceneStarts)
+                self._sceneStarts.append(index)
+                if (element._sceneNumber is not None and not (element._sceneNumber in self._ordinalsByNumber)):
+                    self._ordinalsByNumber[element._sceneNumber] = ordinal
+                self._sceneSections.append(tuple(sectionStack))
+                self._sceneDualDialogueIn.append(min(dualDialogueCount, 2))
+            elif (kind == ElementKind.SECTION_HEADING):
+                depth = element._sectionDepth
+                while (sectionStack and self._sectionDepths[sectionStack[-1]] >= depth):
+                    sectionStack.pop()
+                sectionStack.append(len(self._sectionStarts))
+                self._sectionStarts.append(index)
+                self._sectionDepths.append(depth)
+                self._sectionFirstScenes.append(len(self._sceneStarts))
+            
+            # Same bookkeeping as the html generator's, see ElementRenderer.renderChunks
+            if (not (kind in skipKinds)):
+                if (kind == ElementKind.CHARACTER and element._isDualDialogue):
+                    dualDialogueCount += 1
+                if (dualDialogueCount >= 2 and not (kind in dialogueKinds)):
+                    dualDialogueCount = 0
+            index += 1
+        
+        self._elementCount = index
+        return
+    
+    def sceneCount(self):
+        return len(self._sceneStarts)
+    
+    # Element range [start, end) of scene 'ordinal'
+    def sceneRange(self, ordinal):
+        if ordinal < 0 or ordinal >= len(self._sceneStarts):
+            raise IndexError('scene ordinal out of range')
+        start = self._sceneStarts[ordinal]
+        if ordinal + 1 < len(self._sceneStarts):
+            return (start, self._sceneStarts[ordinal + 1])
+        return (start, self._elementCount)
+    
+    # Element range of the elements before the first scene heading
+    def preludeRange(self):
+        if self._sceneStarts:
+            return (0, self._sceneStarts[0])
+        return (0, self._elementCount)
+    
+    # Ordinal of the (first) scene numbered sceneNumber, as written between the #s; None if there is none
+    def ordinalForNumber(self, sceneNumber):
+        return self._ordinalsByNumber.get(sceneNumber)
+    
+    # Ordinal of the scene element 'index' belongs to, or NO_SCENE before the first heading
+    def sceneForElement(self, index):
+        if index < 0 or index >= self._elementCount:
+            raise IndexError('element index out of range')
+        return bisect_right(self._sceneStarts, index) - 1
+    
+    # Element indices of the section headings enclosing scene 'ordinal', outermost first
+    def sectionsForScene(self, ordinal):
+        return [self._sectionStarts[section] for section in self._sceneSections[ordinal]]
+    
+    # Ordinal range [first, end) of the scenes under the section heading at element 'index';
+    # the section ends at the next section heading of the same or a lower depth
+    def scenesInSection(self, index):
+        position = bisect_right(self._sectionStarts, index) - 1
+        if position < 0 or self._sectionStarts[position] != index:
+            raise KeyError('no section heading at element ' + str(index))
+        
+        depth = self._sectionDepths[position]
+        end = len(self._sceneStarts)
+        for section in range(position + 1, len(self._sectionStarts)):
+            if self._sectionDepths[section] <= depth:
+                end = self._sectionFirstScenes[section]
+                break
+        return (self._sectionFirstScenes[position], end)
+    
+    # Dual dialogue character count carried into scene 'ordinal' from the scenes before
+    def dualDialogueCountBefore(self, ordinal):
+        return self._sceneDualDialogueIn[ordinal]
\ No newline at end of file
@@ -0,0 +1,93 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the title page renderer, shared by both html generator versions.
+# The title page div is built from templates prepared once per rule set: one html
+# fragment template per title page field, with the text used when the field is missing.
+# Rendered title pages are cached by their contents, so a title page rendered before
+# (by any generator of the same version in this process) is not rendered again.
+
+import threading
+from collections import OrderedDict
+
+# Rendered title pages kept per rule set
+TITLE_CACHE_SIZE = 256
+
+class TitlePageRenderer(object):
+    def __init__(self, fountainRegex, cacheSize = TITLE_CACHE_SIZE):
+        rules = fountainRegex
+        self._divTemplate = '<div id=\'' + rules.TITLE_DIV + '\'>{}</div>'
+        # (contents key, paragraph template, text if the field is missing; None leaves the paragraph out),
+        # in page order
+        self._fields = []
+        for key, htmlClass, missingText in [(rules.TITLE_TITLE_STRING, rules.TITLE_TITLE_CLASS, 'Untitled'),
+                                            (rules.TITLE_CREDIT_STRING, rules.TITLE_CREDIT_CLASS, 'written by'),
+                                            (rules.TITLE_AUTHOR_STRING, rules.TITLE_AUTHOR_CLASS, 'Anonymous'),
+                                            (rules.TITLE_SOURCE_STRING, rules.TITLE_SOURCE_CLASS, None),
+                                            (rules.TITLE_DRAFT_DATE_STRING, rules.TITLE_DRAFT_DATE_CLASS, None),
+                                            (rules.TITLE_CONTACT_STRING, rules.TITLE_CONTACT_CLASS, None)]:
+            self._fields.append((key, '<p class=\'' + htmlClass + '\'>{}</p>', missingText))
+        # Field keys the page is made of; other title page keys do not change the html
+        self._keys = [field[0] for field in self._fields]
+        
+        self._cacheSize = cacheSize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        return
+    
+    # Title page div for title page contents, empty if there are none
+    def render(self, titlePageContents):
+        if not titlePageContents:
+            return ''
+        
+        cacheKey = tuple(tuple(titlePageContents.get(key) or ()) for key in self._keys)
+        with self._lock:
+            html = self._cache.get(cacheKey)
+            if html is not None:
+                self._cache.move_to_end(cacheKey)
+                return html
+        
+        html = self.renderContents(titlePageContents)
+        with self._lock:
+            self._cache[cacheKey] = html
+            if len(self._cache) > self._cacheSize:
+                self._cache.popitem(last = False)
+        return html
+    
+    def renderContents(self, titlePageContents):
+        paragraphs = []
+        for key, template, missingText in self._fields:
+            lines = titlePageContents.get(key)
+            if lines:
+                paragraphs.append(template.format(''.join(line + '<br>' for line in lines)))
+            elif missingText is not None:
+                paragraphs.append(template.format(missingText))
+        return self._divTemplate.format(''.join(paragraphs))
+
+_sharedTitleRenderers = {}
+_sharedTitleRenderersLock = threading.Lock()
+
+# One renderer, and so one cache, per rule set, like regex_rules.sharedRules
+def sharedTitleRenderer(fountainRegex):
+    with _sharedTitleRenderersLock:
+        renderer = _sharedTitleRenderers.get(type(fountainRegex))
+        if renderer is None:
+            renderer = TitlePageRenderer(fountainRegex)
+            _sharedTitleRenderers[type(fountainRegex)] = renderer
+    return renderer
\ No newline at end of file
@@ -0,0 +1,146 @@
+# -*- Mode:python c-file-style:"gnu" indent-tabs-mode:nil -*- */
+#
+# Copyright (C) 2014-2015 Regents of the University of California.
+# Author: Zhehao Wang <wangzhehao410305gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# A copy of the GNU General Public License is in the file COPYING.
+
+# This module defines the watch renderer, which keeps one output html file up to date
+# with its fountain input while the input is being edited (main.py --watch).
+#
+# The process stays up, so the rule sets are compiled once, and renders go through an
+# incremental renderer, so a save only reparses the scenes it touched. The input file
+# and the component folder are polled with os.stat; a change is rendered once no further
+# change has been seen for the debounce delay, so that a burst of saves renders once.
+# A change in the component folder only rewrites the html, which makes pages watching
+# the output reload. The output is written under a temporary name and renamed into
+# place, so a browser never reads a partial file.
+
+import os
+import tempfile
+import time
+
+from incremental_renderer import IncrementalRenderer
+from fountain_parser import ParserVersion
+
+# Seconds between two polls of the watched files
+POLL_INTERVAL = 0.02
+# Seconds without changes before a change is rendered
+DEBOUNCE_DELAY = 0.05
+
+# Replaces path with text in one rename
+def writeFileAtomic(path, text):
+    fd, tempPath = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)), prefix = '.tmp-')
+    try:
+        with os.fdopen(fd, 'w', encoding = 'utf-8') as file:
+            file.write(text)
+        os.replace(tempPath, path)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+    return
+
+class WatchRenderer(object):
+    def __init__(self, inputFile, outputFile, parserVersion = ParserVersion.DEFAULT, parserEngine = ParserVersion.DEFAULT_ENGINE, cssFile = '', componentParent = 'components', debounceDelay = DEBOUNCE_DELAY, pollInterval = POLL_INTERVAL):
+        self._inputFile = inputFile
+        self._outputFile = outputFile
+        # Component folder is relative to the output file, as in the html
+        self._componentDir = os.path.join(os.path.dirname(outputFile), componentParent)
+        self._debounceDelay = debounceDelay
+        self._pollInterval = pollInterval
+        self._renderer = IncrementalRenderer(parserVersion, parserEngine, cssFile, componentParent)
+        self._script = None
+        self._text = None
+        return
+    
+    # (modification time, size) of the input, or None while it is missing
+    # (editors that save by renaming remove it for a moment)
+    def inputSignature(self):
+        try:
+            stat = os.stat(self._inputFile)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def componentSignature(self):
+        signature = []
+        try:
+            for dirEntry in os.scandir(self._componentDir):
+                try:
+                    stat = dirEntry.stat()
+                except OSError:
+                    continue
+                signature.append((dirEntry.name, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            return None
+        signature.sort()
+        return signature
+    
+    # Rerenders the output if the input text changed, or always if force is set;
+    # returns whether the output was written
+    def render(self, force = False):
+        try:
+            with open(self._inputFile, encoding = 'utf-8') as file:
+                text = file.read()
+        except (IOError, OSError) as error:
+            print('WARNING: Cannot read \'' + self._inputFile + '\': ' + str(error))
+            return False
+        if (text == self._text and not force):
+            return False
+        
+        self._script = self._renderer.update(self._script, text)
+        self._text = text
+        writeFileAtomic(self._outputFile, self._renderer.htmlForScript(self._script))
+        return True
+    
+    # Renders once, then keeps rendering on changes until interrupted (or for
+    # maxPolls polls, if given)
+    def run(self, maxPolls = None):
+        start = time.perf_counter()
+        self.render(True)
+        print('fountainhead: HTML file written to ' + self._outputFile + ' (%.1f ms)' % ((time.perf_counter() - start) * 1000))
+        print('fountainhead: Watching \'' + self._inputFile + '\' and \'' + self._componentDir + '\'; press Ctrl-C to stop')
+        
+        inputSignature = self.inputSignature()
+        componentSignature = self.componentSignature()
+        # Time of the last change seen, None while there is nothing to render
+        changedAt = None
+        componentsChanged = False
+        polls = 0
+        while maxPolls is None or polls < maxPolls:
+            time.sleep(self._pollInterval)
+            polls += 1
+            
+            newInputSignature = self.inputSignature()
+            newComponentSignature = self.componentSignature()
+            if (newInputSignature != inputSignature or newComponentSignature != componentSignature):
+                if newComponentSignature != componentSignature:
+                    componentsChanged = True
+                inputSignature = newInputSignature
+                componentSignature = newComponentSignature
+                changedAt = time.perf_counter()
+                continue
+            if (changedAt is None or inputSignature is None):
+                continue
+            if (time.perf_counter() - changedAt < self._debounceDelay):
+                continue
+            
+            start = time.perf_counter()
+            if self.render(componentsChanged):
+                print('fountainhead: HTML file written to ' + self._outputFile + ' (%.1f ms, %d scene chunks reparsed)' % ((time.perf_counter() - start) * 1000, self._renderer._reparsedChunks))
+            changedAt = None
+            componentsChanged = False
+        return
\ No newline at end of file